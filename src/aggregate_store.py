@@ -0,0 +1,190 @@
+import threading
+import time
+
+import pandas as pd
+
+from aggregates import BASE_METRICS, FactorizedKeys
+from anomaly_scoring import flagged_cells
+from chart_data import kpi_by_day
+from country_table import REGION_LEVELS
+from creative_rollup import KEY_COLUMNS as CREATIVE_KEY_COLUMNS
+from dataset_registry import DEFAULT_MANIFEST_PATH, DatasetRegistry, file_signature, read_data_csv
+from kpi_heatmap import SparseMetricMatrix
+from kpi_registry import DELIVERY_KPIS, load_kpis
+from kpi_tables import REGIONS, UNIVERSAL_ID_COLUMN, ad_set_tables, country_kpi_table, merge_period_aggregates, period_aggregate, region_rollup_table, regional_sales_kpi_table
+
+# Process-wide store of every period's data and standard dashboard views. It owns the parsed
+# partitions: each file is read, its key columns factorized and aggregated to (ad set, country)
+# cells once per signature, and a period's frame, key codes and cells are assembled from those,
+# so sessions never parse a file (or hash its names for the creative rollups) themselves. The views (country KPIs, top ad sets per region, regional sales funnel, region
+# rollups, daily chart, heatmap matrix, anomalies) are built from the merged cells. One
+# background worker rebuilds a period whenever its files change; sessions only read the
+# finished frames and views, so ten analysts opening the dashboard cost one aggregation, not
+# ten. Anything the worker hasn't built yet is built on first request, once: concurrent
+# sessions asking for the same key wait for that single build. Everything handed out is
+# shared between sessions and must be treated as read-only. The headless loaders (report
+# exporter, KPI API) use the same store, so every consumer reads the registry's partitions.
+
+DEFAULT_POLL_SECONDS = 30
+DEFAULT_TOP_N = 10
+ROLLUP_LEVELS = REGION_LEVELS + ['Market']
+# Factorized once per partition: the cells' keys plus the creative rollups' (creative_rollup.KEY_COLUMNS).
+KEY_COLUMNS = list(dict.fromkeys([UNIVERSAL_ID_COLUMN, 'Country'] + CREATIVE_KEY_COLUMNS))
+
+
+def with_delivery_kpis(df):
+    """`df` (in place) as the dashboard renders it: base metrics numeric (missing ones 0) plus the per-row delivery KPIs."""
+    for metric in BASE_METRICS:
+        df[metric] = pd.to_numeric(df[metric], errors='coerce').fillna(0) if metric in df.columns else 0
+    return load_kpis().evaluate(df, DELIVERY_KPIS)
+
+
+class AggregateStore:
+    def __init__(self, manifest_path=DEFAULT_MANIFEST_PATH, top_n=DEFAULT_TOP_N):
+        self.manifest_path = manifest_path
+        self.top_n = top_n
+        self._datasets = None
+        self._manifest_signature = None
+        self._lock = threading.Lock()
+        self._key_locks = {}  # (cache name, key) -> lock held while that key is being built
+        self._caches = {'partitions': {}, 'frames': {}, 'keys': {}, 'cells': {}, 'views': {}}  # name -> {key: (signature, value)}
+        self._worker = None
+
+    @property
+    def datasets(self):
+        signature = file_signature(self.manifest_path)
+        with self._lock:
+            if self._datasets is None or signature != self._manifest_signature:
+                self._datasets = DatasetRegistry.load(self.manifest_path)
+                self._manifest_signature = signature
+            return self._datasets
+
+    def _cached(self, name, key, signature, build):
+        """The value cached under `key` in cache `name` if it was built for `signature`; otherwise build() once."""
+        cache = self._caches[name]
+        with self._lock:
+            cached = cache.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            key_lock = self._key_locks.setdefault((name, key), threading.Lock())
+        with key_lock:
+            # Another session may have finished the same build while this one waited.
+            with self._lock:
+                cached = cache.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            value = build()
+            with self._lock:
+                cache[key] = (signature, value)
+            return value
+
+    def _period_partitions(self, period_label, sources):
+        datasets = self.datasets
+        partitions = datasets.partitions(sources=list(sources), periods=[period_label])
+        return datasets, partitions, datasets.needs_out_of_core(partitions)
+
+    def data_signature(self, period_label, sources):
+        """Changes whenever one of the period's partition files (or the out-of-core decision) changes."""
+        _, partitions, out_of_core = self._period_partitions(period_label, sources)
+        return tuple((p.path, file_signature(p.path)) for p in partitions) + (out_of_core,)
+
+    def signature(self, period_label, sources):
+        return self.data_signature(period_label, sources) + (file_signature(self.datasets.sales_file),)
+
+    def partition_data(self, partition, out_of_core=False):
+        """
+        (frame, cells, keys) of one partition: parsed (or streamed to sums out of core), its
+        KEY_COLUMNS factorized and aggregated with those codes, once per file signature.
+        """
+        def build():
+            datasets = self.datasets
+            frame = datasets.aggregate_partition(partition) if out_of_core else datasets.read_partition(partition)
+            with_delivery_kpis(frame)
+            keys = FactorizedKeys(frame, [col for col in KEY_COLUMNS if col in frame.columns])
+            return frame, period_aggregate(frame, keys=keys), keys
+        key = (partition.source, partition.period)
+        return self._cached('partitions', key, (partition.path, file_signature(partition.path), out_of_core), build)
+
+    def period_frame(self, period_label, sources):
+        """The period's rows for the selected sources (summed rows out of core), concatenated once per data version; None without partitions."""
+        _, partitions, out_of_core = self._period_partitions(period_label, sources)
+        if not partitions:
+            return None
+        def build():
+            frames = [self.partition_data(p, out_of_core)[0] for p in partitions]
+            return pd.concat(frames, ignore_index=True, sort=False)
+        return self._cached('frames', (period_label, tuple(sources)), self.data_signature(period_label, sources), build)
+
+    def period_keys(self, period_label, sources):
+        """FactorizedKeys of period_frame's KEY_COLUMNS, merged from the partitions' codes; None without partitions."""
+        _, partitions, out_of_core = self._period_partitions(period_label, sources)
+        if not partitions:
+            return None
+        def build():
+            return FactorizedKeys.concat([self.partition_data(p, out_of_core)[2] for p in partitions])
+        return self._cached('keys', (period_label, tuple(sources)), self.data_signature(period_label, sources), build)
+
+    def period_cells(self, period_label, sources):
+        """The period's (ad set, country) cells: the partitions' cached cells merged, so new data costs its own partition plus one merge."""
+        _, partitions, out_of_core = self._period_partitions(period_label, sources)
+        def build():
+            return merge_period_aggregates([self.partition_data(p, out_of_core)[1] for p in partitions])
+        return self._cached('cells', (period_label, tuple(sources)), self.data_signature(period_label, sources), build)
+
+    def period_sales(self, period_label):
+        """The period's rows of the sales file; None when there is no sales file."""
+        datasets = self.datasets
+        if file_signature(datasets.sales_file) is None:
+            return None
+        df_sales = read_data_csv(datasets.sales_file)
+        return df_sales[df_sales['Period'] == datasets.periods[period_label]['sales_period']]
+
+    def views(self, period_label, sources):
+        """
+        Standard views of one period for the selected sources, built at most once per data version.
+        Returns:
+            dict: 'cells' (period_aggregate), 'country_kpis' (DataFrame), 'ad_sets'
+                  ({region: (top_by_results, top_by_spent)}), 'regional_sales' (DataFrame),
+                  'region_rollups' ({level: DataFrame}), 'daily' (DataFrame), 'heatmap'
+                  (SparseMetricMatrix) and 'anomalies' (flagged cells).
+        """
+        return self._cached('views', (period_label, tuple(sources)), self.signature(period_label, sources),
+                            lambda: self._build_views(period_label, sources))
+
+    def _build_views(self, period_label, sources):
+        period_agg = self.period_cells(period_label, sources)
+        frame = self.period_frame(period_label, sources)
+        period_sales_df = self.period_sales(period_label)
+        return {
+            'cells': period_agg,
+            'country_kpis': country_kpi_table(period_agg),
+            'ad_sets': {region: ad_set_tables(period_agg, codes, filter_type, top_n=self.top_n)
+                        for region, (codes, filter_type, _) in REGIONS.items()},
+            'regional_sales': regional_sales_kpi_table(period_agg, period_sales_df),
+            'region_rollups': {level: region_rollup_table(period_agg, level) for level in ROLLUP_LEVELS},
+            'daily': kpi_by_day(frame if frame is not None else period_agg),
+            'heatmap': SparseMetricMatrix.from_frame(period_agg),
+            'anomalies': flagged_cells(period_agg),
+        }
+
+    def precompute(self):
+        """Builds (or confirms) the views of every period for the full source selection."""
+        datasets = self.datasets
+        for period_label in datasets.periods:
+            try:
+                self.views(period_label, datasets.sources)
+            except Exception as e:
+                print(f"Uyarı: {period_label} için özet tablolar hazırlanamadı: {e}")
+
+    def start(self, poll_seconds=DEFAULT_POLL_SECONDS):
+        """Starts the background worker (once per store); it re-checks file signatures every `poll_seconds`."""
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._run, args=(poll_seconds,), name="aggregate_store", daemon=True)
+        self._worker.start()
+
+    def _run(self, poll_seconds):
+        while True:
+            self.precompute()
+            time.sleep(poll_seconds)
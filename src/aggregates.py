@@ -0,0 +1,209 @@
+import pandas as pd
+import numpy as np
+
+from kpi_registry import AD_KPIS, load_kpis
+
+# Base (additive) metric columns shared by every cleaned/combined export.
+BASE_METRICS = ['Amount spent (USD)', 'Impressions', 'Link clicks', 'Reach', 'Results']
+
+# Display names used by the dashboard tables for summed base metrics.
+TOTAL_COLUMN_NAMES = {
+    'Amount spent (USD)': 'Total Spent (USD)',
+    'Impressions': 'Total Impressions',
+    'Link clicks': 'Total Link Clicks',
+    'Reach': 'Total Reach',
+    'Results': 'Total Results'
+}
+
+KPI_COLUMNS = AD_KPIS
+
+# Per-result-type columns: 'Results' and spend pivoted by 'Result type', so rows optimizing for
+# different events (lead forms, purchases, ...) are not added into one cost per result.
+RESULT_TYPE_COLUMN = 'Result type'
+RESULTS_PREFIX = 'Results: '
+SPENT_PREFIX = 'Spent: '
+COST_PREFIX = 'Cost per Result: '
+
+
+def result_type_columns(result_type):
+    """(results, spend, cost per result) column names of one result type."""
+    return f"{RESULTS_PREFIX}{result_type}", f"{SPENT_PREFIX}{result_type} (USD)", f"{COST_PREFIX}{result_type} (USD)"
+
+
+def result_types(df):
+    """Result types with pivoted columns in `df`, in column order."""
+    return [col[len(RESULTS_PREFIX):] for col in df.columns if col.startswith(RESULTS_PREFIX)]
+
+
+def result_type_metrics(df):
+    """The additive per-type columns of `df` (results and spend), summed like base metrics."""
+    return [col for result_type in result_types(df) for col in result_type_columns(result_type)[:2] if col in df.columns]
+
+
+def custom_kpi_columns():
+    """Custom KPIs from data/kpis.json computable from the base metrics; added next to KPI_COLUMNS."""
+    return load_kpis().custom_names()
+
+
+def metric_matrix(df, metrics=BASE_METRICS):
+    """Returns a float64 (rows x metrics) array; non-numeric or missing values become 0."""
+    values = np.zeros((len(df), len(metrics)), dtype=np.float64)
+    for i, metric in enumerate(metrics):
+        if metric in df.columns:
+            values[:, i] = pd.to_numeric(df[metric], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    return values
+
+
+class FactorizedKeys:
+    """
+    Key columns factorized once (one sorted pd.factorize per column), reusable for any
+    combination of them: grouping by a new set of keys combines the stored integer codes
+    instead of hashing the strings again.
+    """
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.codes = {}
+        self.uniques = {}
+        for col in columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            self.codes[col] = codes.astype(np.int64)
+            self.uniques[col] = uniques
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        The keys of the row-wise concatenation of the frames behind `parts`, from their stored
+        codes: each column's uniques are merged (sorted, as one factorize of the stacked column
+        would give) and every part's codes remapped, so no string is hashed again. A column a
+        part doesn't have is missing (-1) on its rows, like pd.concat's NaN.
+        """
+        keys = cls.__new__(cls)
+        keys.n_rows = sum(part.n_rows for part in parts)
+        keys.codes, keys.uniques = {}, {}
+        for col in dict.fromkeys(col for part in parts for col in part.codes):
+            part_uniques = [np.asarray(part.uniques[col], dtype=object) if col in part.uniques else np.empty(0, dtype=object) for part in parts]
+            merged, uniques = pd.factorize(np.concatenate(part_uniques), sort=True)
+            offsets = np.cumsum([0] + [len(u) for u in part_uniques])
+            codes = []
+            for i, part in enumerate(parts):
+                part_codes = part.codes.get(col, np.full(part.n_rows, -1, dtype=np.int64))
+                mapped = merged[offsets[i]:offsets[i + 1]]
+                codes.append(np.where(part_codes >= 0, mapped[np.maximum(part_codes, 0)] if len(mapped) else -1, -1).astype(np.int64))
+            keys.codes[col] = np.concatenate(codes)
+            keys.uniques[col] = uniques
+        return keys
+
+    def _column(self, col, dropna):
+        """(codes, uniques) of one key; with dropna=False a missing key is one more value (NaN), coded last."""
+        codes, uniques = self.codes[col], self.uniques[col]
+        if dropna:
+            return codes, np.asarray(uniques)
+        return np.where(codes >= 0, codes, len(uniques)), np.append(np.asarray(uniques, dtype=object), np.nan)
+
+    def group_codes(self, key_columns, dropna=True):
+        """Same output as group_codes(df, key_columns, dropna), from the stored per-column codes."""
+        if not key_columns:
+            raise ValueError("group_codes needs at least one key column.")
+        columns = {col: self._column(col, dropna) for col in key_columns}
+        valid = np.ones(self.n_rows, dtype=bool)
+        for col in key_columns:
+            valid &= columns[col][0] >= 0
+
+        # Combine per-key codes into one mixed-radix code, then compact it to 0..n_groups-1.
+        combined = np.zeros(self.n_rows, dtype=np.int64)
+        for col in key_columns:
+            codes, uniques = columns[col]
+            combined = combined * max(len(uniques), 1) + np.where(codes >= 0, codes, 0)
+        dense, combined_uniques = pd.factorize(combined[valid], sort=True)
+
+        row_codes = np.full(self.n_rows, -1, dtype=np.int64)
+        row_codes[valid] = dense
+
+        keys = {}
+        remainder = combined_uniques.astype(np.int64)
+        for col in reversed(key_columns):
+            uniques = columns[col][1]
+            radix = max(len(uniques), 1)
+            keys[col] = uniques[remainder % radix] if len(uniques) else np.array([], dtype=object)
+            remainder = remainder // radix
+        keys_df = pd.DataFrame({col: keys[col] for col in key_columns})
+        return row_codes, keys_df
+
+
+def group_codes(df, key_columns, dropna=True):
+    """
+    Factorizes one or more key columns into a single dense integer code per row.
+    Args:
+        df (pd.DataFrame): Frame holding the key columns.
+        key_columns (list): Columns that together define a group.
+        dropna (bool): False keeps rows with a missing key as their own (NaN) group, like
+            groupby(dropna=False), instead of coding them -1.
+    Returns:
+        tuple: (codes, keys_df) where codes is an int64 array (-1 for rows with a missing key,
+               like groupby's NaN dropping) and keys_df holds one row per code, sorted by key.
+    """
+    if not key_columns:
+        raise ValueError("group_codes needs at least one key column.")
+    return FactorizedKeys(df, key_columns).group_codes(list(key_columns), dropna=dropna)
+
+
+def sum_by_codes(values, codes, n_groups):
+    """Sums each column of `values` per group code with one bincount per column."""
+    valid = codes >= 0
+    valid_codes = codes[valid]
+    sums = np.empty((n_groups, values.shape[1]), dtype=np.float64)
+    for i in range(values.shape[1]):
+        sums[:, i] = np.bincount(valid_codes, weights=values[valid, i], minlength=n_groups)
+    return sums
+
+
+def aggregate_metrics(df, key_columns, metrics=BASE_METRICS, by_result_type=False, dropna=True, keys=None):
+    """
+    Groups `df` by `key_columns` and sums `metrics` (raw column names), in key order.
+    Per-result-type columns already in `df` are summed along with `metrics`.
+    Args:
+        by_result_type (bool): Also pivot 'Results' and spend by the RESULT_TYPE_COLUMN of the
+            rows, reusing the group codes: one bincount per metric over (group, type) codes.
+        dropna (bool): False keeps rows with a missing key as a NaN-keyed group (see group_codes).
+        keys (FactorizedKeys): Codes of `df`'s key columns built earlier, reused instead of
+            factorizing them again.
+    """
+    if keys is None:
+        codes, keys_df = group_codes(df, key_columns, dropna=dropna)
+    else:
+        codes, keys_df = keys.group_codes(list(key_columns), dropna=dropna)
+    metrics = list(metrics) + [col for col in result_type_metrics(df) if col not in metrics]
+    sums = sum_by_codes(metric_matrix(df, metrics), codes, len(keys_df))
+    for i, metric in enumerate(metrics):
+        keys_df[metric] = sums[:, i]
+    if by_result_type and RESULT_TYPE_COLUMN in df.columns:
+        type_codes, types = pd.factorize(df[RESULT_TYPE_COLUMN], sort=True)
+        n_groups, n_types = len(keys_df), len(types)
+        cells = np.where((codes >= 0) & (type_codes >= 0), codes * n_types + type_codes, -1)
+        pivot = sum_by_codes(metric_matrix(df, ['Results', 'Amount spent (USD)']), cells, n_groups * n_types).reshape(n_groups, n_types, 2)
+        for j, result_type in enumerate(types):
+            results_column, spent_column, _ = result_type_columns(result_type)
+            keys_df[results_column] = pivot[:, j, 0]
+            keys_df[spent_column] = pivot[:, j, 1]
+    return keys_df
+
+
+def add_kpi_columns(df):
+    """Adds CTR/CPC/CPM, cost per result and custom KPI columns computed from raw-named metric sums (in place), plus a cost per result per result type."""
+    load_kpis().evaluate(df, KPI_COLUMNS + custom_kpi_columns())
+    for result_type in result_types(df):
+        results_column, spent_column, cost_column = result_type_columns(result_type)
+        load_kpis().evaluate(df, ['Avg. Cost per Result (USD)'], columns={'spend': spent_column, 'results': results_column},
+                      output={'Avg. Cost per Result (USD)': cost_column})
+    return df
+
+
+def merge_partial_sums(partials, key_columns, metrics=BASE_METRICS, dropna=True):
+    """Merges partial aggregate_metrics frames (e.g. one per chunk or partition) into one sum per key."""
+    partials = [partial for partial in partials if partial is not None and not partial.empty]
+    if not partials:
+        return pd.DataFrame(columns=list(key_columns) + list(metrics))
+    if len(partials) == 1:
+        return partials[0]
+    return aggregate_metrics(pd.concat(partials, ignore_index=True, sort=False), key_columns, metrics, dropna=dropna)
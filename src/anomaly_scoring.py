@@ -0,0 +1,110 @@
+import numpy as np
+
+from aggregates import add_kpi_columns, group_codes
+from kpi_tables import UNIVERSAL_ID_COLUMN, period_aggregate
+
+# Robust (median/MAD) z-scores of CPC, CPM and CTR for every campaign x country cell, relative to
+# the cell's country and to the whole account. All cells of all countries are scored together:
+# one lexsort per KPI gives every country's median and MAD at once, no per-country loop.
+
+SCORED_KPIS = ['CPC (USD)', 'CPM (USD)', 'CTR (%)']
+DEFAULT_Z_THRESHOLD = 3.5   # Iglewicz & Hoaglin's cut-off for modified z-scores
+DEFAULT_MIN_SPEND = 10.0    # cells below this spend have too little data for a stable KPI
+MIN_CELLS_PER_COUNTRY = 5   # smaller countries are judged against the account baseline only
+
+_MAD_SCALE = 0.6745         # makes MAD consistent with the standard deviation for normal data
+_MEAN_AD_SCALE = 0.7979     # fallback when more than half the cells share one value (MAD == 0)
+
+
+def grouped_median(values, codes, n_groups):
+    """
+    Median of `values` per group code, ignoring NaN, for all groups in one sort.
+    Returns (medians, counts); groups without valid values get NaN.
+    """
+    valid = ~np.isnan(values)
+    order = np.lexsort((np.where(valid, values, np.inf), codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    # Group blocks in the sorted array include NaN rows at their end; use total sizes for offsets.
+    starts = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_groups))[:-1]))
+    medians = np.full(n_groups, np.nan)
+    has_values = counts > 0
+    lower = starts[has_values] + (counts[has_values] - 1) // 2
+    upper = starts[has_values] + counts[has_values] // 2
+    medians[has_values] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians, counts
+
+
+def robust_z_scores(values, codes, n_groups):
+    """Modified z-score of every value against its group's median and MAD (NaN where undefined)."""
+    medians, counts = grouped_median(values, codes, n_groups)
+    deviations = np.abs(values - medians[codes])
+    mads, _ = grouped_median(deviations, codes, n_groups)
+    valid = ~np.isnan(deviations)
+    mean_ads = np.bincount(codes[valid], weights=deviations[valid], minlength=n_groups) / np.maximum(counts, 1)
+
+    mad_rows, mean_ad_rows = mads[codes], mean_ads[codes]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(mad_rows > 0, _MAD_SCALE * (values - medians[codes]) / mad_rows,
+                     np.where(mean_ad_rows > 0, _MEAN_AD_SCALE * (values - medians[codes]) / mean_ad_rows, np.nan))
+    return z, medians[codes], counts[codes]
+
+
+def score_cells(period_agg, min_spend=DEFAULT_MIN_SPEND, z_threshold=DEFAULT_Z_THRESHOLD):
+    """
+    Scores every (Universal_Campaign_ID, Country) cell of a period aggregate.
+    Args:
+        period_agg (pd.DataFrame): Output of kpi_tables.period_aggregate (raw metric sums per cell).
+        min_spend (float): Cells with less spend are not scored.
+        z_threshold (float): |z| above this flags the KPI.
+    Returns:
+        pd.DataFrame: One row per cell with the KPIs, country/account medians, both z-scores per KPI,
+                      an 'Anomaly' boolean and 'Anomaly KPIs' listing the flagged KPIs.
+    """
+    cells = add_kpi_columns(period_agg.copy())
+    country_codes, countries = group_codes(cells, ['Country'])
+    n_countries = len(countries)
+    account_codes = np.zeros(len(cells), dtype=np.int64)
+    spent = cells['Amount spent (USD)'].to_numpy(dtype=np.float64)
+    scored = (spent >= min_spend) & (country_codes >= 0) & cells[UNIVERSAL_ID_COLUMN].notna().to_numpy()
+    # Unscored cells go to a dummy group so they never affect any baseline.
+    country_codes = np.where(scored, country_codes, n_countries)
+    account_codes = np.where(scored, account_codes, 1)
+
+    denominators = {
+        'CPC (USD)': cells['Link clicks'].to_numpy(dtype=np.float64),
+        'CPM (USD)': cells['Impressions'].to_numpy(dtype=np.float64),
+        'CTR (%)': cells['Impressions'].to_numpy(dtype=np.float64),
+    }
+    flags = np.zeros((len(cells), len(SCORED_KPIS)), dtype=bool)
+    for i, kpi in enumerate(SCORED_KPIS):
+        # A KPI with a zero denominator is undefined for that cell, not 0.
+        values = np.where(scored & (denominators[kpi] > 0), cells[kpi].to_numpy(dtype=np.float64), np.nan)
+        z_country, median_country, n_country = robust_z_scores(values, country_codes, n_countries + 1)
+        z_account, median_account, _ = robust_z_scores(values, account_codes, 2)
+        z_country = np.where(n_country >= MIN_CELLS_PER_COUNTRY, z_country, np.nan)
+        cells[f"{kpi} Ülke Medyanı"] = np.where(scored, median_country, np.nan)
+        cells[f"{kpi} Hesap Medyanı"] = np.where(scored, median_account, np.nan)
+        cells[f"{kpi} z (Ülke)"] = z_country
+        cells[f"{kpi} z (Hesap)"] = z_account
+        # Judged against the country when it has enough cells, otherwise against the account.
+        z_primary = np.where(np.isnan(z_country), z_account, z_country)
+        flags[:, i] = np.abs(np.nan_to_num(z_primary)) > z_threshold
+
+    cells['Anomaly'] = flags.any(axis=1)
+    anomaly_labels = np.full(len(cells), '', dtype=object)
+    for row in np.flatnonzero(cells['Anomaly'].to_numpy()):
+        anomaly_labels[row] = ', '.join(kpi for kpi, flagged in zip(SCORED_KPIS, flags[row]) if flagged)
+    cells['Anomaly KPIs'] = anomaly_labels
+    return cells
+
+
+def flagged_cells(df, min_spend=DEFAULT_MIN_SPEND, z_threshold=DEFAULT_Z_THRESHOLD, id_column=UNIVERSAL_ID_COLUMN):
+    """Aggregates a combined ad-level frame, scores it and returns only flagged cells, largest |z| first."""
+    scores = score_cells(period_aggregate(df, id_column=id_column), min_spend=min_spend, z_threshold=z_threshold)
+    flagged = scores[scores['Anomaly']].copy()
+    if flagged.empty:
+        return flagged
+    z_columns = [f"{kpi} z (Ülke)" for kpi in SCORED_KPIS] + [f"{kpi} z (Hesap)" for kpi in SCORED_KPIS]
+    flagged['max_abs_z'] = np.nanmax(np.abs(flagged[z_columns].to_numpy(dtype=np.float64)), axis=1)
+    return flagged.sort_values('max_abs_z', ascending=False).drop(columns='max_abs_z')
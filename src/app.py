@@ -1,22 +1,25 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import os
-
-# Import analyzer functions - we will likely need to choose ONE and adapt its use,
-# or create a new generic one for combined data.
-# For now, let's plan to use an aliased version of one of the existing 'analyze_ad_sets'
-# that expects 'Ad Set Name' after we prepare the 'Universal_Campaign_ID'.
-from global_analyzer import analyze_ad_sets as generic_analyze_ad_sets
-# We might not need the other specific analyzers if we generalize properly.
 
+# Draw the page shell first: pandas/numpy, the analyzer module and the CSV parsing below
+# all happen after the title is already on screen.
 st.set_page_config(layout="wide")
+st.title("Reklam ve Satış Performans Analizi Dashboard")
 
-country_code_to_name_map = {
-    "TR": "Turkey", "AZ": "Azerbaijan", "US": "United States", "DE": "Germany",
-    "GB": "United Kingdom", "UZ": "Uzbekistan", "CA": "Canada", "AU": "Australia",
-    "FR": "France", "NL": "Netherlands", "AE": "United Arab Emirates",
-}
+import pandas as pd
+import numpy as np
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from dataset_registry import DEFAULT_MANIFEST_PATH, DatasetRegistry, file_signature, read_data_csv
+from kpi_registry import DELIVERY_KPIS, SALES_KPIS, SALES_KPI_COLUMNS, load_kpis
+from aggregates import custom_kpi_columns
+from kpi_tables import column_formatters, load_countries, result_type_display_columns, result_type_formatters
+
+def generic_analyze_ad_sets(input_df, target_countries, filter_type, top_n=5):
+    # Deferred import: the analyzer module is only loaded once an ad-set view is rendered.
+    from global_analyzer import analyze_ad_sets
+    return analyze_ad_sets(input_df, target_countries, filter_type, top_n=top_n)
 
 # --- Global Helper Functions (get_original_row_count, display_cleaning_info, column_formatters, prepare_country_kpis, calculate_kpis_for_display, display_ad_set_analysis, load_data) ---
 # These functions will largely remain the same, but their usage context will change.
@@ -25,18 +28,63 @@ country_code_to_name_map = {
 
 UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID' # Standardized column name
 
-@st.cache_data
-def load_data(file_path):
+# Country names and region/market hierarchy (data/countries.csv, data/markets.json).
+COUNTRIES = load_countries()
+country_code_to_name_map = COUNTRIES.name_map()
+
+# Every file is cached under its (mtime, size) signature: when an export in data/ is added or
+# rewritten only that file is parsed again, unchanged files come straight from the cache.
+DATA_POLL_SECONDS = 30
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_data(file_path, signature=None):
+    # No st.* calls in here: it runs on loader threads. Errors are returned and shown by the caller.
     try:
-        df = pd.read_csv(file_path)
+        df = read_data_csv(file_path)
         # print(f"Loaded {file_path} with columns: {df.columns.tolist()}") # Optional debug
-        return df
+        return df, None
     except FileNotFoundError:
-        st.error(f"Hata: '{file_path}' dosyası bulunamadı.")
-        return None
+        return None, f"Hata: '{file_path}' dosyası bulunamadı."
     except Exception as e:
-        st.error(f"'{file_path}' okunurken bir hata oluştu: {e}")
-        return None
+        return None, f"'{file_path}' okunurken bir hata oluştu: {e}"
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_manifest(signature):
+    return DatasetRegistry.load(DEFAULT_MANIFEST_PATH)
+
+def load_period_sources(datasets, period_label, sources):
+    # Only the selected sources' partitions for this period are read (see data/datasets.json).
+    # The process-wide AggregateStore owns the parsed partitions: each file is parsed once per
+    # signature for every session, and a changed export costs one partition parse plus a
+    # concat. Above the manifest's size threshold the partitions are streamed in chunks and
+    # only their sums are kept (out-of-core mode). The frame is shared: never modify it in place.
+    try:
+        df = get_aggregate_store().period_frame(period_label, sources)
+    except FileNotFoundError as e:
+        return None, f"Hata: '{e.filename}' dosyası bulunamadı."
+    except Exception as e:
+        return None, f"{period_label} verisi okunurken bir hata oluştu: {e}"
+    if df is None:
+        return None, f"Hata: {period_label} için kayıtlı veri dosyası yok."
+    return df, None
+
+def start_loading(loaders):
+    """Starts every loader concurrently ({key: (function, *args)}); returns {key: Future} so each view can wait only for its own data."""
+    ctx = get_script_run_ctx()
+    def _load_with_ctx(loader):
+        add_script_run_ctx(ctx=ctx)
+        return loader[0](*loader[1:])
+    executor = ThreadPoolExecutor(max_workers=max(len(loaders), 1), thread_name_prefix="load_data")
+    futures = {key: executor.submit(_load_with_ctx, loader) for key, loader in loaders.items()}
+    executor.shutdown(wait=False)
+    return futures
+
+def wait_for_data(futures, key):
+    with st.spinner("Veriler yükleniyor..."):
+        df, error_message = futures[key].result()
+    if error_message:
+        st.error(error_message)
+    return df
 
 # --- (Copying existing helper functions here for completeness in this edit block) ---
 def calculate_kpis_for_display(df):
@@ -48,50 +96,88 @@ def calculate_kpis_for_display(df):
         else:
             st.warning(f"Expected column '{col}' not found in calculate_kpis_for_display. It will be initialized to 0.")
             kpi_df[col] = 0
-    kpi_df['CTR (%)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Link clicks'] / kpi_df['Impressions']) * 100, 0)
-    kpi_df['CPC (USD)'] = np.where(kpi_df['Link clicks'] > 0, kpi_df['Amount spent (USD)'] / kpi_df['Link clicks'], 0)
-    kpi_df['CPM (USD)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Amount spent (USD)'] / kpi_df['Impressions']) * 1000, 0)
+    load_kpis().evaluate(kpi_df, DELIVERY_KPIS)
     return kpi_df
 
-def column_formatters(): # This can remain global
-    return {
-        "Total Spent (USD)": "${:,.2f}", "Total Reach": "{:,.0f}", "Total Impressions": "{:,.0f}",
-        "Total Link Clicks": "{:,.0f}", "Total Results": "{:,.0f}", "CTR (%)": "{:.2f}%",
-        "CPC (USD)": "${:,.2f}", "CPM (USD)": "${:,.2f}", "Avg. Cost per Result (USD)": "${:,.2f}",
-        "Toplam Harcama (USD)": "${:,.2f}", "Toplam Reach": "{:,.0f}", "Toplam Gösterim (Impressions)": "{:,.0f}",
-        "Toplam Link Tıklaması": "{:,.0f}", "Toplam Sonuç (Results)": "{:,.0f}",
-        "Ortalama CTR (%)": "{:.2f}%", "Ortalama CPC (USD)": "${:,.2f}",
-        "Ortalama CPM (USD)": "${:,.2f}", "Ortalama Sonuç Başına Maliyet (USD)": "${:,.2f}",
-        # Sales funnel columns
-        "Randevu": "{:,.0f}", "Katılım": "{:,.0f}", "Satış": "{:,.0f}",
-        "Rndv-Ktlm (%)": "{:.2f}%", "Ktlm-Sts (%)": "{:.2f}%", "Rndv-Sts (%)": "{:.2f}%"
-    }
-
 def prepare_country_kpis(df_cleaned, dataset_name="Dataset"):
     if df_cleaned is None or df_cleaned.empty:
         st.warning(f"Cannot prepare country KPIs for {dataset_name}: Input data is empty or None.")
         return pd.DataFrame()
-    df_processed = calculate_kpis_for_display(df_cleaned.copy())
-    country_summary_agg = df_processed.groupby('Country').agg(
-        total_spent=('Amount spent (USD)', 'sum'), total_impressions=('Impressions', 'sum'),
-        total_link_clicks=('Link clicks', 'sum'), total_reach=('Reach', 'sum'),
-        total_results=('Results', 'sum')).reset_index()
-    country_summary_for_kpis = country_summary_agg.rename(columns={
-        'total_spent': 'Amount spent (USD)', 'total_impressions': 'Impressions',
-        'total_link_clicks': 'Link clicks', 'total_reach': 'Reach', 'total_results': 'Results'})
-    country_summary_kpis = calculate_kpis_for_display(country_summary_for_kpis)
-    country_summary_kpis['Avg. Cost per Result (USD)'] = np.where(
-        country_summary_kpis['Results'] > 0,
-        country_summary_kpis['Amount spent (USD)'] / country_summary_kpis['Results'], 0)
+    from aggregates import add_kpi_columns, aggregate_metrics
+    df_processed = calculate_kpis_for_display(df_cleaned)
+    # One grouped pass: base sums plus results and spend per 'Result type'.
+    country_summary_kpis = add_kpi_columns(aggregate_metrics(df_processed, ['Country'], by_result_type=True))
     country_summary_kpis = country_summary_kpis.rename(columns={
         'Amount spent (USD)': 'Total Spent (USD)', 'Impressions': 'Total Impressions',
         'Link clicks': 'Total Link Clicks', 'Reach': 'Total Reach', 'Results': 'Total Results'
     }).sort_values(by='Total Spent (USD)', ascending=False)
     country_summary_kpis_display = country_summary_kpis.copy()
-    country_summary_kpis_display['Country'] = country_summary_kpis_display['Country'].map(country_code_to_name_map).fillna(country_summary_kpis_display['Country'])
+    country_summary_kpis_display['Country'] = COUNTRIES.display_names(country_summary_kpis_display['Country'])
     return country_summary_kpis_display
 
-def display_ad_set_analysis_modified(df_input, analyze_func, id_column_name, dataset_label, top_n=10):
+def interval_formatters(columns):
+    """column_formatters() plus the format of the base column for every '<column> Low/High' and per-result-type column in `columns`."""
+    formats = {**column_formatters(), **result_type_formatters(columns)}
+    for col in columns:
+        base = col.rsplit(' ', 1)[0]
+        if col not in formats and base in formats:
+            formats[col] = formats[base]
+    return formats
+
+@st.cache_data(show_spinner=False)
+def load_period_sample(_df, period_label, sources, signature, fraction):
+    # The sample is persisted under data/samples and redrawn only when the period's files change.
+    from approx_sample import load_or_build_sample, sample_path
+    from kpi_tables import slugify
+    return load_or_build_sample(_df, sample_path(slugify(period_label), sources), signature, fraction)
+
+@st.cache_data(show_spinner=False)
+def compute_approximate_views(sample, top_n):
+    from approx_sample import approximate_ad_set_tables, approximate_country_kpis
+    from kpi_tables import REGIONS
+    country_kpis = approximate_country_kpis(sample)
+    country_kpis['Country'] = COUNTRIES.display_names(country_kpis['Country'])
+    ad_sets = {region: approximate_ad_set_tables(sample, codes, filter_type, top_n=top_n)
+               for region, (codes, filter_type, _) in REGIONS.items()}
+    return {'country_kpis': country_kpis, 'ad_sets': ad_sets}
+
+def approximate_preview(df_processed, period_label, dataset_label, top_n=10):
+    """Opt-in approximate mode for the country and ad-set views; None when the exact views are selected."""
+    from approx_sample import DEFAULT_FRACTION
+    from kpi_intervals import low_column, high_column
+    col1, col2 = st.columns([1, 2])
+    if not col1.toggle("Yaklaşık önizleme (örneklem)", key=f"approx_{dataset_label}",
+                       help="Ülke ve kampanya tablolarını ülkelere göre tabakalı, harcama ağırlıklı küçük bir örneklemden tahmin eder. Kapatınca kesin hesaplamaya döner."):
+        return None
+    fraction = col2.select_slider("Örneklem oranı", options=[0.01, 0.02, 0.05, 0.1], value=DEFAULT_FRACTION,
+                                  format_func=lambda f: f"%{f * 100:g}", key=f"approx_fraction_{dataset_label}")
+    partitions = datasets.partitions(sources=list(selected_sources), periods=[period_label])
+    signature = tuple(file_signature(p.path) for p in partitions)
+    sample = load_period_sample(df_processed, period_label, tuple(selected_sources), signature, fraction)
+    views = compute_approximate_views(sample, top_n)
+    bounded = ['Total Spent (USD)', 'Total Results', 'CTR (%)', 'CPC (USD)', 'Avg. Cost per Result (USD)']
+    views['columns'] = [col for kpi in bounded for col in (low_column(kpi), high_column(kpi))]
+    st.info(f"Yaklaşık mod: {sample.attrs.get('source_rows', len(df_processed)):,} satırın {len(sample):,} satırlık örnekleminden tahmin. "
+            "Ülke ve kampanya tablolarında Low/High sütunları yaklaşık örneklem sınırlarıdır (az satırlı ülke/kampanyalarda gerçek değer sınırların dışında kalabilir); diğer bölümler kesin veriyle hesaplanır.")
+    return views
+
+@st.cache_data(show_spinner=False)
+def compute_ad_set_intervals(df, target_countries, filter_type, method, confidence):
+    # Every ad set of the region at once; the ranking below only sorts the cached frame.
+    from global_analyzer import ad_set_kpi_summary
+    from kpi_intervals import add_kpi_intervals, bootstrap_kpi_intervals
+    if method == 'bootstrap':
+        in_region = df['Country'].isin(target_countries)
+        df_region = df[in_region if filter_type == 'include' else ~in_region]
+        if df_region.empty:
+            return None
+        return bootstrap_kpi_intervals(df_region, 'Ad Set Name', confidence=confidence)
+    summary = ad_set_kpi_summary(df, target_countries, filter_type)
+    return None if summary is None else add_kpi_intervals(summary, confidence=confidence)
+
+def display_ad_set_analysis_modified(df_input, analyze_func, id_column_name, dataset_label, top_n=10, stored_tables=None, extra_columns=None):
+    # stored_tables: {region: (top_by_results, top_by_spent)} from the shared AggregateStore; analyze_func is the fallback.
+    # extra_columns: e.g. the Low/High bounds of the approximate preview's tables.
     if df_input is None or df_input.empty or id_column_name not in df_input.columns:
         st.warning(f"`{id_column_name}` sütunu {dataset_label} veri setinde bulunamadı veya veri boş. Analiz yapılamıyor.")
         return
@@ -101,32 +187,67 @@ def display_ad_set_analysis_modified(df_input, analyze_func, id_column_name, dat
     
     tr_name = country_code_to_name_map.get('TR', 'TR')
     az_name = country_code_to_name_map.get('AZ', 'AZ')
-    cols_to_display = ['Ad Set Name', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+    cols_to_display = ['Ad Set Name', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)'] + custom_kpi_columns()
     style_formats = column_formatters()
+    if extra_columns:
+        cols_to_display = cols_to_display + list(extra_columns)
+        style_formats = interval_formatters(extra_columns)
 
     st.header(f"Kampanya/Reklam Seti Bazlı KPI Analizleri ({dataset_label})")
-    def _display_tables(results_df, spent_df, label_suffix):
+    ci_cols = st.columns([2, 2, 2])
+    rank_by_bound = ci_cols[0].toggle("Güven aralığına göre sırala", key=f"ci_rank_{dataset_label}",
+                                      help="Az veriyle elde edilen şanslı KPI'lar yerine aralığın kötümser ucuna göre sıralar: CTR için alt sınır, maliyetler için üst sınır.")
+    if rank_by_bound:
+        from kpi_intervals import INTERVAL_KPIS, low_column, high_column, rank_by_confidence_bound
+        ci_kpi = ci_cols[1].selectbox("KPI", INTERVAL_KPIS, key=f"ci_kpi_{dataset_label}")
+        ci_method = ci_cols[2].radio("Yöntem", ['closed_form', 'bootstrap'], horizontal=True, key=f"ci_method_{dataset_label}",
+                                     format_func=lambda m: "Kapalı form" if m == 'closed_form' else "Bootstrap")
+
+    def _display_confidence_ranking(target_countries, filter_type, full_label):
+        summary = compute_ad_set_intervals(df_processed_for_analyzer, target_countries, filter_type, ci_method, 0.95)
+        st.markdown(f"##### {ci_kpi} Güven Aralığına Göre İlk {top_n} Kampanya/Reklam Seti ({full_label})")
+        if summary is None or summary.empty:
+            st.info(f"Sıralanacak kampanya/reklam seti bulunamadı ({full_label}).")
+            return
+        ranked = rank_by_confidence_bound(summary, ci_kpi, top_n=top_n)
+        ci_formats = {**style_formats, low_column(ci_kpi): style_formats[ci_kpi], high_column(ci_kpi): style_formats[ci_kpi]}
+        st.dataframe(ranked[['Ad Set Name', 'Total Spent (USD)', 'Total Link Clicks', 'Total Results', ci_kpi, low_column(ci_kpi), high_column(ci_kpi)]]
+                     .style.format(ci_formats), use_container_width=True)
+        st.caption("%95 güven aralığı. Maliyet üst sınırı 'inf' ise tıklama/sonuç sayısı aralığı 0'ı içeriyor.")
+
+    def _display_tables(results_df, spent_df, label_suffix, target_countries, filter_type):
         full_label = f"{label_suffix} ({dataset_label})"
+        if rank_by_bound:
+            _display_confidence_ranking(target_countries, filter_type, full_label)
         st.markdown(f"##### En Çok Sonuç Getiren İlk {top_n} Kampanya/Reklam Seti ({full_label})")
-        if results_df is not None and not results_df.empty: st.dataframe(results_df[cols_to_display].style.format(style_formats), use_container_width=True)
+        if results_df is not None and not results_df.empty:
+            results_cols = cols_to_display + result_type_display_columns(results_df)
+            st.dataframe(results_df[results_cols].style.format({**style_formats, **result_type_formatters(results_cols)}), use_container_width=True)
         else: st.info(f"Sonuçlara göre sıralanacak kampanya/reklam seti bulunamadı ({full_label}).")
         st.markdown(f"##### En Çok Harcama Yapan İlk {top_n} Kampanya/Reklam Seti ({full_label})")
-        if spent_df is not None and not spent_df.empty: st.dataframe(spent_df[cols_to_display].style.format(style_formats), use_container_width=True)
+        if spent_df is not None and not spent_df.empty:
+            spent_cols = cols_to_display + result_type_display_columns(spent_df)
+            st.dataframe(spent_df[spent_cols].style.format({**style_formats, **result_type_formatters(spent_cols)}), use_container_width=True)
         else: st.info(f"Harcamalara göre sıralanacak kampanya/reklam seti bulunamadı ({full_label}).")
         st.caption(f"Not: Yukarıdaki analizler {full_label} için geçerlidir."); st.divider()
 
+    def _region_tables(region_key, target_countries, filter_type):
+        if stored_tables is not None and region_key in stored_tables:
+            return stored_tables[region_key]
+        return analyze_func(df_processed_for_analyzer, target_countries=target_countries, filter_type=filter_type, top_n=top_n)
+
     st.markdown(f"#### {tr_name} Performansı")
-    tr_results, tr_spent = analyze_func(df_processed_for_analyzer, target_countries=['TR'], filter_type='include', top_n=top_n)
-    _display_tables(tr_results, tr_spent, tr_name)
+    tr_results, tr_spent = _region_tables('Turkey', ['TR'], 'include')
+    _display_tables(tr_results, tr_spent, tr_name, ['TR'], 'include')
     st.markdown(f"#### {az_name} Performansı")
-    az_results, az_spent = analyze_func(df_processed_for_analyzer, target_countries=['AZ'], filter_type='include', top_n=top_n)
-    _display_tables(az_results, az_spent, az_name)
+    az_results, az_spent = _region_tables('Azerbaijan', ['AZ'], 'include')
+    _display_tables(az_results, az_spent, az_name, ['AZ'], 'include')
     global_label = f"Global ({tr_name} ve {az_name} Hariç)"
     st.markdown(f"#### {global_label} Performansı")
-    g_results, g_spent = analyze_func(df_processed_for_analyzer, target_countries=['TR', 'AZ'], filter_type='exclude', top_n=top_n)
-    _display_tables(g_results, g_spent, global_label)
+    g_results, g_spent = _region_tables('Global (TR ve AZ Hariç)', ['TR', 'AZ'], 'exclude')
+    _display_tables(g_results, g_spent, global_label, ['TR', 'AZ'], 'exclude')
 
-def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sales_df, country_code_map):
+def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sales_df, country_code_map, stored_table=None):
     st.header(f"Bölgesel Satış KPI'ları ({period_label})")
 
     regions_to_display = {
@@ -136,6 +257,10 @@ def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sal
     }
 
     kpi_data_list = []
+    if stored_table is not None:
+        # Precomputed by the shared AggregateStore (same columns as the rows built below).
+        kpi_data_list = stored_table.to_dict('records')
+        regions_to_display = {}
 
     for display_name, country_codes_or_flag in regions_to_display.items():
         # Initialize metrics
@@ -154,10 +279,6 @@ def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sal
             total_link_clicks = region_ad_data['Link clicks'].sum()
             total_impressions = region_ad_data['Impressions'].sum()
 
-        ctr = (total_link_clicks / total_impressions) * 100 if total_impressions > 0 else 0
-        cpc = total_spent / total_link_clicks if total_link_clicks > 0 else 0
-        cpm = (total_spent / total_impressions) * 1000 if total_impressions > 0 else 0
-
         # --- Get Sales Data ---
         # Map display_name to region name in sales_df ('Turkey' -> 'TR', 'Azerbaijan' -> 'AZE', 'Global (TR ve AZ Hariç)' -> 'Global')
         sales_region_name = display_name
@@ -171,23 +292,18 @@ def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sal
             randevu_sayisi = region_sales_data['Randevu'].sum() # Sum if multiple rows (should be 1)
             satis_sayisi = region_sales_data['Satış'].sum()   # Sum if multiple rows
 
-        # --- Calculate Combined KPIs ---
-        randevu_maliyeti = total_spent / randevu_sayisi if randevu_sayisi > 0 else 0
-        cpa = total_spent / satis_sayisi if satis_sayisi > 0 else 0
-
         kpi_data_list.append({
             'Bölge': display_name,
             'Total Spent (USD)': total_spent,
             'Total Reach': total_reach,
             'Total Link Clicks': total_link_clicks,
-            'CTR (%)': ctr,
-            'CPC (USD)': cpc,
-            'CPM (USD)': cpm,
+            'Total Impressions': total_impressions,
             'Randevu Sayısı': randevu_sayisi,
-            'Randevu Maliyeti (USD)': randevu_maliyeti,
-            'Satış Sayısı': satis_sayisi,
-            'CPA (USD)': cpa
+            'Satış Sayısı': satis_sayisi
         })
+    # --- Calculate Combined KPIs (all regions at once) ---
+    if stored_table is None:
+        kpi_data_list = load_kpis().evaluate(pd.DataFrame(kpi_data_list), SALES_KPIS, columns=SALES_KPI_COLUMNS).to_dict('records')
 
     if kpi_data_list:
         kpi_df = pd.DataFrame(kpi_data_list)
@@ -210,44 +326,519 @@ def display_regional_sales_kpis(period_label, period_ad_df_processed, period_sal
         st.info("Bölgesel satış KPI'ları için veri bulunamadı.")
     st.divider()
 
-# Paths to the NEW combined data files
-combined_file_p1 = 'data/combined_period1_10_22_may.csv'
-combined_file_p2 = 'data/combined_period2_23_29_may.csv'
-sales_file = 'data/sales.csv'
+@st.cache_data
+def compute_period_comparison(period_frames):
+    # Materialized once per data refresh; the movers view below only sorts the cached frame.
+    from period_comparison import build_period_comparison
+    return build_period_comparison(period_frames)
+
+def display_period_comparison(period_frames):
+    from period_comparison import CAMPAIGN_COLUMN, COMPARISON_METRICS, top_movers
+    comparisons = compute_period_comparison(period_frames)
+    (base_label, compare_label), comparison_df = next(iter(comparisons.items()))
+    if comparison_df.empty:
+        st.info("Karşılaştırılacak kampanya/ülke verisi bulunamadı.")
+        return
+    if comparison_df.attrs.get('overlap', 0) == 0:
+        st.warning(f"{base_label} ve {compare_label} dönemlerinde ortak kampanya/ülke satırı yok; değişim tablosu gösterilmiyor.")
+        return
 
-# Load combined datasets
-df_p1 = load_data(combined_file_p1)
-df_p2 = load_data(combined_file_p2)
-df_sales = load_data(sales_file)
+    col_metric, col_direction, col_top_n = st.columns(3)
+    metric = col_metric.selectbox("Metrik", COMPARISON_METRICS, index=0)
+    direction_labels = {"En Büyük Değişim": 'both', "En Çok Artan": 'up', "En Çok Azalan": 'down'}
+    direction = direction_labels[col_direction.selectbox("Sıralama", list(direction_labels.keys()))]
+    top_n = col_top_n.number_input("Gösterilecek satır", min_value=5, max_value=500, value=20, step=5)
+
+    movers_df = top_movers(comparison_df, metric, top_n=int(top_n), direction=direction).copy()
+    movers_df['Country'] = COUNTRIES.display_names(movers_df['Country'])
+    base_col, compare_col = f"{metric} ({base_label})", f"{metric} ({compare_label})"
+    cols_to_display = [CAMPAIGN_COLUMN, 'Country', base_col, compare_col, f"Δ {metric}", f"Δ% {metric}"]
+    value_format = column_formatters().get(metric, "{:,.2f}")
+    style_formats = {base_col: value_format, compare_col: value_format, f"Δ {metric}": value_format, f"Δ% {metric}": "{:+.1f}%"}
+    st.markdown(f"##### En Büyük Değişimler: {metric} ({base_label} → {compare_label})")
+    st.dataframe(movers_df[cols_to_display].style.format(style_formats, na_rep="—"), use_container_width=True, hide_index=True)
+    st.caption("Not: Δ% sütunu, ilk dönemde değeri 0 olan kampanya/ülke satırları için boş bırakılır.")
+
+@st.cache_data(show_spinner=False)
+def compute_creative_rollups(period_frames, _period_keys=None):
+    # Built once per data refresh from the store's key codes (or one factorization of searched frames);
+    # the widgets below only filter and sort the cached tables.
+    from creative_rollup import creative_rollups
+    return creative_rollups(period_frames, period_keys=_period_keys)
+
+def display_creative_rollups(period_frames, period_keys=None):
+    from creative_rollup import CREATIVE_COLUMN, PERIOD_COLUMN, REACH_COUNTS, rank_creatives
+    st.header("Kreatif (Reklam Adı) Bazlı KPI'lar")
+    tables = compute_creative_rollups(period_frames, period_keys)
+    if 'creatives' not in tables or tables['creatives'].empty:
+        st.info("Kreatif analizi için 'Ad name' sütunu olan veri bulunamadı.")
+        return
+    kpi_cols = ['Total Spent (USD)', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+    col_kpi, col_spend, col_top_n = st.columns(3)
+    kpi = col_kpi.selectbox("Sıralama KPI'ı", ['Total Spent (USD)', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)'], key="creative_kpi")
+    min_spend = col_spend.number_input("En az harcama (USD)", min_value=0.0, value=50.0, step=10.0, key="creative_min_spend")
+    top_n = col_top_n.number_input("Gösterilecek kreatif", min_value=5, max_value=200, value=20, step=5, key="creative_top_n")
+    ranked = rank_creatives(tables['creatives'], kpi, min_spend=min_spend, top_n=int(top_n))
+    if ranked.empty:
+        st.info(f"{min_spend:,.0f} USD üzerinde harcaması olan kreatif bulunamadı.")
+        return
+    style_formats = {**column_formatters(), **{col: "{:,.0f}" for col in REACH_COUNTS}}
+    st.markdown(f"##### Tüm Hesapta En İyi Kreatifler ({kpi})")
+    st.dataframe(ranked[[CREATIVE_COLUMN] + list(REACH_COUNTS) + kpi_cols].style.format(style_formats), use_container_width=True, hide_index=True)
+    st.caption("Not: Aynı reklam adı tüm kampanya ve reklam setlerinde tek kreatif sayılır; maliyet KPI'larında küçükten büyüğe sıralanır.")
+
+    creative = st.selectbox("Kreatif Detayı", ranked[CREATIVE_COLUMN].tolist(), key="creative_detail")
+    col_country, col_period = st.columns(2)
+    by_country = tables['creative_country'][tables['creative_country'][CREATIVE_COLUMN] == creative].copy()
+    by_country['Country'] = COUNTRIES.display_names(by_country['Country'])
+    col_country.markdown("##### Ülkelere Göre")
+    col_country.dataframe(by_country[['Country'] + kpi_cols].style.format(column_formatters()), use_container_width=True, hide_index=True)
+    by_period = tables['creative_period'][tables['creative_period'][CREATIVE_COLUMN] == creative]
+    col_period.markdown("##### Dönemlere Göre")
+    col_period.dataframe(by_period[[PERIOD_COLUMN] + kpi_cols].style.format(column_formatters()), use_container_width=True, hide_index=True)
+    without_creatives = [label for label, df in period_frames.items() if df is not None and CREATIVE_COLUMN not in df.columns]
+    if without_creatives:
+        st.caption(f"Not: {', '.join(without_creatives)} verisinde 'Ad name' sütunu olmadığı için bu dönem kreatif tablolarına katılmadı.")
+    st.divider()
 
-st.title("Reklam ve Satış Performans Analizi Dashboard")
+@st.cache_data(show_spinner=False)
+def compute_ad_set_summary(df, target_countries, filter_type):
+    from global_analyzer import ad_set_kpi_summary
+    return ad_set_kpi_summary(df, target_countries, filter_type)
+
+@st.cache_data(show_spinner=False)
+def compute_period_aggregate(df):
+    from kpi_tables import period_aggregate
+    return period_aggregate(df)
+
+def display_budget_simulator(period_cells, dataset_label):
+    from budget_simulator import SIMULATION_COLUMNS, optimize_within_countries, simulate_shift
+    from kpi_tables import REGIONS, region_mask
+    st.header(f"Bütçe Yeniden Dağıtım Simülatörü ({dataset_label})")
+    st.caption("Her reklam setine gözlenen (harcama, sonuç) noktasından geçen azalan getirili bir eğri (sonuç = a · harcama^e) uydurulur; "
+               "bütçe, marjinal sonuç başına maliyetler eşitlenecek şekilde dağıtılır. Sonuçlar tahmindir.")
+    sim_cols = st.columns(3)
+    region = sim_cols[0].selectbox("Bölge", list(REGIONS.keys()), key=f"sim_region_{dataset_label}")
+    mode = sim_cols[1].radio("Senaryo", ["En kötüden en iyiye kaydır", "Ülke bütçeleri sabit, tümünü optimize et"], key=f"sim_mode_{dataset_label}")
+    elasticity = sim_cols[2].slider("Getiri esnekliği (e)", 0.3, 0.95, 0.7, 0.05, key=f"sim_elasticity_{dataset_label}",
+                                    help="1'e yaklaştıkça ek bütçe sonuç başına maliyeti daha az artırır.")
+    country_codes, filter_type, _ = REGIONS[region]
+    style_formats = {col: ("${:,.2f}" if 'USD' in col else "{:,.1f}") for col in SIMULATION_COLUMNS}
+
+    if mode.startswith("En kötüden"):
+        summary = compute_ad_set_summary(period_cells.rename(columns={UNIVERSAL_ID_COLUMN: 'Ad Set Name'}), country_codes, filter_type)
+        if summary is None or summary.empty:
+            st.info(f"Simülasyon için reklam seti bulunamadı ({region}).")
+            return
+        share_cols = st.columns(3)
+        donor_share = share_cols[0].slider("En kötü dilim (%)", 5, 50, 20, 5, key=f"sim_donor_{dataset_label}") / 100
+        recipient_share = share_cols[1].slider("En iyi dilim (%)", 5, 50, 20, 5, key=f"sim_recipient_{dataset_label}") / 100
+        max_scale = share_cols[2].slider("Alıcı başına en fazla artış (x)", 1.1, 5.0, 2.0, 0.1, key=f"sim_scale_{dataset_label}")
+        total_spent = float(summary['Total Spent (USD)'].sum())
+        amount = st.slider("Kaydırılacak bütçe (USD)", 0.0, max(round(total_spent, 0), 1.0), min(100.0, round(total_spent, 0)), key=f"sim_amount_{dataset_label}")
+        result_df = simulate_shift(summary, amount, donor_share, recipient_share, elasticity, max_scale)
+        if result_df.attrs.get('moved', amount) < amount:
+            st.caption(f"Not: En fazla ${result_df.attrs['moved']:,.2f} taşınabildi; en kötü dilimin harcaması veya en iyi dilimin "
+                       f"{max_scale:g}x artış sınırı daha fazlasına izin vermiyor. Toplam harcama sabit kalır.")
+        changed = result_df[result_df['Role'] != ''].sort_values(by='Δ Spend (USD)')
+        id_cols = ['Ad Set Name', 'Role']
+    else:
+        period_agg = period_cells
+        scale_cols = st.columns(2)
+        min_scale = scale_cols[0].slider("Hücre başına en az harcama (x mevcut)", 0.0, 1.0, 0.5, 0.1, key=f"sim_min_{dataset_label}")
+        max_scale = scale_cols[1].slider("Hücre başına en fazla harcama (x mevcut)", 1.0, 5.0, 2.0, 0.1, key=f"sim_max_{dataset_label}")
+        region_agg = period_agg[region_mask(period_agg, country_codes, filter_type)]
+        result_df = optimize_within_countries(region_agg, elasticity=elasticity, min_scale=min_scale, max_scale=max_scale)
+        result_df['Country'] = COUNTRIES.display_names(result_df['Country'])
+        changed = result_df[~np.isclose(result_df['New Spend (USD)'], result_df['Current Spend (USD)'])].sort_values(by='Δ Results', ascending=False)
+        id_cols = [UNIVERSAL_ID_COLUMN, 'Country']
+
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Taşınan bütçe", f"${result_df['Δ Spend (USD)'].clip(lower=0).sum():,.2f}")
+    metric_cols[1].metric("Beklenen sonuç", f"{result_df['Expected Results'].sum():,.0f}", f"{result_df['Δ Results'].sum():+,.1f}")
+    current_results = result_df['Current Results'].sum()
+    new_cpr = result_df['New Spend (USD)'].sum() / result_df['Expected Results'].sum() if result_df['Expected Results'].sum() > 0 else 0
+    old_cpr = result_df['Current Spend (USD)'].sum() / current_results if current_results > 0 else 0
+    metric_cols[2].metric("Sonuç başına maliyet", f"${new_cpr:,.2f}", f"{new_cpr - old_cpr:+,.2f}", delta_color="inverse")
+    if changed.empty:
+        st.info("Bu ayarlarla bütçe değişikliği yok.")
+    else:
+        st.dataframe(changed[id_cols + SIMULATION_COLUMNS].style.format(style_formats), use_container_width=True, hide_index=True)
+    st.divider()
+
+@st.cache_data(show_spinner=False)
+def load_crm_leads_cached(paths, signatures):
+    from crm_attribution import load_crm_leads
+    return load_crm_leads(list(paths), COUNTRIES)
+
+@st.cache_data(show_spinner=False)
+def compute_crm_attribution(df, leads, start, end):
+    from crm_attribution import attribute_leads, filter_period
+    period_leads = filter_period(leads, start, end)
+    table, unmatched = attribute_leads(df, period_leads)
+    return table, unmatched, len(period_leads)
+
+def display_crm_attribution(df_processed, period_label, dataset_label):
+    from crm_attribution import ATTRIBUTION_COLUMNS
+    st.header(f"Kampanya Bazlı CRM Atıflandırması ({dataset_label})")
+    crm_paths = tuple(datasets.crm_files)
+    if not crm_paths:
+        st.info(f"Lead bazlı CRM dışa aktarımı bulunamadı. Kampanya/ülke bazlı randevu maliyeti ve CPA için "
+                f"utm_campaign, Country ve Stage sütunlu CSV dosyalarını `{datasets.manifest.get('crm_files')}` konumuna ekleyin.")
+        st.divider()
+        return
+    try:
+        leads = load_crm_leads_cached(crm_paths, tuple(file_signature(path) for path in crm_paths))
+    except ValueError as e:
+        st.error(str(e))
+        return
+    period_config = datasets.periods[period_label]
+    table, unmatched, n_leads = compute_crm_attribution(df_processed, leads, period_config['start'], period_config['end'])
+    table = table.copy()
+    table['Country'] = COUNTRIES.display_names(table['Country'])
+    st.dataframe(table[ATTRIBUTION_COLUMNS].style.format(column_formatters()), use_container_width=True, hide_index=True)
+    st.caption(f"Bu dönemde {n_leads:,} lead var; {unmatched:,} tanesi hiçbir kampanyayla eşleşmedi (utm_campaign etiketi veya aşama tanınmadı).")
+    st.divider()
+
+@st.cache_data
+def compute_region_rollup(df, level):
+    from kpi_tables import region_rollup_table
+    return region_rollup_table(df, level)
+
+def display_region_rollup(period_cells, dataset_label, stored_rollups=None):
+    st.subheader("Bölge / Pazar Kırılımı")
+    level_labels = {"Kıta": 'Region', "Alt Bölge": 'Subregion', "Pazar (Turkic, MENA, EU...)": 'Market'}
+    level = level_labels[st.radio("Gruplama", list(level_labels.keys()), horizontal=True, key=f"region_level_{dataset_label}")]
+    rollup_df = stored_rollups[level] if stored_rollups is not None else compute_region_rollup(period_cells, level)
+    if rollup_df.empty:
+        st.info(f"Bölge kırılımı için veri bulunamadı ({dataset_label}).")
+        return
+    cols_to_display = [level, 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+    st.dataframe(rollup_df[cols_to_display].style.format(column_formatters()), use_container_width=True, hide_index=True)
+    if level == 'Market':
+        st.caption("Not: Pazarlar örtüşebilir (ör. Azerbaycan hem Turkic hem CIS); bir ülkenin harcaması üye olduğu her pazarda sayılır. Pazarlar data/markets.json dosyasından düzenlenir.")
+
+@st.cache_data
+def compute_chart_by_dimension(df, dimension, top_n):
+    from chart_data import kpi_by_dimension
+    summary = kpi_by_dimension(df, dimension, top_n)
+    if dimension == 'Country':
+        summary['Country'] = COUNTRIES.display_names(summary['Country'])
+    return summary
+
+@st.cache_data
+def compute_chart_by_day(df):
+    from chart_data import kpi_by_day
+    return kpi_by_day(df)
+
+@st.cache_data
+def compute_kpi_histogram(df, kpi):
+    from chart_data import kpi_histogram
+    return kpi_histogram(df, kpi)
+
+def display_kpi_charts(df_processed, period_cells, dataset_label, stored_daily=None):
+    import altair as alt
+    from chart_data import CHART_KPIS, DEFAULT_TOP_N
+    st.subheader("Harcama / CTR / CPC Grafikleri")
+    col1, col2 = st.columns(2)
+    kpi = col1.selectbox("Metrik", CHART_KPIS, index=CHART_KPIS.index('CPC (USD)'), key=f"chart_kpi_{dataset_label}")
+    top_n = col2.slider("Gösterilecek ülke / kampanya sayısı", 5, 50, DEFAULT_TOP_N, step=5, key=f"chart_top_{dataset_label}")
+    kpi_format = "$,.2f" if 'USD' in kpi else ".2f"
+    tooltip = [alt.Tooltip('Amount spent (USD):Q', format="$,.2f"), alt.Tooltip('Link clicks:Q', format=",.0f"),
+               alt.Tooltip('Results:Q', format=",.0f"), alt.Tooltip(f'{altair_field(kpi)}:Q', title=kpi, format=kpi_format)]
+    tab_country, tab_campaign, tab_day, tab_hist = st.tabs(["Ülke", "Kampanya", "Gün", "Dağılım"])
+    for tab, dimension in ((tab_country, 'Country'), (tab_campaign, UNIVERSAL_ID_COLUMN)):
+        with tab:
+            summary = compute_chart_by_dimension(period_cells, dimension, top_n)
+            chart = alt.Chart(summary).mark_bar().encode(
+                x=alt.X(f'{altair_field(kpi)}:Q', title=kpi),
+                y=alt.Y(f'{dimension}:N', sort=alt.SortField('Rank'), title=None, axis=alt.Axis(labelLimit=320)),
+                tooltip=[dimension] + tooltip,
+            ).properties(height=max(18 * len(summary), 200))
+            st.altair_chart(chart, use_container_width=True)
+            st.caption(f"Harcamaya göre ilk {top_n}; kalanlar 'Diğer' satırında toplanır.")
+    with tab_day:
+        daily = stored_daily if stored_daily is not None else compute_chart_by_day(df_processed)
+        if daily.empty:
+            st.info(f"Günlük kırılım için tarih sütunu bulunamadı ({dataset_label}).")
+        else:
+            chart = alt.Chart(daily).mark_line(point=True).encode(
+                x=alt.X('Date:T', title=None), y=alt.Y(f'{altair_field(kpi)}:Q', title=kpi), tooltip=[alt.Tooltip('Date:T')] + tooltip)
+            st.altair_chart(chart, use_container_width=True)
+            if len(daily) == 1:
+                st.caption("Bu dönemin dışa aktarımı tek bir raporlama aralığı içeriyor; günlük kırılımlı dışa aktarımla her gün ayrı nokta olur.")
+    with tab_hist:
+        if kpi == 'Amount spent (USD)':
+            st.info("Dağılım grafiği için bir KPI (CTR, CPC, CPM, sonuç başına maliyet) seçin.")
+        else:
+            histogram = compute_kpi_histogram(period_cells, kpi)
+            chart = alt.Chart(histogram).mark_bar().encode(
+                x=alt.X('Bin Start:Q', bin='binned', title=kpi), x2='Bin End:Q',
+                y=alt.Y('Amount spent (USD):Q', title='Harcama (USD)'),
+                tooltip=[alt.Tooltip('Bin Start:Q', format=kpi_format), alt.Tooltip('Bin End:Q', format=kpi_format),
+                         alt.Tooltip('Cells:Q', title='Kampanya × ülke'), alt.Tooltip('Amount spent (USD):Q', format="$,.2f")])
+            st.altair_chart(chart, use_container_width=True)
+            st.caption("Kampanya × ülke hücrelerinin harcama ağırlıklı dağılımı; en üst %1 son dilime kırpılmıştır.")
+
+@st.cache_data
+def compute_heatmap_matrix(df):
+    from kpi_heatmap import SparseMetricMatrix
+    return SparseMetricMatrix.from_frame(df)
+
+def altair_field(column):
+    # Vega-Lite reads '.' in a field name as a nested field ('Avg. Cost per Result (USD)'); escape it.
+    return column.replace('.', '\\.')
+
+def heatmap_cells(matrix, max_campaigns, max_countries):
+    cells = matrix.downsample(max_campaigns, max_countries).to_frame()
+    cells['Country'] = COUNTRIES.display_names(cells['Country'])
+    return cells
+
+@st.cache_data
+def compute_heatmap_cells(df, max_campaigns, max_countries):
+    return heatmap_cells(compute_heatmap_matrix(df), max_campaigns, max_countries)
+
+def display_kpi_heatmap(period_cells, dataset_label, stored_matrix=None):
+    import altair as alt
+    from kpi_heatmap import HEATMAP_VALUES, DEFAULT_MAX_CAMPAIGNS, DEFAULT_MAX_COUNTRIES
+    st.subheader("Kampanya × Ülke KPI Isı Haritası")
+    matrix = stored_matrix if stored_matrix is not None else compute_heatmap_matrix(period_cells)
+    if matrix.nnz == 0:
+        st.info(f"Isı haritası için veri bulunamadı ({dataset_label}).")
+        return
+    col1, col2, col3 = st.columns(3)
+    value = col1.selectbox("Değer", HEATMAP_VALUES, index=HEATMAP_VALUES.index('Avg. Cost per Result (USD)'), key=f"heatmap_value_{dataset_label}")
+    max_campaigns = col2.slider("Kampanya sayısı", 10, 150, DEFAULT_MAX_CAMPAIGNS, step=10, key=f"heatmap_rows_{dataset_label}")
+    max_countries = col3.slider("Ülke sayısı", 5, 60, DEFAULT_MAX_COUNTRIES, step=5, key=f"heatmap_cols_{dataset_label}")
+    if stored_matrix is not None:
+        cells = heatmap_cells(stored_matrix, max_campaigns, max_countries)
+    else:
+        cells = compute_heatmap_cells(period_cells, max_campaigns, max_countries)
+    # Cells without the KPI's denominator (e.g. no results) stay empty instead of showing 0.
+    if value != 'Amount spent (USD)':
+        cells = cells[cells[value] > 0]
+    value_format = "$,.2f" if 'USD' in value else ".2f"
+    chart = alt.Chart(cells).mark_rect().encode(
+        x=alt.X('Country:N', sort=alt.SortField('Column Order'), title=None),
+        y=alt.Y(f'{UNIVERSAL_ID_COLUMN}:N', sort=alt.SortField('Row Order'), title=None, axis=alt.Axis(labelLimit=320)),
+        color=alt.Color(f'{altair_field(value)}:Q', title=value, scale=alt.Scale(scheme='redyellowgreen', reverse=value in ('CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)'))),
+        tooltip=[UNIVERSAL_ID_COLUMN, 'Country', alt.Tooltip('Amount spent (USD):Q', format="$,.2f"),
+                 alt.Tooltip('Results:Q', format=",.0f"), alt.Tooltip(f'{altair_field(value)}:Q', title=value, format=value_format)],
+    ).properties(height=max(16 * cells['Row Order'].nunique(), 200))
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(f"{matrix.shape[0]:,} kampanya × {matrix.shape[1]:,} ülke matrisinin yalnızca {matrix.nnz:,} dolu hücresi hesaplandı "
+               f"(doluluk %{matrix.nnz / (matrix.shape[0] * matrix.shape[1]) * 100:.1f}). Harcamaya göre ilk {max_campaigns} kampanya ve "
+               f"{max_countries} ülke gösterilir; kalanlar 'Diğer' satır/sütununda toplanır. Kampanyalar ana ülkelerine göre gruplanmıştır.")
+
+@st.cache_data
+def compute_flagged_cells(df):
+    from anomaly_scoring import flagged_cells
+    return flagged_cells(df)
+
+def display_anomalies(period_cells, dataset_label, stored_flagged=None):
+    from anomaly_scoring import SCORED_KPIS, DEFAULT_MIN_SPEND, DEFAULT_Z_THRESHOLD
+    st.header(f"Anormal CPC/CPM/CTR Değerleri ({dataset_label})")
+    flagged_df = stored_flagged if stored_flagged is not None else compute_flagged_cells(period_cells)
+    if flagged_df.empty:
+        st.info(f"Anormal KPI değeri olan kampanya/ülke bulunamadı ({dataset_label}).")
+        return
+    display_df = flagged_df.copy()
+    display_df['Country'] = COUNTRIES.display_names(display_df['Country'])
+    display_df = display_df.rename(columns={'Amount spent (USD)': 'Total Spent (USD)'})
+    z_columns = [f"{kpi} z (Ülke)" for kpi in SCORED_KPIS] + [f"{kpi} z (Hesap)" for kpi in SCORED_KPIS]
+    cols_to_display = [UNIVERSAL_ID_COLUMN, 'Country', 'Anomaly KPIs', 'Total Spent (USD)'] + SCORED_KPIS + z_columns
+    style_formats = column_formatters()
+    style_formats.update({col: "{:+.1f}" for col in z_columns})
+    st.dataframe(display_df[cols_to_display].style.format(style_formats, na_rep="—"), use_container_width=True, hide_index=True)
+    st.caption(f"Not: z-skorları medyan/MAD tabanlıdır; |z| > {DEFAULT_Z_THRESHOLD} olan KPI'lar işaretlenir. "
+               f"{DEFAULT_MIN_SPEND:.0f} USD altında harcaması olan hücreler puanlanmaz.")
+    st.divider()
+
+@st.cache_data
+def compute_dimension_kpis(df, dimension):
+    from campaign_name_parser import add_campaign_dimensions, dimension_kpi_table
+    return dimension_kpi_table(add_campaign_dimensions(df, UNIVERSAL_ID_COLUMN), dimension)
+
+def display_campaign_dimensions(period_cells, dataset_label):
+    st.header(f"Kampanya Adı Boyutlarına Göre KPI'lar ({dataset_label})")
+    dimension_labels = {
+        "Bütçe Tipi (CBO/ABO)": 'Budget Type', "Hedef (Objective)": 'Objective', "Hesap": 'Account',
+        "Ürün": 'Product', "Kreatif Ailesi": 'Creative Family', "Pazar": 'Market', "Yayın Haftası": 'Launch Week'
+    }
+    dimension_label = st.selectbox("Gruplama", list(dimension_labels.keys()), key=f"dimension_{dataset_label}")
+    dimension = dimension_labels[dimension_label]
+    dimension_df = compute_dimension_kpis(period_cells, dimension)
+    if dimension_df.empty:
+        st.info(f"Kampanya adlarından '{dimension_label}' bilgisi çıkarılamadı ({dataset_label}).")
+        return
+    cols_to_display = [dimension, 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+    st.dataframe(dimension_df[cols_to_display].rename(columns={dimension: dimension_label}).style.format(column_formatters()), use_container_width=True, hide_index=True)
+    st.caption("Not: Boyutlar kampanya adındaki '|' ile ayrılmış alanlardan çıkarılır; adında ilgili alan olmayan kampanyalar tabloda yer almaz.")
+    st.divider()
+
+@st.cache_resource
+def compute_hierarchy(df, levels):
+    # Built once per dataset; read-only afterwards, so it is shared instead of copied per rerun.
+    from campaign_hierarchy import build_hierarchy
+    return build_hierarchy(df, list(levels))
+
+def display_hierarchy_drilldown(df_processed, dataset_label):
+    level_labels = {'Campaign name': 'Kampanya', UNIVERSAL_ID_COLUMN: 'Reklam Seti', 'Ad name': 'Reklam'}
+    levels = tuple(col for col in level_labels if col in df_processed.columns)
+    if len(levels) < 2:
+        return
+    st.header(f"Kampanya → Reklam Seti → Reklam Detayı ({dataset_label})")
+    hierarchy = compute_hierarchy(df_processed, levels)
+    cols_to_display = ['Name', 'Children', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+    style_formats = column_formatters()
+    style_formats['Children'] = "{:,.0f}"
+
+    nodes = hierarchy.roots()
+    for depth, level in enumerate(levels):
+        nodes_df = hierarchy.nodes_frame(nodes)
+        child_label = level_labels[levels[depth + 1]] if depth + 1 < len(levels) else None
+        renamed = {'Name': level_labels[level], 'Children': f"{child_label} Sayısı" if child_label else 'Children'}
+        display_cols = cols_to_display if child_label else [col for col in cols_to_display if col != 'Children']
+        st.markdown(f"##### {level_labels[level]} Bazlı KPI'lar")
+        st.dataframe(nodes_df[display_cols].rename(columns=renamed).style.format({renamed.get(k, k): v for k, v in style_formats.items()}),
+                     use_container_width=True, hide_index=True)
+        if child_label is None or nodes_df.empty:
+            break
+        node_by_label = dict(zip(nodes_df['Name'], nodes_df['node']))
+        selected = st.selectbox(f"Detayını görmek istediğiniz {level_labels[level].lower()}", ["Seçiniz..."] + list(node_by_label.keys()),
+                                key=f"drilldown_{dataset_label}_{depth}")
+        if selected not in node_by_label:
+            break
+        nodes = hierarchy.children(node_by_label[selected])
+    st.divider()
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_name_index(df):
+    # Built once per period frame over its unique names; read-only, so shared instead of copied.
+    from name_search import NameIndex
+    return NameIndex.from_frame(df)
+
+def apply_name_search(df, query, dataset_label):
+    # Filters the period frame before anything is computed, so every table below shows only the matches.
+    if df is None or not query.strip():
+        return df
+    index = build_name_index(df)
+    started = time.perf_counter()
+    mask = index.row_mask(query)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not mask.any():
+        st.warning(f"'{query}' ile eşleşen kampanya, reklam seti veya reklam adı yok ({dataset_label}).")
+        return None
+    filtered = df[mask].reset_index(drop=True)
+    st.info(f"Arama '{query}': {filtered[UNIVERSAL_ID_COLUMN].nunique():,} reklam seti, {len(filtered):,} satır "
+            f"({len(index):,} benzersiz ad içinde {elapsed_ms:.1f} ms). Tüm tablolar yalnızca eşleşen satırlardan hesaplanır.")
+    return filtered
+
+datasets = load_manifest(file_signature(DEFAULT_MANIFEST_PATH))
+sales_file = datasets.sales_file
+
+@st.cache_resource(show_spinner=False)
+def get_aggregate_store():
+    # One store per server process, shared by every session; its worker keeps the frames and views warm.
+    from aggregate_store import AggregateStore
+    store = AggregateStore(DEFAULT_MANIFEST_PATH)
+    store.start(DATA_POLL_SECONDS)
+    return store
+
+def period_views(period_label):
+    try:
+        return get_aggregate_store().views(period_label, tuple(selected_sources))
+    except Exception as e:
+        # The per-session path below still renders everything; only the sharing is lost.
+        st.warning(f"{period_label} için ortak özet tablolar hazırlanamadı, tablolar bu oturumda hesaplanıyor: {e}")
+        return None
+
+@st.fragment(run_every=DATA_POLL_SECONDS)
+def watch_data_files():
+    # Reruns the page only when a watched file changed (the rerun then re-parses just that file)
+    # or a cleaned export appeared in data/ that the manifest doesn't list yet.
+    signature = tuple(file_signature(path) for path in datasets.watched_files()) + tuple(datasets.unregistered_files())
+    previous = st.session_state.get('data_signature')
+    st.session_state['data_signature'] = signature
+    if previous is not None and previous != signature:
+        st.rerun(scope="app")
+
+watch_data_files()
+
+unregistered_files = datasets.unregistered_files()
+if unregistered_files:
+    st.warning(f"data/ klasöründe kayıtlı olmayan temizlenmiş dosya var: {', '.join(unregistered_files)}. Panoya eklemek için: "
+               "`python src/dataset_registry.py --register <KAYNAK> <DÖNEM> <DOSYA>`")
+kpi_registry_error = load_kpis().error
+if kpi_registry_error:
+    st.warning(kpi_registry_error)
+
+# Parse all files concurrently; each tab below waits only for the data it renders.
+selected_sources = st.multiselect("Veri Kaynakları", datasets.sources, default=datasets.sources,
+                                  help=f"Yalnızca seçili kaynakların dosyaları okunur. data/ klasörü {DATA_POLL_SECONDS} sn'de bir kontrol edilir; değişen dosyalar yeniden yüklenir.")
+if not selected_sources:
+    st.warning("En az bir veri kaynağı seçmelisiniz.")
+    st.stop()
+search_query = st.text_input("Ara", placeholder="Kampanya, reklam seti veya reklam adı (ör. OTPKİ, SA 49, 14D Best Ads)",
+                             help="Büyük/küçük harf ve Türkçe İ/ı farkı gözetilmez; boşlukla ayrılan her parça aynı adda geçmelidir.")
+
+def period_loader(period_label):
+    return (load_period_sources, datasets, period_label, tuple(selected_sources))
+
+def period_source_label(period_label):
+    return ", ".join(p.path for p in datasets.partitions(sources=selected_sources, periods=[period_label]))
+
+def show_out_of_core_notice(period_label):
+    partitions = datasets.partitions(sources=selected_sources, periods=[period_label])
+    if datasets.needs_out_of_core(partitions):
+        st.info(f"Veri boyutu ({datasets.size_bytes(partitions) / 1024 ** 2:,.0f} MB) eşiği aştığı için dosyalar parça parça okunup "
+                "özetlendi (out-of-core mod). Tablolar aynı toplamlardan hesaplanır; satır bazlı bootstrap özet satırlar üzerinde çalışır.")
+
+data_futures = start_loading({'p1': period_loader('10-22 Mayıs'), 'p2': period_loader('23-29 Mayıs'), 'sales': (load_data, sales_file, file_signature(sales_file))})
 
 # Define common display elements
 spending_threshold = 30
-cols_to_display_countries = ['Country', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+cols_to_display_countries = ['Country', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)'] + custom_kpi_columns()
 # style_format_countries is already available from column_formatters()
 
 period1_title = "Dönem Analizi (10-22 Mayıs)"
 period2_title = "Dönem Analizi (23-29 Mayıs)"
 
-tab_p1, tab_p2 = st.tabs([period1_title, period2_title])
+comparison_title = "Dönem Karşılaştırması"
+
+tab_p1, tab_p2, tab_cmp = st.tabs([period1_title, period2_title, comparison_title])
+
+df_sales = wait_for_data(data_futures, 'sales')
 
 with tab_p1:
     st.header(period1_title)
+    df_p1 = apply_name_search(wait_for_data(data_futures, 'p1'), search_query, period1_title)
     if df_p1 is not None:
-        st.subheader(f"Veri Kaynağı: `{combined_file_p1}`")
-        df_p1_processed = calculate_kpis_for_display(df_p1.copy())
-        country_summary_kpis_p1 = prepare_country_kpis(df_p1_processed, dataset_name=period1_title)
+        st.subheader(f"Veri Kaynağı: `{period_source_label('10-22 Mayıs')}`")
+        show_out_of_core_notice('10-22 Mayıs')
+        df_p1_processed = df_p1  # the store's frames already carry the delivery KPIs
+        # Shared aggregates and the persisted sample cover the whole period; a search recomputes from the matches.
+        views_p1 = period_views('10-22 Mayıs') if not search_query.strip() else None
+        stored_p1 = views_p1 or {}
+        cells_p1 = stored_p1['cells'] if views_p1 is not None else compute_period_aggregate(df_p1)
+        approx_p1 = approximate_preview(df_p1_processed, '10-22 Mayıs', period1_title) if not search_query.strip() else None
+        if approx_p1 is not None:
+            country_summary_kpis_p1 = approx_p1['country_kpis']
+        else:
+            country_summary_kpis_p1 = views_p1['country_kpis'] if views_p1 is not None else prepare_country_kpis(cells_p1, dataset_name=period1_title)
+        country_cols_p1 = cols_to_display_countries + result_type_display_columns(country_summary_kpis_p1) + (approx_p1['columns'] if approx_p1 is not None else [])
 
         # --- Country KPIs for Period 1 ---
         st.subheader("Ülke Bazlı Genel KPI'lar")
         st.markdown(f"##### Harcaması {spending_threshold} USD Üzerinde Olan Ülkeler")
         top_countries_df_p1 = country_summary_kpis_p1[country_summary_kpis_p1['Total Spent (USD)'] > spending_threshold]
-        if not top_countries_df_p1.empty: st.dataframe(top_countries_df_p1[cols_to_display_countries].style.format(column_formatters()), use_container_width=True)
+        if not top_countries_df_p1.empty: st.dataframe(top_countries_df_p1[country_cols_p1].style.format(interval_formatters(country_cols_p1)), use_container_width=True)
         else: st.info(f"Belirtilen harcama üzerinde ülke bulunamadı.")
+        if result_type_display_columns(country_summary_kpis_p1):
+            st.caption("Not: Bu dönemde birden fazla sonuç tipi var; 'Total Results' hepsini toplar. 'Results: <tip>' ve 'Cost per Result: <tip>' sütunları tip bazındadır.")
         st.markdown("##### Türkiye (TR) ve Azerbaycan (AZ) için Özel KPI'lar")
         tr_az_df_p1 = country_summary_kpis_p1[country_summary_kpis_p1['Country'].isin(['Turkey', 'Azerbaijan'])]
-        if not tr_az_df_p1.empty: st.dataframe(tr_az_df_p1[cols_to_display_countries].style.format(column_formatters()), use_container_width=True)
+        if not tr_az_df_p1.empty: st.dataframe(tr_az_df_p1[country_cols_p1].style.format(interval_formatters(country_cols_p1)), use_container_width=True)
         else: st.info("TR veya AZ için veri bulunamadı.")
         st.markdown("##### Global Ortalamalar (TR ve AZ Hariç)")
         df_global_avg_src_p1 = df_p1_processed[~df_p1_processed['Country'].isin(['TR', 'AZ'])]
@@ -270,31 +861,58 @@ with tab_p1:
             global_avg_display_df_p1 = pd.DataFrame(global_avg_data_p1)
             st.dataframe(global_avg_display_df_p1.style.format(column_formatters()), use_container_width=True)
         else: st.info(f"Global ortalama için TR/AZ dışında veri bulunamadı ({period1_title}).")
+        display_region_rollup(cells_p1, period1_title, stored_rollups=stored_p1.get('region_rollups'))
+        display_kpi_charts(df_p1_processed, cells_p1, period1_title, stored_daily=stored_p1.get('daily'))
+        display_kpi_heatmap(cells_p1, period1_title, stored_matrix=stored_p1.get('heatmap'))
         st.divider()
         # --- Campaign/Ad Set Analysis for Period 1 ---
-        display_ad_set_analysis_modified(df_p1_processed, generic_analyze_ad_sets, UNIVERSAL_ID_COLUMN, period1_title)
+        display_ad_set_analysis_modified(df_p1_processed, generic_analyze_ad_sets, UNIVERSAL_ID_COLUMN, period1_title,
+                                         stored_tables=approx_p1['ad_sets'] if approx_p1 is not None else (views_p1['ad_sets'] if views_p1 is not None else None),
+                                         extra_columns=approx_p1['columns'] if approx_p1 is not None else None)
         st.divider()
+        display_budget_simulator(cells_p1, period1_title)
+        display_crm_attribution(df_p1_processed, '10-22 Mayıs', period1_title)
+        display_anomalies(cells_p1, period1_title, stored_flagged=stored_p1.get('anomalies'))
+        display_campaign_dimensions(cells_p1, period1_title)
+        display_hierarchy_drilldown(df_p1_processed, period1_title)
         # --- Sales Funnel for Period 1 (22 Mayıs) ---
-        if df_sales is not None:
+        # Sales counts are per region for the whole period, so they can't be divided by a searched subset's spend.
+        if df_sales is not None and search_query.strip():
+            st.info("Bölgesel Satış KPI'ları (22 Mayıs) arama sırasında gösterilmez: randevu/satış sayıları kampanya bazında değil, dönemin tamamı için.")
+        elif df_sales is not None:
             sales_p1_data = df_sales[df_sales['Period'] == '22 Mayıs']
-            display_regional_sales_kpis("22 Mayıs", df_p1_processed, sales_p1_data, country_code_to_name_map)
-    else: st.error(f"`{combined_file_p1}` yüklenemedi.")
+            display_regional_sales_kpis("22 Mayıs", df_p1_processed, sales_p1_data, country_code_to_name_map,
+                                        stored_table=views_p1['regional_sales'] if views_p1 is not None else None)
+    elif not search_query.strip(): st.error(f"10-22 Mayıs verisi yüklenemedi.")
 
 with tab_p2:
     st.header(period2_title)
+    df_p2 = apply_name_search(wait_for_data(data_futures, 'p2'), search_query, period2_title)
     if df_p2 is not None:
-        st.subheader(f"Veri Kaynağı: `{combined_file_p2}`")
-        df_p2_processed = calculate_kpis_for_display(df_p2.copy())
-        country_summary_kpis_p2 = prepare_country_kpis(df_p2_processed, dataset_name=period2_title)
+        st.subheader(f"Veri Kaynağı: `{period_source_label('23-29 Mayıs')}`")
+        show_out_of_core_notice('23-29 Mayıs')
+        df_p2_processed = df_p2  # the store's frames already carry the delivery KPIs
+        # Shared aggregates and the persisted sample cover the whole period; a search recomputes from the matches.
+        views_p2 = period_views('23-29 Mayıs') if not search_query.strip() else None
+        stored_p2 = views_p2 or {}
+        cells_p2 = stored_p2['cells'] if views_p2 is not None else compute_period_aggregate(df_p2)
+        approx_p2 = approximate_preview(df_p2_processed, '23-29 Mayıs', period2_title) if not search_query.strip() else None
+        if approx_p2 is not None:
+            country_summary_kpis_p2 = approx_p2['country_kpis']
+        else:
+            country_summary_kpis_p2 = views_p2['country_kpis'] if views_p2 is not None else prepare_country_kpis(cells_p2, dataset_name=period2_title)
+        country_cols_p2 = cols_to_display_countries + result_type_display_columns(country_summary_kpis_p2) + (approx_p2['columns'] if approx_p2 is not None else [])
         # --- Country KPIs for Period 2 (similar to Period 1) ---
         st.subheader("Ülke Bazlı Genel KPI'lar")
         st.markdown(f"##### Harcaması {spending_threshold} USD Üzerinde Olan Ülkeler")
         top_countries_df_p2 = country_summary_kpis_p2[country_summary_kpis_p2['Total Spent (USD)'] > spending_threshold]
-        if not top_countries_df_p2.empty: st.dataframe(top_countries_df_p2[cols_to_display_countries].style.format(column_formatters()), use_container_width=True)
+        if not top_countries_df_p2.empty: st.dataframe(top_countries_df_p2[country_cols_p2].style.format(interval_formatters(country_cols_p2)), use_container_width=True)
         else: st.info(f"Belirtilen harcama üzerinde ülke bulunamadı.")
+        if result_type_display_columns(country_summary_kpis_p2):
+            st.caption("Not: Bu dönemde birden fazla sonuç tipi var; 'Total Results' hepsini toplar. 'Results: <tip>' ve 'Cost per Result: <tip>' sütunları tip bazındadır.")
         st.markdown("##### Türkiye (TR) ve Azerbaycan (AZ) için Özel KPI'lar")
         tr_az_df_p2 = country_summary_kpis_p2[country_summary_kpis_p2['Country'].isin(['Turkey', 'Azerbaijan'])]
-        if not tr_az_df_p2.empty: st.dataframe(tr_az_df_p2[cols_to_display_countries].style.format(column_formatters()), use_container_width=True)
+        if not tr_az_df_p2.empty: st.dataframe(tr_az_df_p2[country_cols_p2].style.format(interval_formatters(country_cols_p2)), use_container_width=True)
         else: st.info("TR veya AZ için veri bulunamadı.")
         st.markdown("##### Global Ortalamalar (TR ve AZ Hariç)")
         df_global_avg_src_p2 = df_p2_processed[~df_p2_processed['Country'].isin(['TR', 'AZ'])]
@@ -317,15 +935,40 @@ with tab_p2:
             global_avg_display_df_p2 = pd.DataFrame(global_avg_data_p2)
             st.dataframe(global_avg_display_df_p2.style.format(column_formatters()), use_container_width=True)
         else: st.info(f"Global ortalama için TR/AZ dışında veri bulunamadı ({period2_title}).")
+        display_region_rollup(cells_p2, period2_title, stored_rollups=stored_p2.get('region_rollups'))
+        display_kpi_charts(df_p2_processed, cells_p2, period2_title, stored_daily=stored_p2.get('daily'))
+        display_kpi_heatmap(cells_p2, period2_title, stored_matrix=stored_p2.get('heatmap'))
         st.divider()
         # --- Campaign/Ad Set Analysis for Period 2 ---
-        display_ad_set_analysis_modified(df_p2_processed, generic_analyze_ad_sets, UNIVERSAL_ID_COLUMN, period2_title)
+        display_ad_set_analysis_modified(df_p2_processed, generic_analyze_ad_sets, UNIVERSAL_ID_COLUMN, period2_title,
+                                         stored_tables=approx_p2['ad_sets'] if approx_p2 is not None else (views_p2['ad_sets'] if views_p2 is not None else None),
+                                         extra_columns=approx_p2['columns'] if approx_p2 is not None else None)
         st.divider()
+        display_budget_simulator(cells_p2, period2_title)
+        display_crm_attribution(df_p2_processed, '23-29 Mayıs', period2_title)
+        display_anomalies(cells_p2, period2_title, stored_flagged=stored_p2.get('anomalies'))
+        display_campaign_dimensions(cells_p2, period2_title)
+        display_hierarchy_drilldown(df_p2_processed, period2_title)
         # --- Sales Funnel for Period 2 (29 Mayıs) ---
-        if df_sales is not None:
+        # Sales counts are per region for the whole period, so they can't be divided by a searched subset's spend.
+        if df_sales is not None and search_query.strip():
+            st.info("Bölgesel Satış KPI'ları (29 Mayıs) arama sırasında gösterilmez: randevu/satış sayıları kampanya bazında değil, dönemin tamamı için.")
+        elif df_sales is not None:
             sales_p2_data = df_sales[df_sales['Period'] == '29 Mayıs']
-            display_regional_sales_kpis("29 Mayıs", df_p2_processed, sales_p2_data, country_code_to_name_map)
-    else: st.error(f"`{combined_file_p2}` yüklenemedi.")
+            display_regional_sales_kpis("29 Mayıs", df_p2_processed, sales_p2_data, country_code_to_name_map,
+                                        stored_table=views_p2['regional_sales'] if views_p2 is not None else None)
+    elif not search_query.strip(): st.error(f"23-29 Mayıs verisi yüklenemedi.")
+
+with tab_cmp:
+    st.header(f"{comparison_title} (10-22 Mayıs → 23-29 Mayıs)")
+    if df_p1 is not None and df_p2 is not None:
+        display_period_comparison({"10-22 Mayıs": df_p1, "23-29 Mayıs": df_p2})
+    else: st.error("Karşılaştırma için iki dönemin de verisi yüklenmiş (ve aramayla eşleşmiş) olmalı.")
+    if df_p1 is not None or df_p2 is not None:
+        # Without a search the frames are the store's, whose key columns are already factorized.
+        creative_keys = None if search_query.strip() else {label: get_aggregate_store().period_keys(label, tuple(selected_sources))
+                                                           for label, df in (("10-22 Mayıs", df_p1), ("23-29 Mayıs", df_p2)) if df is not None}
+        display_creative_rollups({"10-22 Mayıs": df_p1, "23-29 Mayıs": df_p2}, creative_keys)
 
 # Note: Removed st.sidebar.header("Ayarlar") as per user action in previous step.
 
@@ -0,0 +1,221 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, TOTAL_COLUMN_NAMES, add_kpi_columns, group_codes, metric_matrix, sum_by_codes
+from kpi_intervals import high_column, low_column, z_value
+from snapshots import publishing
+
+# Approximate preview of the country and ad-set views from a small persisted sample.
+# Rows are drawn per country (stratum) with probability proportional to spend (systematic PPS
+# sampling), so the big spenders are taken with certainty and the many small rows are thinned
+# out. Totals are Horvitz-Thompson estimates (sum of value / inclusion probability) and KPIs are
+# ratios of those totals; the bounds come from the per-stratum variance of the weighted values
+# (linearized for ratios), to which rows taken with certainty add nothing, widened like a t
+# interval when a group has few random draws. They are approximate: results are rare and lumpy,
+# so a group with a handful of sampled rows is covered noticeably less often than the nominal
+# level (ad sets more so than countries). The sample is saved as parquet with the signature of
+# the files it was drawn from and is redrawn when they change.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+DEFAULT_SAMPLE_DIR = 'data/samples'
+DEFAULT_FRACTION = 0.02
+MIN_ROWS_PER_COUNTRY = 5
+# Random (not certain) draws kept per stratum, so rows crowded out by big spenders still get a chance.
+MIN_RANDOM_DRAWS = 2
+DEFAULT_CONFIDENCE = 0.95
+WEIGHT_COLUMN = 'Sample Weight'
+SAMPLE_COLUMNS = [UNIVERSAL_ID_COLUMN, 'Country'] + BASE_METRICS
+
+# KPI -> (numerator metric, denominator metric, multiplier)
+RATIO_KPIS = {
+    'CTR (%)': ('Link clicks', 'Impressions', 100),
+    'CPC (USD)': ('Amount spent (USD)', 'Link clicks', 1),
+    'CPM (USD)': ('Amount spent (USD)', 'Impressions', 1000),
+    'Avg. Cost per Result (USD)': ('Amount spent (USD)', 'Results', 1),
+}
+INTERVAL_TOTALS = ['Amount spent (USD)', 'Results']
+
+
+def inclusion_probabilities(spend, strata, fraction=DEFAULT_FRACTION, min_rows=MIN_ROWS_PER_COUNTRY):
+    """
+    PPS inclusion probability per row: about max(min_rows, fraction * rows) expected draws per
+    stratum among the rows with spend, proportional to spend. Rows whose share would exceed 1
+    are taken with certainty and the rest re-spread over at least MIN_RANDOM_DRAWS draws, so no
+    row with spend ends up with probability 0. Rows without spend are drawn uniformly with
+    probability `fraction` (they only carry impressions/clicks).
+    """
+    spend = np.maximum(np.asarray(spend, dtype=np.float64), 0)
+    strata = np.asarray(strata, dtype=np.int64)
+    n_strata = int(strata.max()) + 1 if len(strata) else 0
+    spending = spend > 0
+    rows = np.bincount(strata, weights=spending, minlength=n_strata)
+    target = np.minimum(np.maximum(np.ceil(rows * fraction), min_rows), rows)
+    certain = np.zeros(len(spend), dtype=bool)
+    prob = np.ones(len(spend))
+    # Each pass fixes the rows that would exceed 1; a few passes settle any realistic spend skew.
+    for _ in range(20):
+        n_certain = np.bincount(strata, weights=certain, minlength=n_strata)
+        remaining_target = np.maximum(target - n_certain, np.minimum(MIN_RANDOM_DRAWS, rows - n_certain))
+        remaining_spend = np.bincount(strata, weights=np.where(certain, 0, spend), minlength=n_strata)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prob = np.where(certain, 1.0, remaining_target[strata] * spend / remaining_spend[strata])
+        newly_certain = spending & ~certain & (prob >= 1)
+        if not newly_certain.any():
+            break
+        certain |= newly_certain
+    prob = np.clip(np.nan_to_num(prob, nan=1.0), 0, 1)
+    return np.where(spending, prob, min(max(fraction, 0), 1))
+
+
+def _sampling_strata(countries, spend):
+    """Stratum code per row: country x (has spend), the two groups are drawn differently."""
+    country_codes, _ = pd.factorize(pd.Series(countries), use_na_sentinel=False)
+    return country_codes.astype(np.int64) * 2 + (np.asarray(spend) > 0)
+
+
+def systematic_draw(prob, strata, rng):
+    """
+    Systematic sampling within each stratum over a random row order: row i is taken when a
+    point of u, u+1, u+2, ... (one random start u per stratum) falls in its slice of the
+    cumulative inclusion probabilities. The sample size per stratum is then fixed, so a
+    stratum's spend estimate doesn't vary with how many rows happened to be drawn.
+    """
+    n_strata = int(strata.max()) + 1 if len(strata) else 0
+    order = rng.permutation(len(prob))
+    order = order[np.argsort(strata[order], kind='stable')]
+    p_sorted, s_sorted = prob[order], strata[order]
+    cumulative = np.cumsum(p_sorted)
+    before = cumulative - p_sorted
+    first = np.searchsorted(s_sorted, np.arange(n_strata))
+    base = before[np.minimum(first, len(prob) - 1)] if len(prob) else np.zeros(0)
+    start = rng.random(n_strata)
+    hit = np.floor(cumulative - base[s_sorted] + start[s_sorted]) > np.floor(before - base[s_sorted] + start[s_sorted])
+    taken = np.zeros(len(prob), dtype=bool)
+    taken[order] = hit | (p_sorted >= 1)
+    return taken
+
+
+def draw_sample(df, fraction=DEFAULT_FRACTION, seed=0, min_rows=MIN_ROWS_PER_COUNTRY):
+    """Spend-weighted sample of `df` stratified by Country, with a WEIGHT_COLUMN of 1 / inclusion probability."""
+    columns = [col for col in SAMPLE_COLUMNS if col in df.columns]
+    values = metric_matrix(df, BASE_METRICS)
+    spend = values[:, BASE_METRICS.index('Amount spent (USD)')]
+    strata = _sampling_strata(df['Country'], spend)
+    prob = inclusion_probabilities(spend, strata // 2, fraction, min_rows)
+    taken = systematic_draw(prob, strata, np.random.default_rng(seed))
+    sample = df.loc[taken, columns].reset_index(drop=True)
+    for i, metric in enumerate(BASE_METRICS):
+        sample[metric] = values[taken, i]
+    sample[WEIGHT_COLUMN] = 1 / prob[taken]
+    return sample
+
+
+def sample_path(period_slug, sources, sample_dir=DEFAULT_SAMPLE_DIR):
+    return os.path.join(sample_dir, f"{period_slug}__{'_'.join(sorted(sources))}.parquet")
+
+
+def load_or_build_sample(df, path, signature, fraction=DEFAULT_FRACTION):
+    """
+    The persisted sample at `path` if it was drawn from data with `signature` and `fraction`;
+    otherwise draws a new one from `df` and saves it.
+    """
+    signature = [list(part) if part is not None else None for part in signature]
+    try:
+        sample = pd.read_parquet(path)
+        if sample.attrs.get('signature') == signature and sample.attrs.get('fraction') == fraction:
+            return sample
+    except (FileNotFoundError, OSError, ValueError):
+        pass
+    sample = draw_sample(df, fraction)
+    sample.attrs = {'signature': signature, 'fraction': fraction, 'source_rows': len(df)}
+    # Sessions may rebuild the same sample concurrently; each publishes a complete file atomically.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with publishing(path, keep=1) as snapshot_path:
+        sample.to_parquet(snapshot_path, index=False)
+    return sample
+
+
+def _domain_variance(z, codes, strata, random_rows, n_groups):
+    """
+    Variance of the estimated total of z (= value / inclusion probability) per group, with the
+    usual with-replacement approximation per stratum: n/(n-1) * sum((z - mean z)**2) over the
+    stratum's randomly drawn rows (z counted as 0 outside the group). Certain rows add nothing.
+    """
+    n_strata = int(strata.max()) + 1 if len(strata) else 0
+    n_drawn = np.bincount(strata[random_rows], minlength=n_strata).astype(np.float64)
+    rows = random_rows & (codes >= 0)
+    pair_codes, pairs = pd.factorize(codes[rows] * n_strata + strata[rows])
+    sum_z = np.bincount(pair_codes, weights=z[rows], minlength=len(pairs))
+    sum_z2 = np.bincount(pair_codes, weights=z[rows] ** 2, minlength=len(pairs))
+    n = n_drawn[pairs % n_strata]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_pair = np.where(n > 1, n / (n - 1) * (sum_z2 - sum_z ** 2 / n), sum_z2)
+    return np.bincount(pairs // n_strata, weights=np.maximum(per_pair, 0), minlength=n_groups)
+
+
+def _small_sample_quantile(z, n):
+    """Normal quantile `z` widened to (approximately) Student's t with n - 1 degrees of freedom (Cornish-Fisher)."""
+    dof = np.maximum(np.asarray(n, dtype=np.float64) - 1, 1)
+    return z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+
+
+def estimate(sample, key_columns, confidence=DEFAULT_CONFIDENCE):
+    """
+    HT totals and KPIs per group of `key_columns`, with approximate bounds at `confidence`
+    (nominal; see the module comment for the coverage actually reached).
+    Returns:
+        pd.DataFrame: Raw-named estimated totals and KPI_COLUMNS per group, plus
+            low_column/high_column bounds for INTERVAL_TOTALS and every ratio KPI.
+    """
+    codes, keys_df = group_codes(sample, key_columns)
+    n_groups = len(keys_df)
+    values = metric_matrix(sample, BASE_METRICS)
+    weight = sample[WEIGHT_COLUMN].to_numpy(dtype=np.float64)
+    strata = _sampling_strata(sample['Country'], values[:, BASE_METRICS.index('Amount spent (USD)')])
+    random_rows = weight > 1 + 1e-9
+    totals = sum_by_codes(values * weight[:, None], codes, n_groups)
+    result = keys_df.copy()
+    for i, metric in enumerate(BASE_METRICS):
+        result[metric] = totals[:, i]
+    add_kpi_columns(result)
+    n_random = np.bincount(codes[random_rows & (codes >= 0)], minlength=n_groups)
+    z = _small_sample_quantile(z_value(confidence), n_random)
+    for metric in INTERVAL_TOTALS:
+        i = BASE_METRICS.index(metric)
+        half_width = z * np.sqrt(_domain_variance(values[:, i] * weight, codes, strata, random_rows, n_groups))
+        result[low_column(TOTAL_COLUMN_NAMES[metric])] = np.maximum(totals[:, i] - half_width, 0)
+        result[high_column(TOTAL_COLUMN_NAMES[metric])] = totals[:, i] + half_width
+    for kpi, (numerator, denominator, multiplier) in RATIO_KPIS.items():
+        num = values[:, BASE_METRICS.index(numerator)]
+        den = values[:, BASE_METRICS.index(denominator)]
+        den_total = totals[:, BASE_METRICS.index(denominator)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(den_total > 0, totals[:, BASE_METRICS.index(numerator)] / den_total, np.nan)
+            # Linearized ratio variance: the variance of the total of residuals num - R * den.
+            residual = num - np.nan_to_num(ratio)[np.maximum(codes, 0)] * den
+            ratio_var = _domain_variance(residual * weight, codes, strata, random_rows, n_groups) / den_total ** 2
+            half_width = z * np.sqrt(ratio_var) * multiplier
+        result[low_column(kpi)] = np.where(den_total > 0, np.maximum(ratio * multiplier - half_width, 0), 0)
+        result[high_column(kpi)] = np.where(den_total > 0, ratio * multiplier + half_width, 0)
+    return result
+
+
+def approximate_country_kpis(sample, confidence=DEFAULT_CONFIDENCE):
+    """Estimated counterpart of kpi_tables.country_kpi_table (country codes, not names), sorted by spend."""
+    if sample.empty:
+        return pd.DataFrame()
+    table = estimate(sample, ['Country'], confidence).rename(columns=TOTAL_COLUMN_NAMES)
+    return table.sort_values(by='Total Spent (USD)', ascending=False)
+
+
+def approximate_ad_set_tables(sample, country_codes, filter_type, top_n=10, confidence=DEFAULT_CONFIDENCE):
+    """Estimated counterpart of global_analyzer.analyze_ad_sets: (top_by_results_df, top_by_spent_df)."""
+    in_codes = sample['Country'].isin(country_codes).to_numpy()
+    region = sample[in_codes if filter_type == 'include' else ~in_codes]
+    if region.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    summary = estimate(region, [UNIVERSAL_ID_COLUMN], confidence).rename(columns={**TOTAL_COLUMN_NAMES, UNIVERSAL_ID_COLUMN: 'Ad Set Name'})
+    return (summary.sort_values(by='Total Results', ascending=False).head(top_n),
+            summary.sort_values(by='Total Spent (USD)', ascending=False).head(top_n))
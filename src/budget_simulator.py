@@ -0,0 +1,160 @@
+import numpy as np
+
+from aggregates import group_codes
+
+# "What if" budget reallocation across ad sets. Every ad set gets a diminishing-returns curve
+# results(s) = a * s**e through its observed (spend, results) point, so its marginal cost per
+# result rises as it gets more money (e = elasticity; 1 would be a constant cost per result).
+# For a fixed budget per group (country, or the set of recipient ad sets), results are maximized
+# where all marginal returns are equal; the common level is found by bisection on log(lambda)
+# for every group at once, with per-ad-set spend bounds, so thousands of ad sets solve in ms.
+
+DEFAULT_ELASTICITY = 0.7
+DEFAULT_MAX_SCALE = 2.0
+BISECTION_STEPS = 60
+
+SIMULATION_COLUMNS = ['Current Spend (USD)', 'New Spend (USD)', 'Δ Spend (USD)', 'Current Results', 'Expected Results', 'Δ Results']
+
+
+def response_scale(spend, results, elasticity=DEFAULT_ELASTICITY):
+    """The `a` of results = a * spend**elasticity through each observed point (0 without spend or results)."""
+    spend = np.asarray(spend, dtype=np.float64)
+    results = np.asarray(results, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((spend > 0) & (results > 0), results / spend ** elasticity, 0.0)
+
+
+def expected_results(scale, spend, elasticity=DEFAULT_ELASTICITY):
+    return scale * np.maximum(spend, 0) ** elasticity
+
+
+def allocate_budget(scale, groups, budgets, low, high, elasticity=DEFAULT_ELASTICITY):
+    """
+    Spend per ad set maximizing total expected results, for every group at once.
+    Args:
+        scale (np.ndarray): Response scale per ad set (response_scale).
+        groups (np.ndarray): Group code per ad set (0..n_groups-1); each group's spend sums to its budget.
+        budgets (np.ndarray): Budget per group; clipped to what the bounds allow.
+        low, high (np.ndarray): Spend bounds per ad set.
+        elasticity (float): Response curve exponent, 0 < elasticity < 1.
+    Returns:
+        np.ndarray: New spend per ad set.
+    """
+    if not 0 < elasticity < 1:
+        raise ValueError("elasticity must be between 0 and 1.")
+    groups = np.asarray(groups, dtype=np.int64)
+    n_groups = len(budgets)
+    low = np.asarray(low, dtype=np.float64)
+    high = np.maximum(np.asarray(high, dtype=np.float64), low)
+    budgets = np.clip(np.asarray(budgets, dtype=np.float64),
+                      np.bincount(groups, weights=low, minlength=n_groups),
+                      np.bincount(groups, weights=high, minlength=n_groups))
+    exponent = 1 / (1 - elasticity)
+    # Unconstrained optimum for multiplier lam: s = (a * e / lam) ** exponent; solved in log space.
+    log_weight = np.where(scale > 0, np.log(np.where(scale > 0, scale * elasticity, 1.0)), -np.inf)
+
+    def spend_at(log_lam):
+        with np.errstate(over='ignore'):
+            unclipped = np.exp(np.clip((log_weight - log_lam[groups]) * exponent, -700, 700))
+        return np.clip(np.where(scale > 0, unclipped, 0.0), low, high)
+
+    log_lo = np.full(n_groups, -60.0)  # tiny lam: everyone at their upper bound
+    log_hi = np.full(n_groups, 60.0)   # huge lam: everyone at their lower bound
+    for _ in range(BISECTION_STEPS):
+        mid = (log_lo + log_hi) / 2
+        allocated = np.bincount(groups, weights=spend_at(mid), minlength=n_groups)
+        too_much = allocated > budgets
+        log_lo = np.where(too_much, mid, log_lo)
+        log_hi = np.where(too_much, log_hi, mid)
+    spend = spend_at(log_hi)
+    # Budget the curves can't absorb (e.g. ad sets without results) is spread pro rata over headroom.
+    shortfall = budgets - np.bincount(groups, weights=spend, minlength=n_groups)
+    headroom = high - spend
+    group_headroom = np.bincount(groups, weights=headroom, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(group_headroom[groups] > 0, headroom / group_headroom[groups], 0.0)
+    return spend + np.maximum(shortfall[groups], 0) * share
+
+
+def _simulation_frame(keys_df, spend, new_spend, results, scale, elasticity):
+    frame = keys_df.reset_index(drop=True).copy()
+    frame['Current Spend (USD)'] = spend
+    frame['New Spend (USD)'] = new_spend
+    frame['Δ Spend (USD)'] = new_spend - spend
+    frame['Current Results'] = results
+    # Ad sets whose spend didn't change keep their observed results exactly.
+    expected = np.where(np.isclose(new_spend, spend), results, expected_results(scale, new_spend, elasticity))
+    frame['Expected Results'] = expected
+    frame['Δ Results'] = expected - results
+    return frame
+
+
+def simulate_shift(ad_set_summary, amount, donor_share=0.2, recipient_share=0.2,
+                   elasticity=DEFAULT_ELASTICITY, max_scale=DEFAULT_MAX_SCALE, id_column='Ad Set Name'):
+    """
+    Moves `amount` USD from the worst to the best ad sets (by cost per result) of one region.
+    Args:
+        ad_set_summary (pd.DataFrame): analyze_ad_sets-style table ('Total Spent (USD)', 'Total Results').
+        amount (float): USD to move; capped at the donors' total spend and at what the
+            recipients can absorb ((max_scale - 1) x their spend), so total spend is unchanged.
+        donor_share, recipient_share (float): Fractions of spending ad sets treated as worst / best.
+        max_scale (float): A recipient can grow to at most max_scale x its current spend.
+    Returns:
+        pd.DataFrame: One row per ad set with current/new spend and current/expected results.
+            Donors are cut pro rata; recipients split the money to equalize marginal cost.
+            frame.attrs['moved'] is the USD actually moved.
+    """
+    summary = ad_set_summary[ad_set_summary['Total Spent (USD)'] > 0].reset_index(drop=True)
+    spend = summary['Total Spent (USD)'].to_numpy(dtype=np.float64)
+    results = summary['Total Results'].to_numpy(dtype=np.float64)
+    scale = response_scale(spend, results, elasticity)
+    n = len(summary)
+    if n == 0:
+        frame = _simulation_frame(summary[[id_column]], spend, spend, results, scale, elasticity)
+        frame.attrs['moved'] = 0.0
+        return frame
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cost_per_result = np.where(results > 0, spend / results, np.inf)
+    order = np.argsort(cost_per_result, kind='stable')  # best first; ad sets without results last
+    n_recipients = max(int(round(n * recipient_share)), 1)
+    n_donors = min(max(int(round(n * donor_share)), 1), n - n_recipients)
+    recipients = order[:n_recipients]
+    donors = order[n - n_donors:] if n_donors > 0 else order[:0]
+
+    new_spend = spend.copy()
+    headroom = spend[recipients].sum() * max(max_scale - 1, 0)
+    moved = min(float(amount), spend[donors].sum(), headroom)
+    if moved > 0:
+        new_spend[donors] = spend[donors] * (1 - moved / spend[donors].sum())
+        recipient_budget = np.array([spend[recipients].sum() + moved])
+        new_spend[recipients] = allocate_budget(scale[recipients], np.zeros(n_recipients, dtype=np.int64), recipient_budget,
+                                                spend[recipients], spend[recipients] * max_scale, elasticity)
+    frame = _simulation_frame(summary[[id_column]], spend, new_spend, results, scale, elasticity)
+    frame['Role'] = np.where(np.isin(np.arange(n), donors), 'Donor', np.where(np.isin(np.arange(n), recipients), 'Recipient', ''))
+    frame.attrs['moved'] = moved
+    return frame
+
+
+def optimize_within_countries(period_agg, country_budgets=None, elasticity=DEFAULT_ELASTICITY,
+                              min_scale=0.0, max_scale=DEFAULT_MAX_SCALE, id_column='Universal_Campaign_ID'):
+    """
+    Re-optimizes every (ad set, country) cell with one budget per country.
+    Args:
+        period_agg (pd.DataFrame): Raw-named sums per (id_column, Country) (kpi_tables.period_aggregate).
+        country_budgets (dict): Country code -> budget; countries not listed keep their current spend.
+        min_scale, max_scale (float): Each cell's new spend stays within [min_scale, max_scale] x current.
+    Returns:
+        pd.DataFrame: One row per cell with current/new spend and current/expected results.
+    """
+    cells = period_agg[(period_agg['Amount spent (USD)'] > 0) & period_agg['Country'].notna() & period_agg[id_column].notna()].reset_index(drop=True)
+    country_codes, countries = group_codes(cells, ['Country'])
+    spend = cells['Amount spent (USD)'].to_numpy(dtype=np.float64)
+    results = cells['Results'].to_numpy(dtype=np.float64)
+    scale = response_scale(spend, results, elasticity)
+    budgets = np.bincount(country_codes, weights=spend, minlength=len(countries))
+    for i, country in enumerate(countries['Country']):
+        if country_budgets and country in country_budgets:
+            budgets[i] = country_budgets[country]
+    new_spend = allocate_budget(scale, country_codes, budgets, spend * min_scale, spend * max_scale, elasticity)
+    return _simulation_frame(cells[[id_column, 'Country']], spend, new_spend, results, scale, elasticity)
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from kpi_registry import DELIVERY_KPIS, load_kpis
+
 def calculate_kpis_for_bv5_analysis(df):
     kpi_df = df.copy()
     cols_to_ensure_numeric = ['Amount spent (USD)', 'Impressions', 'Link clicks', 'Reach', 'Results']
@@ -11,9 +13,7 @@ def calculate_kpis_for_bv5_analysis(df):
             print(f"Warning from bv5_analyzer: Expected column '{col}' not found in DataFrame. It will be initialized to 0.")
             kpi_df[col] = 0 
 
-    kpi_df['CTR (%)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Link clicks'] / kpi_df['Impressions']) * 100, 0)
-    kpi_df['CPC (USD)'] = np.where(kpi_df['Link clicks'] > 0, kpi_df['Amount spent (USD)'] / kpi_df['Link clicks'], 0)
-    kpi_df['CPM (USD)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Amount spent (USD)'] / kpi_df['Impressions']) * 1000, 0)
+    load_kpis().evaluate(kpi_df, DELIVERY_KPIS)
     return kpi_df
 
 def analyze_ad_sets_bv5(input_df, target_countries, filter_type, top_n=10):
@@ -1,9 +1,12 @@
 import pandas as pd
 import numpy as np
 
+from dataset_registry import DatasetRegistry, read_data_csv
+from kpi_registry import DELIVERY_KPIS, load_kpis
+
 # --- Yapılandırma ---
 # Artık temizlenmiş CSV dosyasını kullanıyoruz
-main_csv_file_name = 'data/clean_bv5_may23_global.csv'
+main_partition = ('BV5', '23-29 Mayıs') # (kaynak, dönem) -> dosya yolu data/datasets.json'dan okunur
 target_countries_main = ['TR', 'AZ']
 spending_threshold = 100.0 # Eşik 100$ olarak güncellendi
 kpi_definitions = {
@@ -23,10 +26,11 @@ def get_kpi_value_for_country(df_kpi_cleaned, country_code, kpi_column_name):
     return country_data[kpi_column_name].mean()
 
 # --- Ana Analiz ---
+main_csv_file_name = DatasetRegistry.load().partition_path(*main_partition)
 print(f"--- Analiz Edilen Veri Seti: {main_csv_file_name} ---")
 
 try:
-    df = pd.read_csv(main_csv_file_name) # df_original yerine doğrudan df olarak okuyoruz
+    df = read_data_csv(main_csv_file_name) # df_original yerine doğrudan df olarak okuyoruz
 except FileNotFoundError:
     print(f"Hata: {main_csv_file_name} dosyası bulunamadı. Lütfen dosya yolunu kontrol edin.")
     exit()
@@ -115,9 +119,7 @@ def calculate_kpis_for_analysis(df):
             print(f"Warning from global_analyzer: Expected column '{col}' not found in DataFrame. It will be initialized to 0.")
             kpi_df[col] = 0 
 
-    kpi_df['CTR (%)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Link clicks'] / kpi_df['Impressions']) * 100, 0)
-    kpi_df['CPC (USD)'] = np.where(kpi_df['Link clicks'] > 0, kpi_df['Amount spent (USD)'] / kpi_df['Link clicks'], 0)
-    kpi_df['CPM (USD)'] = np.where(kpi_df['Impressions'] > 0, (kpi_df['Amount spent (USD)'] / kpi_df['Impressions']) * 1000, 0)
+    load_kpis().evaluate(kpi_df, DELIVERY_KPIS)
     return kpi_df
 
 def analyze_ad_sets(input_df, target_countries, filter_type, top_n=5):
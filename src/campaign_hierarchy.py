@@ -0,0 +1,106 @@
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, TOTAL_COLUMN_NAMES, add_kpi_columns, group_codes, metric_matrix, sum_by_codes
+
+# Campaign -> Ad Set -> Ad aggregation tree, built once per dataset. Raw rows are scanned once
+# (leaf sums); every upper level is summed from its children. Nodes of one level are stored
+# sorted by parent, so a node's children are the contiguous slice
+# [child_start, child_start + child_count) and an expand is an O(children) lookup.
+
+DEFAULT_LEVELS = ['Campaign name', 'Ad Set Name', 'Ad name']
+
+
+class CampaignHierarchy:
+    def __init__(self, levels, labels, parents, child_start, child_count, level_offsets, sums, metrics):
+        self.levels = levels                # level column names, top to bottom
+        self.labels = labels                # node -> label (object array)
+        self.parents = parents              # node -> parent node (-1 for top level)
+        self.child_start = child_start      # node -> index of its first child
+        self.child_count = child_count      # node -> number of children
+        self.level_offsets = level_offsets  # level -> first node index of that level (+ end sentinel)
+        self.sums = sums                    # node -> summed metrics (n_nodes x len(metrics))
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.labels)
+
+    def node_level(self, node):
+        return int(np.searchsorted(self.level_offsets, node, side='right') - 1)
+
+    def roots(self):
+        return np.arange(self.level_offsets[0], self.level_offsets[1])
+
+    def children(self, node):
+        start = self.child_start[node]
+        return np.arange(start, start + self.child_count[node])
+
+    def path(self, node):
+        labels = []
+        while node >= 0:
+            labels.append(self.labels[node])
+            node = self.parents[node]
+        return labels[::-1]
+
+    def nodes_frame(self, nodes):
+        """Display table (totals and KPIs) for the given node indices, sorted by spend."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        frame = pd.DataFrame(self.sums[nodes], columns=self.metrics)
+        frame.insert(0, 'node', nodes)
+        frame.insert(1, 'Name', self.labels[nodes])
+        frame['Children'] = self.child_count[nodes]
+        frame = add_kpi_columns(frame).rename(columns=TOTAL_COLUMN_NAMES)
+        return frame.sort_values(by='Total Spent (USD)', ascending=False)
+
+
+def build_hierarchy(df, levels=DEFAULT_LEVELS, metrics=BASE_METRICS):
+    """
+    Builds the aggregation tree for `df`.
+    Args:
+        df (pd.DataFrame): Row-level export with the level columns.
+        levels (list): Name columns from the top level down (e.g. campaign, ad set, ad).
+        metrics (list): Additive metric columns to sum at every node.
+    Returns:
+        CampaignHierarchy: Rows with a missing name at any level are left out of the tree.
+    """
+    levels = list(levels)
+    missing = [level for level in levels if level not in df.columns]
+    if missing:
+        raise ValueError(f"Hierarchy level columns not found: {missing}")
+
+    # One pass over the raw rows: leaf codes sorted by the full (top..leaf) path, then sums.
+    leaf_codes, leaf_keys = group_codes(df, levels)
+    level_sums = [None] * len(levels)
+    level_keys = [None] * len(levels)
+    level_sums[-1] = sum_by_codes(metric_matrix(df, metrics), leaf_codes, len(leaf_keys))
+    level_keys[-1] = leaf_keys
+
+    # Parents from children: group the (small) child key table by its prefix and bincount.
+    parent_of_level = [None] * len(levels)
+    for depth in range(len(levels) - 1, 0, -1):
+        child_keys = level_keys[depth]
+        prefix_codes, prefix_keys = group_codes(child_keys, levels[:depth])
+        parent_of_level[depth] = prefix_codes
+        level_sums[depth - 1] = sum_by_codes(level_sums[depth], prefix_codes, len(prefix_keys))
+        level_keys[depth - 1] = prefix_keys
+    parent_of_level[0] = np.full(len(level_keys[0]), -1, dtype=np.int64)
+
+    level_sizes = [len(keys) for keys in level_keys]
+    level_offsets = np.concatenate(([0], np.cumsum(level_sizes))).astype(np.int64)
+    n_nodes = int(level_offsets[-1])
+
+    labels = np.concatenate([level_keys[depth][level].to_numpy(dtype=object) for depth, level in enumerate(levels)])
+    parents = np.concatenate([np.where(parent_of_level[depth] >= 0, parent_of_level[depth] + (level_offsets[depth - 1] if depth else 0), -1)
+                              for depth in range(len(levels))])
+    sums = np.vstack(level_sums) if n_nodes else np.zeros((0, len(metrics)))
+
+    # Children of a level are already sorted by parent code (group_codes sorts by the full key path).
+    child_start = np.zeros(n_nodes, dtype=np.int64)
+    child_count = np.zeros(n_nodes, dtype=np.int64)
+    for depth in range(len(levels) - 1):
+        counts = np.bincount(parent_of_level[depth + 1], minlength=level_sizes[depth])
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) + level_offsets[depth + 1]
+        child_count[level_offsets[depth]:level_offsets[depth + 1]] = counts
+        child_start[level_offsets[depth]:level_offsets[depth + 1]] = starts
+
+    return CampaignHierarchy(levels, labels, parents.astype(np.int64), child_start, child_count, level_offsets, sums, list(metrics))
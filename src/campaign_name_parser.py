@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+import numpy as np
+
+from aggregates import TOTAL_COLUMN_NAMES, aggregate_metrics, add_kpi_columns
+
+# Campaign names encode their setup as pipe-delimited tokens, e.g.
+#   "TT 361 | DVY | OTPKİ-OLT-BK | M2 | Lead | ABO | CosCap-Mix | 21.04.25"
+#   "AZ/Turkic | TT 317 | DVY | New Aud. 2-1 | OTPKİ-OLT-BK | M2 | Lead | CBO | 13.05.25"
+# Only the unique names are tokenized (and memoized); every row then gets its fields through an
+# integer gather on the name's factorized code, stored as pandas categoricals.
+
+DIMENSION_COLUMNS = ['Market', 'Account', 'Product', 'Creative Family', 'Objective', 'Budget Type', 'Launch Date', 'Launch Week']
+CATEGORICAL_DIMENSIONS = ['Market', 'Account', 'Product', 'Creative Family', 'Objective', 'Budget Type']
+
+PRODUCT_TOKENS = {'DVY'}
+OBJECTIVE_TOKENS = {'lead': 'Lead', 'sales': 'Sales', 'traffic': 'Traffic', 'awareness': 'Awareness', 'engagement': 'Engagement'}
+
+_ACCOUNT_RE = re.compile(r'^(?:(?:TT|FC)(?: (?:ASC|SA))?\s*\d+|\d+ FC|UB DVY \d+)\b')
+_BUDGET_RE = re.compile(r'\b(CBO|ABO)\b')
+_DATE_RE = re.compile(r'\b(\d{1,2})\.(\d{1,2})\.(\d{4}|\d{2})\b')
+_AUDIENCE_RE = re.compile(r'^[A-Z]{1,2}-\d+$')
+_CREATIVE_RE = re.compile(r'^[A-ZÇĞİÖŞÜ]{2,}[A-ZÇĞİÖŞÜa-z0-9]*(?:[-_][A-Za-zÇĞİÖŞÜçğıöşü0-9]+)+$')
+_NON_CREATIVE_PREFIXES = ('GLOBAL', 'USA', 'AVRUPA', 'CBO', 'ABO', 'COSCAP')
+
+
+def _parse_date(token):
+    match = _DATE_RE.search(token)
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    year = year + 2000 if year < 100 else year
+    try:
+        return pd.Timestamp(year=year, month=month, day=day)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def parse_campaign_name(name):
+    """Splits one campaign/ad set name into its dimension fields (None where a field is absent)."""
+    fields = dict.fromkeys(DIMENSION_COLUMNS)
+    if not isinstance(name, str):
+        return fields
+    tokens = [token.strip() for token in name.split('|') if token.strip()]
+
+    account_index = next((i for i, token in enumerate(tokens) if _ACCOUNT_RE.match(token)), None)
+    if account_index is not None:
+        fields['Account'] = _ACCOUNT_RE.match(tokens[account_index]).group(0)
+        if account_index > 0:
+            fields['Market'] = tokens[0].lstrip('#').upper()
+
+    for token in tokens:
+        upper = token.upper()
+        if fields['Product'] is None and upper in PRODUCT_TOKENS:
+            fields['Product'] = upper
+        elif fields['Objective'] is None and token.lower() in OBJECTIVE_TOKENS:
+            fields['Objective'] = OBJECTIVE_TOKENS[token.lower()]
+        elif fields['Launch Date'] is None and _parse_date(token) is not None:
+            fields['Launch Date'] = _parse_date(token)
+        if fields['Budget Type'] is None and _BUDGET_RE.search(upper):
+            fields['Budget Type'] = _BUDGET_RE.search(upper).group(1)
+        if (fields['Creative Family'] is None and not upper.startswith(_NON_CREATIVE_PREFIXES)
+                and not _AUDIENCE_RE.match(token)
+                and (_CREATIVE_RE.match(token) or 'BEST ADS' in upper)):
+            fields['Creative Family'] = token
+
+    if fields['Launch Date'] is not None:
+        fields['Launch Week'] = fields['Launch Date'] - pd.Timedelta(days=fields['Launch Date'].dayofweek)
+    return fields
+
+
+def parse_unique_names(names):
+    """Parses each distinct name once. Returns (codes, parsed_df) with one parsed_df row per unique name."""
+    codes, uniques = pd.factorize(pd.Series(names), sort=False)
+    parsed_df = pd.DataFrame([parse_campaign_name(name) for name in uniques], columns=DIMENSION_COLUMNS)
+    return codes, parsed_df
+
+
+def add_campaign_dimensions(df, name_column='Universal_Campaign_ID'):
+    """
+    Adds DIMENSION_COLUMNS to a copy of `df`, parsed from `name_column`.
+    Text dimensions are categoricals and dates are datetime64, so groupby/filter works on integer codes.
+    """
+    if name_column not in df.columns:
+        print(f"Warning from campaign_name_parser: '{name_column}' column not found. Dimensions not added.")
+        return df.copy()
+    codes, parsed_df = parse_unique_names(df[name_column])
+    has_name = codes >= 0
+    safe_codes = np.where(has_name, codes, 0)
+    result = df.copy()
+    for col in CATEGORICAL_DIMENSIONS:
+        dim_codes, categories = pd.factorize(parsed_df[col], sort=True)
+        row_codes = np.where(has_name, dim_codes[safe_codes] if len(dim_codes) else -1, -1)
+        result[col] = pd.Categorical.from_codes(row_codes, categories=categories)
+    for col in ['Launch Date', 'Launch Week']:
+        dates = pd.to_datetime(parsed_df[col]).to_numpy(dtype='datetime64[ns]')
+        row_dates = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+        if len(dates):
+            row_dates[has_name] = dates[codes[has_name]]
+        result[col] = row_dates
+    return result
+
+
+def dimension_kpi_table(df_with_dimensions, dimension):
+    """Summed metrics and KPIs per value of one parsed dimension, sorted by spend."""
+    summary = add_kpi_columns(aggregate_metrics(df_with_dimensions, [dimension]))
+    summary = summary.rename(columns=TOTAL_COLUMN_NAMES).sort_values(by='Total Spent (USD)', ascending=False)
+    if dimension in ('Launch Date', 'Launch Week'):
+        summary[dimension] = pd.to_datetime(summary[dimension]).dt.strftime('%Y-%m-%d')
+    else:
+        summary[dimension] = summary[dimension].astype(str)
+    return summary
@@ -0,0 +1,74 @@
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, add_kpi_columns, aggregate_metrics, metric_matrix
+
+# Plot-ready frames for the dashboard charts. Everything is aggregated or binned here, in
+# pandas/NumPy, so a chart spec only ever carries the plotted points (tens to a few hundred
+# rows) and never the row-level frame: no Altair max-rows limit, no multi-MB JSON payloads.
+
+DATE_COLUMN = 'Reporting starts'
+OTHER_LABEL = 'Diğer'
+CHART_KPIS = ['Amount spent (USD)', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+DEFAULT_TOP_N = 20
+DEFAULT_BINS = 30
+MAX_CHART_POINTS = 5000
+
+
+def _check_size(frame):
+    if len(frame) > MAX_CHART_POINTS:
+        raise ValueError(f"Grafik verisi {len(frame)} satır; en fazla {MAX_CHART_POINTS} nokta gönderilebilir.")
+    return frame
+
+
+def kpi_by_dimension(df, dimension, top_n=DEFAULT_TOP_N, metrics=BASE_METRICS):
+    """
+    Summed metrics and KPIs per value of `dimension`, top `top_n` by spend plus one 'Diğer' row.
+    Args:
+        df (pd.DataFrame): Row-level or pre-aggregated frame with raw-named metric columns.
+        dimension (str): Column to group by (e.g. 'Country', 'Universal_Campaign_ID').
+    Returns:
+        pd.DataFrame: At most top_n + 1 rows sorted by spend, with a 'Rank' column for ordering.
+    """
+    summary = aggregate_metrics(df, [dimension], metrics)
+    summary = summary.sort_values(by='Amount spent (USD)', ascending=False, kind='stable').reset_index(drop=True)
+    if len(summary) > top_n:
+        rest = summary.iloc[top_n:]
+        other = pd.DataFrame({dimension: [OTHER_LABEL], **{metric: [rest[metric].sum()] for metric in metrics}})
+        summary = pd.concat([summary.iloc[:top_n], other], ignore_index=True)
+    add_kpi_columns(summary)
+    summary['Rank'] = np.arange(len(summary))
+    return _check_size(summary)
+
+
+def kpi_by_day(df, date_column=DATE_COLUMN, metrics=BASE_METRICS):
+    """Summed metrics and KPIs per reporting day (one row per distinct date, in date order)."""
+    if date_column not in df.columns:
+        return pd.DataFrame(columns=['Date'] + list(metrics) + CHART_KPIS[1:])
+    frame = pd.DataFrame({'Date': pd.to_datetime(df[date_column], errors='coerce')})
+    values = metric_matrix(df, metrics)
+    for i, metric in enumerate(metrics):
+        frame[metric] = values[:, i]
+    daily = add_kpi_columns(aggregate_metrics(frame, ['Date'], metrics))
+    return _check_size(daily)
+
+
+def kpi_histogram(df, kpi, cell_columns=('Universal_Campaign_ID', 'Country'), bins=DEFAULT_BINS, metrics=BASE_METRICS):
+    """
+    Spend-weighted distribution of `kpi` over (campaign, country) cells, binned with np.histogram.
+    Cells without the KPI's denominator are left out; the top 1% of values are clipped into
+    the last bin so a few outliers don't flatten the chart.
+    Returns:
+        pd.DataFrame: One row per bin with 'Bin Start', 'Bin End', 'Cells' and 'Amount spent (USD)'.
+    """
+    cells = add_kpi_columns(aggregate_metrics(df, list(cell_columns), metrics))
+    cells = cells[cells[kpi] > 0]
+    if cells.empty:
+        return pd.DataFrame(columns=['Bin Start', 'Bin End', 'Cells', 'Amount spent (USD)'])
+    values = cells[kpi].to_numpy(dtype=np.float64)
+    upper = np.quantile(values, 0.99)
+    values = np.minimum(values, upper)
+    edges = np.histogram_bin_edges(values, bins=bins)
+    counts, _ = np.histogram(values, bins=edges)
+    spent, _ = np.histogram(values, bins=edges, weights=cells['Amount spent (USD)'].to_numpy(dtype=np.float64))
+    return pd.DataFrame({'Bin Start': edges[:-1], 'Bin End': edges[1:], 'Cells': counts, 'Amount spent (USD)': spent})
@@ -0,0 +1,116 @@
+import json
+
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, metric_matrix, sum_by_codes
+
+# ISO-3166 alpha-2 country table (data/countries.csv: Code, Name, Region, Subregion) and the
+# configurable market groups (data/markets.json, e.g. Turkic, MENA, EU; a country may belong
+# to several). Every attribute is stored as an integer code array indexed by the country's
+# position in the table, so names and rollups are gathers on the rows' country codes rather
+# than string maps. New markets or renamed countries are data edits, not code edits.
+
+DEFAULT_COUNTRIES_PATH = 'data/countries.csv'
+DEFAULT_MARKETS_PATH = 'data/markets.json'
+REGION_LEVELS = ['Region', 'Subregion']
+UNKNOWN_LABEL = 'Unknown'
+
+
+class CountryTable:
+    def __init__(self, table, markets):
+        self.codes = pd.Index(table['Code'].str.upper())
+        self.names = table['Name'].to_numpy(dtype=object)
+        self.levels = {}  # level -> (per-country category code array, categories)
+        for level in REGION_LEVELS:
+            level_codes, categories = pd.factorize(table[level], sort=True)
+            self.levels[level] = (level_codes, categories)
+        self.market_names = list(markets.keys())
+        # (countries x markets) membership matrix
+        self.market_membership = np.zeros((len(self.codes), len(self.market_names)), dtype=bool)
+        for j, market in enumerate(self.market_names):
+            positions = self.codes.get_indexer([code.upper() for code in markets[market]])
+            unknown = [code for code, pos in zip(markets[market], positions) if pos < 0]
+            if unknown:
+                print(f"Uyarı: '{market}' pazarındaki ülke kodları tabloda yok: {unknown}")
+            self.market_membership[positions[positions >= 0], j] = True
+
+    @classmethod
+    def load(cls, countries_path=DEFAULT_COUNTRIES_PATH, markets_path=DEFAULT_MARKETS_PATH):
+        # keep_default_na=False: 'NA' is Namibia, not a missing value.
+        table = pd.read_csv(countries_path, dtype=str, keep_default_na=False)
+        try:
+            with open(markets_path, encoding='utf-8') as f:
+                markets = json.load(f)
+        except FileNotFoundError:
+            markets = {}
+        return cls(table, markets)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def name_map(self):
+        return dict(zip(self.codes, self.names))
+
+    def encode(self, countries):
+        """Table position per entry of `countries` (-1 for codes not in the table or missing)."""
+        row_codes, uniques = pd.factorize(pd.Series(countries), sort=False)
+        positions = self.codes.get_indexer(pd.Index(uniques).astype(str).str.upper())
+        return np.where(row_codes >= 0, positions[np.maximum(row_codes, 0)] if len(uniques) else -1, -1)
+
+    def normalize_codes(self, values):
+        """Alpha-2 codes for a column holding codes or country names (case-insensitive); unknown values as is."""
+        values = pd.Series(values)
+        row_codes, uniques = pd.factorize(values, sort=False)
+        by_name = {name.casefold(): code for code, name in zip(self.codes, self.names)}
+        normalized = np.array([code.upper() if code.upper() in self.codes else by_name.get(code.casefold(), code)
+                               for code in pd.Index(uniques).astype(str).str.strip()], dtype=object)
+        return np.where(row_codes >= 0, normalized[np.maximum(row_codes, 0)] if len(uniques) else None, None)
+
+    def display_names(self, countries):
+        """Country names for a column of codes; codes missing from the table are shown as is."""
+        countries = pd.Series(countries)
+        positions = self.encode(countries)
+        names = countries.to_numpy(dtype=object).copy()
+        known = positions >= 0
+        names[known] = self.names[positions[known]]
+        return names
+
+    def region_labels(self, countries, level='Region'):
+        """Categorical of the country's region at `level` ('Unknown' for codes not in the table)."""
+        if level not in self.levels:
+            raise ValueError(f"Unknown region level '{level}'. Choose one of {REGION_LEVELS}.")
+        level_codes, categories = self.levels[level]
+        positions = self.encode(countries)
+        row_codes = np.where(positions >= 0, level_codes[np.maximum(positions, 0)] if len(level_codes) else -1, len(categories))
+        return pd.Categorical.from_codes(row_codes, categories=list(categories) + [UNKNOWN_LABEL])
+
+    def market_mask(self, countries, market):
+        positions = self.encode(countries)
+        membership = self.market_membership[:, self.market_names.index(market)]
+        return (positions >= 0) & membership[np.maximum(positions, 0)]
+
+    def rollup(self, df, level='Region', metrics=BASE_METRICS):
+        """
+        Sums `metrics` of `df` (with a 'Country' column) per region or market.
+        Args:
+            df (pd.DataFrame): Row-level or pre-aggregated frame.
+            level (str): 'Region', 'Subregion' or 'Market'. Markets overlap, so a country's
+                         metrics count towards every market it belongs to.
+        Returns:
+            pd.DataFrame: One row per group with the summed raw metric columns, named by `level`.
+        """
+        values = metric_matrix(df, metrics)
+        if level == 'Market':
+            positions = self.encode(df['Country'])
+            known = positions >= 0
+            # rows x markets membership gathered from the country codes, then one matrix product
+            sums = self.market_membership[positions[known]].T.astype(np.float64) @ values[known]
+            result = pd.DataFrame(sums, columns=list(metrics))
+            result.insert(0, level, self.market_names)
+            return result
+        labels = self.region_labels(df['Country'], level)
+        sums = sum_by_codes(values, np.asarray(labels.codes, dtype=np.int64), len(labels.categories))
+        result = pd.DataFrame(sums, columns=list(metrics))
+        result.insert(0, level, list(labels.categories))
+        return result[np.bincount(labels.codes, minlength=len(labels.categories)) > 0].reset_index(drop=True)
@@ -0,0 +1,90 @@
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, TOTAL_COLUMN_NAMES, FactorizedKeys, add_kpi_columns, metric_matrix, sum_by_codes
+
+# Creative (Ad name) rollups across campaigns, ad sets, countries and periods. The same
+# creative runs in many campaigns, so it is ranked on its account-wide totals. The key columns
+# are factorized once: the AggregateStore factorizes every partition's KEY_COLUMNS when it
+# parses it, uses those codes for the (ad set, country) cells and hands them here, where the
+# periods' codes are merged without hashing a string again. The creative, creative x country
+# and creative x period tables (and the creative table's campaign / ad-set / country counts)
+# are then each a recombination of those integer codes plus one bincount per metric.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+CREATIVE_COLUMN = 'Ad name'
+CAMPAIGN_COLUMN = 'Campaign name'
+PERIOD_COLUMN = 'Period'
+ROLLUP_KEYS = {
+    'creatives': [CREATIVE_COLUMN],
+    'creative_country': [CREATIVE_COLUMN, 'Country'],
+    'creative_period': [CREATIVE_COLUMN, PERIOD_COLUMN],
+}
+# Distinct-count columns of the creative table: column -> key it counts per creative.
+REACH_COUNTS = {'Kampanya Sayısı': CAMPAIGN_COLUMN, 'Reklam Seti Sayısı': UNIVERSAL_ID_COLUMN, 'Ülke Sayısı': 'Country'}
+# Row-level key columns the rollups need (the period column is added per frame).
+KEY_COLUMNS = [col for col in dict.fromkeys([col for keys in ROLLUP_KEYS.values() for col in keys] + list(REACH_COUNTS.values()))
+               if col != PERIOD_COLUMN]
+
+
+def _distinct_per_group(keys, group_column, other_column, n_groups):
+    """Number of distinct `other_column` values per group code of `group_column` (missing values not counted)."""
+    group, other = keys.codes[group_column], keys.codes[other_column]
+    valid = (group >= 0) & (other >= 0)
+    pairs = np.unique(group[valid] * max(len(keys.uniques[other_column]), 1) + other[valid])
+    return np.bincount(pairs // max(len(keys.uniques[other_column]), 1), minlength=n_groups)
+
+
+def creative_rollups(period_frames, metrics=BASE_METRICS, period_keys=None):
+    """
+    Creative-level totals and KPIs over one or more periods, overall, per country and per period.
+    Args:
+        period_frames (dict): Ordered mapping of period label -> ad-level (or out-of-core
+            aggregated) frame with an 'Ad name' column.
+        period_keys (dict): Optional; period label -> FactorizedKeys of that frame's KEY_COLUMNS
+            (AggregateStore.period_keys), reused instead of factorizing the frames here.
+    Returns:
+        dict: ROLLUP_KEYS name -> table of the summed metrics (TOTAL_COLUMN_NAMES) and KPI
+              columns, sorted by spend; the 'creatives' table also has the REACH_COUNTS
+              columns. Empty dict when no frame has creatives.
+    """
+    labels = [label for label, df in period_frames.items() if df is not None and not df.empty and CREATIVE_COLUMN in df.columns]
+    if not labels:
+        return {}
+    # Keys of another version of a frame (the files changed in between) are not reused.
+    period_keys = {label: keys for label, keys in (period_keys or {}).items()
+                   if keys is not None and label in period_frames and keys.n_rows == len(period_frames[label])}
+    keys = FactorizedKeys.concat([period_keys[label] if label in period_keys else
+                                  FactorizedKeys(period_frames[label], [col for col in KEY_COLUMNS if col in period_frames[label].columns])
+                                  for label in labels])
+    # The period is constant per frame: its codes are the frame's position among the sorted labels.
+    period_codes, period_uniques = pd.factorize(np.array(labels, dtype=object), sort=True)
+    keys.codes[PERIOD_COLUMN] = np.repeat(period_codes.astype(np.int64), [len(period_frames[label]) for label in labels])
+    keys.uniques[PERIOD_COLUMN] = period_uniques
+    key_columns = [col for col in dict.fromkeys(KEY_COLUMNS + [PERIOD_COLUMN]) if col in keys.codes]
+    values = np.vstack([metric_matrix(period_frames[label], metrics) for label in labels])
+
+    tables = {}
+    for name, rollup_keys in ROLLUP_KEYS.items():
+        if not all(col in key_columns for col in rollup_keys):
+            continue
+        codes, table = keys.group_codes(rollup_keys)
+        sums = sum_by_codes(values, codes, len(table))
+        for i, metric in enumerate(metrics):
+            table[metric] = sums[:, i]
+        if name == 'creatives':
+            for column, other in REACH_COUNTS.items():
+                if other in key_columns:
+                    table[column] = _distinct_per_group(keys, CREATIVE_COLUMN, other, len(table))
+        table = add_kpi_columns(table).rename(columns=TOTAL_COLUMN_NAMES)
+        tables[name] = table.sort_values(by='Total Spent (USD)', ascending=False, kind='stable').reset_index(drop=True)
+    return tables
+
+
+def rank_creatives(creatives, kpi='Total Spent (USD)', min_spend=0.0, top_n=20):
+    """Top `top_n` creatives by `kpi` among those with at least `min_spend`; cost KPIs rank ascending, over creatives that have a cost."""
+    eligible = creatives[creatives['Total Spent (USD)'] >= min_spend]
+    if kpi.endswith('(USD)') and kpi != 'Total Spent (USD)':
+        eligible = eligible[eligible[kpi] > 0]
+        return eligible.sort_values(by=kpi, ascending=True, kind='stable').head(top_n)
+    return eligible.sort_values(by=kpi, ascending=False, kind='stable').head(top_n)
@@ -0,0 +1,152 @@
+import re
+from urllib.parse import unquote_plus
+
+import pandas as pd
+import numpy as np
+
+from aggregates import group_codes, metric_matrix, sum_by_codes
+from id_registry import IdRegistry, UNIVERSAL_KEY_COLUMN
+from kpi_registry import load_kpis
+
+# Campaign x country funnel costs from lead-level CRM exports (one row per lead, e.g. the
+# files matched by 'crm_files' in data/datasets.json). Each distinct UTM campaign tag is
+# looked up with the ID registry's rules once (a hash join on the int32 campaign key): as is
+# first, and only if that misses URL-decoded with '_' / '+' read as spaces. Leads and ad spend
+# are then summed per (key, country) with bincount and aligned on those codes, so hundreds of
+# thousands of leads join in well under a second. A lead at a later stage also counts for
+# every earlier stage.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+UNKNOWN_COUNTRY = 'unknown'
+
+# Column names in the CRM export (first match wins), so exports from different tools load as is.
+CRM_COLUMN_CANDIDATES = {
+    'campaign': ['utm_campaign', 'UTM Campaign', 'Kampanya', 'Campaign'],
+    'country': ['Country', 'Ülke', 'country'],
+    'stage': ['Stage', 'Aşama', 'Durum', 'stage'],
+    'created': ['Created At', 'Oluşturulma Tarihi', 'created_at', 'Date'],
+}
+
+FUNNEL_STAGES = ['Lead', 'Randevu', 'Katılım', 'Satış']
+STAGE_ALIASES = {
+    'lead': 'Lead', 'yeni': 'Lead', 'new': 'Lead',
+    'randevu': 'Randevu', 'appointment': 'Randevu', 'booked': 'Randevu',
+    'katılım': 'Katılım', 'katilim': 'Katılım', 'attended': 'Katılım', 'show': 'Katılım',
+    'satış': 'Satış', 'satis': 'Satış', 'sale': 'Satış', 'won': 'Satış',
+}
+
+ATTRIBUTION_KPIS = ['Lead Maliyeti (USD)', 'Randevu Maliyeti (USD)', 'CPA (USD)', 'Rndv-Sts (%)']
+ATTRIBUTION_COLUMNS = [UNIVERSAL_ID_COLUMN, 'Country', 'Total Spent (USD)'] + FUNNEL_STAGES + ATTRIBUTION_KPIS
+
+_UTM_SEPARATORS_RE = re.compile(r'[_+]')
+
+
+def _pick_column(df, role):
+    for candidate in CRM_COLUMN_CANDIDATES[role]:
+        if candidate in df.columns:
+            return candidate
+    return None
+
+
+def normalize_utm(tag):
+    """'TT+361+%7C+DVY' / 'TT_361_|_DVY' -> 'TT 361 | DVY' (before the registry's own normalization)."""
+    if not isinstance(tag, str):
+        return None
+    return _UTM_SEPARATORS_RE.sub(' ', unquote_plus(tag))
+
+
+def lookup_utm_tags(registry, tags):
+    """
+    Campaign keys of distinct UTM tags (-1 when unmatched). A tag is looked up as is first, so
+    names that contain '_' or '+' still match; only misses fall back to normalize_utm.
+    """
+    tags = np.asarray(tags, dtype=object)
+    keys = registry.lookup([tag if isinstance(tag, str) else None for tag in tags]) if len(tags) else np.array([], dtype=np.int32)
+    missing = keys < 0
+    if missing.any():
+        keys[missing] = registry.lookup([normalize_utm(tag) for tag in tags[missing]])
+    return keys
+
+
+def load_crm_leads(paths, countries=None):
+    """
+    Reads and concatenates CRM exports into a standard lead frame.
+    Args:
+        paths (list): CSV files, one row per lead.
+        countries (CountryTable): Optional; maps country names in the export to alpha-2 codes.
+    Returns:
+        pd.DataFrame: Columns 'Campaign Tag', 'Country', 'Stage Index' (position in FUNNEL_STAGES)
+            and 'Created' (datetime, NaT when the export has no date column).
+    """
+    frames = []
+    for path in paths:
+        raw = pd.read_csv(path, dtype=str)
+        campaign_col, stage_col = _pick_column(raw, 'campaign'), _pick_column(raw, 'stage')
+        if campaign_col is None or stage_col is None:
+            raise ValueError(f"'{path}' içinde kampanya (utm_campaign) veya aşama (Stage) sütunu yok.")
+        country_col, created_col = _pick_column(raw, 'country'), _pick_column(raw, 'created')
+        stage_codes, stage_uniques = pd.factorize(raw[stage_col].str.strip().str.lower(), sort=False)
+        stage_index = np.array([FUNNEL_STAGES.index(STAGE_ALIASES[s]) if s in STAGE_ALIASES else -1 for s in stage_uniques], dtype=np.int64)
+        countries_column = raw[country_col] if country_col else pd.Series(None, index=raw.index, dtype=object)
+        frames.append(pd.DataFrame({
+            'Campaign Tag': raw[campaign_col].to_numpy(dtype=object),
+            'Country': countries.normalize_codes(countries_column) if countries is not None else countries_column.to_numpy(dtype=object),
+            'Stage Index': np.where(stage_codes >= 0, stage_index[np.maximum(stage_codes, 0)] if len(stage_uniques) else -1, -1),
+            'Created': pd.to_datetime(raw[created_col], errors='coerce', dayfirst=True) if created_col else pd.NaT,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['Campaign Tag', 'Country', 'Stage Index', 'Created'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def filter_period(leads, start, end):
+    """Leads created between `start` and `end` (inclusive dates); leads without a date are kept."""
+    created = leads['Created']
+    in_period = (created >= pd.Timestamp(start)) & (created < pd.Timestamp(end) + pd.Timedelta(days=1))
+    return leads[in_period | created.isna()]
+
+
+def attribute_leads(period_df, leads, registry=None):
+    """
+    Joins leads to a period's ad data on (normalized campaign key, Country).
+    Args:
+        period_df (pd.DataFrame): Row-level or aggregated ad data with Universal_Campaign_ID, Country, spend.
+        leads (pd.DataFrame): load_crm_leads output (already filtered to the period).
+        registry (IdRegistry): Name -> ID table; defaults to the persisted one (never saved here).
+    Returns:
+        tuple: (table, unmatched) - one ATTRIBUTION_COLUMNS row per campaign x country that has
+               spend or leads, sorted by spend, and the number of leads whose tag matched no campaign.
+    """
+    registry = IdRegistry.load() if registry is None else registry
+    if UNIVERSAL_KEY_COLUMN in period_df.columns:
+        ad_keys = period_df[UNIVERSAL_KEY_COLUMN].to_numpy(dtype=np.int32)
+    else:
+        # New ad names get in-memory IDs only; the registry is never saved from here.
+        ad_keys = registry.encode(period_df[UNIVERSAL_ID_COLUMN])
+    tag_codes, tag_uniques = pd.factorize(leads['Campaign Tag'], sort=False)
+    tag_keys = lookup_utm_tags(registry, tag_uniques)
+    lead_keys = np.where(tag_codes >= 0, tag_keys[np.maximum(tag_codes, 0)] if len(tag_uniques) else -1, -1)
+    stage_index = leads['Stage Index'].to_numpy(dtype=np.int64)
+    matched = (lead_keys >= 0) & (stage_index >= 0)
+
+    # One code space over (key, Country) of both sides, then a dense scatter per side.
+    ad_frame = pd.DataFrame({UNIVERSAL_KEY_COLUMN: np.where(ad_keys >= 0, ad_keys, np.nan), 'Country': period_df['Country'].to_numpy(dtype=object)})
+    # Leads without a country stay on their campaign under the exports' own 'unknown' country.
+    lead_countries = leads['Country'].fillna(UNKNOWN_COUNTRY).to_numpy(dtype=object)
+    lead_frame = pd.DataFrame({UNIVERSAL_KEY_COLUMN: np.where(matched, lead_keys, np.nan), 'Country': lead_countries})
+    codes, keys_df = group_codes(pd.concat([ad_frame, lead_frame], ignore_index=True), [UNIVERSAL_KEY_COLUMN, 'Country'])
+    n_keys = len(keys_df)
+    ad_codes, lead_codes = codes[:len(ad_frame)], codes[len(ad_frame):]
+
+    spent = sum_by_codes(metric_matrix(period_df, ['Amount spent (USD)']), ad_codes, n_keys)[:, 0]
+    # Cumulative funnel: a lead at stage k counts for stages 0..k.
+    stage_hits = (stage_index[:, None] >= np.arange(len(FUNNEL_STAGES))[None, :]).astype(np.float64)
+    funnel = sum_by_codes(stage_hits, lead_codes, n_keys)
+
+    table = pd.DataFrame({UNIVERSAL_ID_COLUMN: registry.decode(keys_df[UNIVERSAL_KEY_COLUMN].to_numpy(dtype=np.int64)),
+                          'Country': keys_df['Country'].to_numpy(), 'Total Spent (USD)': spent})
+    for i, stage in enumerate(FUNNEL_STAGES):
+        table[stage] = funnel[:, i]
+    load_kpis().evaluate(table, ATTRIBUTION_KPIS, columns={'spend': 'Total Spent (USD)'})
+    table = table[(table['Total Spent (USD)'] > 0) | (table['Lead'] > 0)]
+    return table.sort_values(by='Total Spent (USD)', ascending=False)[ATTRIBUTION_COLUMNS], int((~matched).sum())
@@ -0,0 +1,237 @@
+import argparse
+import glob
+import json
+import os
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, aggregate_metrics, merge_partial_sums
+
+# Registry of every ad data source (BV2, BV5, TT...), its ID column, schema and period partitions,
+# declared in data/datasets.json. Loaders ask for source/period/country and only the matching
+# partition files are opened; partitions whose recorded country set can't match are never read,
+# and only the requested columns are parsed.
+#
+# When a request's partitions add up to more than `out_of_core_threshold_mb`, read_aggregated
+# streams them in `out_of_core_chunk_rows` chunks and keeps only running sums per key, so a
+# year of exports never has to fit in memory as raw rows.
+#
+# Refresh the per-partition country lists after adding or re-cleaning an export:
+#   python src/dataset_registry.py --refresh-stats
+# Register a newly cleaned export (the dashboard lists cleaned files it doesn't know yet):
+#   python src/dataset_registry.py --register BV2 "30 Mayıs-5 Haziran" data/clean_bv2_may30.csv
+
+DEFAULT_MANIFEST_PATH = 'data/datasets.json'
+DEFAULT_PARTITION_PATTERN = 'data/clean_*.csv'  # where cleaned exports land; see unregistered_files
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+SOURCE_COLUMN = 'Source'
+
+# Row grain kept by the out-of-core mode; every other column is either a base metric (summed)
+# or a per-row ratio / reporting date that the aggregates don't need.
+OUT_OF_CORE_KEY_COLUMNS = [UNIVERSAL_ID_COLUMN, 'Country', 'Campaign name', 'Ad Set Name', 'Ad name', 'Result type', 'Reporting starts', SOURCE_COLUMN]
+DEFAULT_OUT_OF_CORE_THRESHOLD_MB = 512
+DEFAULT_OUT_OF_CORE_CHUNK_ROWS = 200_000
+_MISSING_KEY = '\x00'
+# Only an empty field is missing: pandas' default NA strings include 'NA', Namibia's country code.
+CSV_NA_OPTIONS = {'keep_default_na': False, 'na_values': ['']}
+
+Partition = namedtuple('Partition', ['source', 'period', 'path', 'id_column', 'countries'])
+
+
+def read_data_csv(path, **kwargs):
+    """pd.read_csv for the cleaned exports and other data/ files, with CSV_NA_OPTIONS."""
+    return pd.read_csv(path, **CSV_NA_OPTIONS, **kwargs)
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None when it doesn't exist; changes whenever the file is rewritten."""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class DatasetRegistry:
+    def __init__(self, manifest, path=DEFAULT_MANIFEST_PATH):
+        self.manifest = manifest
+        self.path = path
+
+    @classmethod
+    def load(cls, path=DEFAULT_MANIFEST_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), path)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        os.replace(tmp_path, self.path)
+
+    @property
+    def sources(self):
+        return list(self.manifest['sources'].keys())
+
+    @property
+    def periods(self):
+        """Period label -> {'combined_file' (combine_datasets.py output only), 'sales_period', 'start', 'end'}, in manifest order."""
+        return self.manifest['periods']
+
+    @property
+    def sales_file(self):
+        return self.manifest['sales_file']
+
+    @property
+    def crm_files(self):
+        """Lead-level CRM exports matching the manifest's 'crm_files' glob, sorted by path."""
+        pattern = self.manifest.get('crm_files')
+        return sorted(glob.glob(pattern)) if pattern else []
+
+    @property
+    def out_of_core_threshold_bytes(self):
+        return self.manifest.get('out_of_core_threshold_mb', DEFAULT_OUT_OF_CORE_THRESHOLD_MB) * 1024 * 1024
+
+    def schema(self, source):
+        return self.manifest['sources'][source].get('schema', {})
+
+    def partitions(self, sources=None, periods=None, countries=None):
+        """Partitions matching the filters; a partition with a recorded country list is pruned when it has none of `countries`."""
+        wanted_countries = set(countries) if countries else None
+        matches = []
+        for source, config in self.manifest['sources'].items():
+            if sources is not None and source not in sources:
+                continue
+            for period, partition in config['partitions'].items():
+                if periods is not None and period not in periods:
+                    continue
+                partition_countries = partition.get('countries')
+                if wanted_countries is not None and partition_countries is not None and not wanted_countries.intersection(partition_countries):
+                    continue
+                matches.append(Partition(source, period, partition['path'], partition.get('id_column', config['id_column']), partition_countries))
+        return matches
+
+    def partition_path(self, source, period):
+        return self.manifest['sources'][source]['partitions'][period]['path']
+
+    def watched_files(self):
+        """Every file the dashboard reads: the manifest, sales.csv and all partitions."""
+        paths = [self.path, self.sales_file]
+        paths += [partition.path for partition in self.partitions()]
+        return list(dict.fromkeys(paths))
+
+    def unregistered_files(self):
+        """Cleaned exports matching the manifest's 'partition_pattern' that no partition points to yet."""
+        registered = {os.path.normpath(partition.path) for partition in self.partitions()}
+        pattern = self.manifest.get('partition_pattern', DEFAULT_PARTITION_PATTERN)
+        return [path for path in sorted(glob.glob(pattern)) if os.path.normpath(path) not in registered]
+
+    def register_partition(self, source, period, path, id_column=None):
+        """Adds (or repoints) the `source` x `period` partition to `path` with its country list; call save() to persist."""
+        if source not in self.manifest['sources']:
+            raise ValueError(f"Unknown source '{source}'. Valid: {self.sources}")
+        if period not in self.periods:
+            raise ValueError(f"Unknown period '{period}'; add it to 'periods' in {self.path} first. Valid: {list(self.periods)}")
+        config = self.manifest['sources'][source]
+        partition = {'path': path}
+        if id_column and id_column != config['id_column']:
+            partition['id_column'] = id_column
+        partition['countries'] = sorted(str(c) for c in read_data_csv(path, usecols=['Country'])['Country'].dropna().unique())
+        config['partitions'][period] = partition
+        return Partition(source, period, path, partition.get('id_column', config['id_column']), partition['countries'])
+
+    def read_partition(self, partition, columns=None, countries=None):
+        """Reads one partition with its declared dtypes; ID column renamed to Universal_Campaign_ID and a Source column added."""
+        schema = self.schema(partition.source)
+        usecols = None
+        if columns is not None:
+            wanted = set(columns) | {partition.id_column, 'Country'}
+            usecols = lambda col: col in wanted
+        df = read_data_csv(partition.path, dtype=schema or None, usecols=usecols)
+        if countries:
+            df = df[df['Country'].isin(countries)]
+        if partition.id_column in df.columns:
+            df = df.rename(columns={partition.id_column: UNIVERSAL_ID_COLUMN})
+        df[SOURCE_COLUMN] = partition.source
+        return df
+
+    def read(self, sources=None, periods=None, countries=None, columns=None):
+        """Concatenation of every matching partition (empty frame when nothing matches)."""
+        frames = [self.read_partition(p, columns=columns, countries=countries) for p in self.partitions(sources, periods, countries)]
+        if not frames:
+            return pd.DataFrame(columns=[UNIVERSAL_ID_COLUMN, 'Country', SOURCE_COLUMN])
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+    def size_bytes(self, partitions):
+        return sum(os.path.getsize(p.path) for p in partitions if os.path.exists(p.path))
+
+    def needs_out_of_core(self, partitions):
+        return self.size_bytes(partitions) > self.out_of_core_threshold_bytes
+
+    def aggregate_partition(self, partition, metrics=BASE_METRICS, chunk_rows=None):
+        """
+        Streams one partition in chunks and returns base metric sums per OUT_OF_CORE_KEY_COLUMNS.
+        Peak memory is one chunk plus the running sums; missing key values are kept as NaN.
+        """
+        chunk_rows = chunk_rows or self.manifest.get('out_of_core_chunk_rows', DEFAULT_OUT_OF_CORE_CHUNK_ROWS)
+        schema = self.schema(partition.source)
+        wanted = set(OUT_OF_CORE_KEY_COLUMNS) | set(metrics) | {partition.id_column}
+        running = None
+        key_columns = None
+        for chunk in read_data_csv(partition.path, dtype=schema or None, usecols=lambda col: col in wanted, chunksize=chunk_rows):
+            chunk = chunk.rename(columns={partition.id_column: UNIVERSAL_ID_COLUMN})
+            chunk[SOURCE_COLUMN] = partition.source
+            if key_columns is None:
+                key_columns = [col for col in OUT_OF_CORE_KEY_COLUMNS if col in chunk.columns]
+            # group_codes drops rows with a missing key; a sentinel keeps their metrics in the sums.
+            chunk[key_columns] = chunk[key_columns].fillna(_MISSING_KEY)
+            running = merge_partial_sums([running, aggregate_metrics(chunk, key_columns, metrics)], key_columns, metrics)
+        if running is None:
+            return pd.DataFrame(columns=OUT_OF_CORE_KEY_COLUMNS + list(metrics))
+        running[key_columns] = running[key_columns].replace(_MISSING_KEY, np.nan)
+        return running
+
+    def read_aggregated(self, sources=None, periods=None, metrics=BASE_METRICS, chunk_rows=None):
+        """Out-of-core counterpart of read(): the concatenated per-partition sums at OUT_OF_CORE_KEY_COLUMNS grain."""
+        frames = [self.aggregate_partition(p, metrics, chunk_rows) for p in self.partitions(sources, periods)]
+        if not frames:
+            return pd.DataFrame(columns=OUT_OF_CORE_KEY_COLUMNS + list(metrics))
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+    def refresh_partition_stats(self):
+        """Records the sorted country list of every partition in the manifest (reads only the Country column)."""
+        for source, config in self.manifest['sources'].items():
+            for period, partition in config['partitions'].items():
+                try:
+                    countries = read_data_csv(partition['path'], usecols=['Country'])['Country'].dropna().unique()
+                except FileNotFoundError:
+                    print(f"Uyarı: {source} / {period} dosyası bulunamadı: {partition['path']}")
+                    continue
+                partition['countries'] = sorted(str(c) for c in countries)
+                print(f"{source} / {period}: {len(countries)} ülke.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Veri seti kayıt dosyasını (datasets.json) gösterir veya günceller.")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument('--refresh-stats', action='store_true', help="Her bölümün ülke listesini yeniden hesaplar.")
+    parser.add_argument('--register', nargs=3, metavar=('KAYNAK', 'DÖNEM', 'DOSYA'), help="Temizlenmiş bir dışa aktarımı kaynak/dönem bölümü olarak kaydeder.")
+    parser.add_argument('--id-column', default=None, help="--register ile: dosyanın ID sütunu kaynağınkinden farklıysa.")
+    args = parser.parse_args()
+
+    registry = DatasetRegistry.load(args.manifest)
+    if args.register:
+        source, period, path = args.register
+        partition = registry.register_partition(source, period, path, id_column=args.id_column)
+        registry.save()
+        print(f"{source} / {period} -> {path} kaydedildi ({len(partition.countries)} ülke).")
+    if args.refresh_stats:
+        registry.refresh_partition_stats()
+        registry.save()
+        print(f"'{args.manifest}' güncellendi.")
+    for partition in registry.partitions():
+        print(f"{partition.source:6} {partition.period:12} {partition.id_column:14} {partition.path}")
+    for path in registry.unregistered_files():
+        print(f"Kayıtsız: {path}")
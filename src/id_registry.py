@@ -0,0 +1,113 @@
+import os
+import re
+import unicodedata
+
+import pandas as pd
+import numpy as np
+
+# Persistent dictionary of normalized campaign / ad set / ad names -> stable int32 IDs, shared by
+# every source and period. IDs are append-only: a name keeps its ID across refreshes, and
+# spelling variants (extra spaces, " - Copy" / " - Kopya" suffixes) collapse onto one ID.
+
+DEFAULT_REGISTRY_PATH = 'data/id_registry.csv'
+UNIVERSAL_KEY_COLUMN = 'Universal_Campaign_Key'
+
+# Name column -> integer key column written next to it.
+KEY_COLUMNS = {
+    'Universal_Campaign_ID': UNIVERSAL_KEY_COLUMN,
+    'Campaign name': 'Campaign Key',
+    'Ad Set Name': 'Ad Set Key',
+    'Ad name': 'Ad Key',
+}
+
+_COPY_SUFFIX_RE = re.compile(r'(?:\s*-\s*(?:copy|kopya)(?:\s*\d+)?)+$', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_name(name):
+    """'TT 474 | ÖS |  DVY | ... - Copy ' -> 'TT 474 | ÖS | DVY | ...'"""
+    if not isinstance(name, str):
+        return None
+    normalized = unicodedata.normalize('NFC', name)
+    normalized = _WHITESPACE_RE.sub(' ', normalized).strip()
+    normalized = _COPY_SUFFIX_RE.sub('', normalized).strip()
+    return normalized or None
+
+
+class IdRegistry:
+    """Normalized name <-> int32 ID table, loaded from and saved to a CSV file."""
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+        self._ids = {}    # normalized name -> id
+        self._names = []  # id -> normalized name
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path=DEFAULT_REGISTRY_PATH):
+        registry = cls(path)
+        if path and os.path.exists(path):
+            table = pd.read_csv(path, dtype={'ID': np.int64, 'Name': str}, keep_default_na=False)
+            table = table.sort_values('ID')
+            if not np.array_equal(table['ID'].to_numpy(), np.arange(len(table))):
+                raise ValueError(f"'{path}' içindeki ID'ler 0'dan başlayıp ardışık olmalı.")
+            registry._names = table['Name'].tolist()
+            registry._ids = {name: i for i, name in enumerate(registry._names)}
+        return registry
+
+    def __len__(self):
+        return len(self._names)
+
+    def encode(self, names):
+        """
+        Returns an int32 ID per entry of `names` (-1 for missing names), adding unseen names.
+        Only the distinct raw names are normalized and looked up; rows are mapped by factorized code.
+        """
+        codes, uniques = pd.factorize(pd.Series(names), sort=False)
+        unique_ids = np.empty(len(uniques), dtype=np.int32)
+        for i, raw_name in enumerate(uniques):
+            name = normalize_name(raw_name)
+            if name is None:
+                unique_ids[i] = -1
+                continue
+            registry_id = self._ids.get(name)
+            if registry_id is None:
+                registry_id = len(self._names)
+                self._ids[name] = registry_id
+                self._names.append(name)
+                self._dirty = True
+            unique_ids[i] = registry_id
+        if len(self._names) > np.iinfo(np.int32).max:
+            raise OverflowError("ID registry exceeded the int32 range.")
+        return np.where(codes >= 0, unique_ids[np.maximum(codes, 0)] if len(uniques) else -1, -1).astype(np.int32)
+
+    def lookup(self, names):
+        """Like encode, but read-only: names not in the registry get -1 instead of a new ID."""
+        codes, uniques = pd.factorize(pd.Series(names), sort=False)
+        unique_ids = np.array([self._ids.get(normalize_name(name), -1) for name in uniques], dtype=np.int32)
+        return np.where(codes >= 0, unique_ids[np.maximum(codes, 0)] if len(uniques) else -1, -1).astype(np.int32)
+
+    def decode(self, ids):
+        """Normalized names for an array of IDs (None for -1 or IDs unknown to this registry)."""
+        names = np.array(self._names + [None], dtype=object)
+        ids = np.asarray(ids, dtype=np.int64)
+        return names[np.where((ids >= 0) & (ids < len(self._names)), ids, len(self._names))]
+
+    def save(self):
+        if not self._dirty or not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        pd.DataFrame({'ID': np.arange(len(self._names)), 'Name': self._names}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+def add_key_columns(df, registry):
+    """Adds an int32 key column next to every known name column present in `df` (in place)."""
+    for name_column, key_column in KEY_COLUMNS.items():
+        if name_column in df.columns:
+            df[key_column] = registry.encode(df[name_column])
+    return df
@@ -0,0 +1,219 @@
+import abc
+import argparse
+import json
+import threading
+
+import tornado.ioloop
+import tornado.web
+
+from aggregate_store import AggregateStore
+from dataset_registry import file_signature
+from kpi_tables import REGIONS, UNIVERSAL_ID_COLUMN, country_kpi_table, ad_set_tables, load_datasets, regional_sales_kpi_table, slugify, region_mask
+
+# Small JSON API over the dashboard aggregates for internal tools (BI sheets, Slack bot).
+# Periods are built by an AggregateStore from the registry's partitions of every source, like
+# the dashboard, once per version of their files; responses are cached as serialized bytes and
+# dropped as soon as one of the period's partition files or sales.csv changes (mtime/size).
+#
+# Usage (from the repository root):
+#   python src/kpi_api.py --port 8600
+#   GET /api/periods
+#   GET /api/countries?period=23_29_mayis&region=global
+#   GET /api/ad-sets?period=23_29_mayis&region=tr&top_n=10&sort=results
+#   GET /api/regional-funnel?period=23_29_mayis
+
+DEFAULT_PORT = 8600
+MAX_TOP_N = 500
+
+REGION_ALIASES = {'tr': 'Turkey', 'az': 'Azerbaijan', 'aze': 'Azerbaijan', 'global': 'Global (TR ve AZ Hariç)'}
+REGION_ALIASES.update({slugify(name): name for name in REGIONS})
+
+
+def periods():
+    """Period label -> config from data/datasets.json (read on first use)."""
+    return load_datasets().periods
+
+
+def period_aliases():
+    return {slugify(label): label for label in periods()}
+
+
+class AggregateCache:
+    """Per-period aggregates and serialized responses, invalidated when the source files change."""
+
+    def __init__(self, store=None):
+        self.store = AggregateStore() if store is None else store
+        self._lock = threading.Lock()  # guards the dicts below; never held while parsing
+        self._period_locks = {}  # period label -> Lock, so a cold period only blocks its own requests
+        self._periods = {}    # period label -> (signature, period_agg, period_sales_df)
+        self._responses = {}  # request key -> (signature, body bytes)
+
+    def signature(self, period_label):
+        """The period's partition files (and out-of-core decision) plus the sales file."""
+        return self.store.signature(period_label, self.store.datasets.sources)
+
+    def available(self, period_label):
+        """Whether any of the period's partition files exists."""
+        return any(file_signature(path) is not None for path, _ in self.store.data_signature(period_label, self.store.datasets.sources)[:-1])
+
+    def _period_lock(self, period_label):
+        with self._lock:
+            return self._period_locks.setdefault(period_label, threading.Lock())
+
+    def period_data(self, period_label):
+        signature = self.signature(period_label)
+        with self._period_lock(period_label):
+            with self._lock:
+                cached = self._periods.get(period_label)
+            if cached is not None and cached[0] == signature:
+                return signature, cached[1], cached[2]
+
+            if not self.available(period_label):
+                raise FileNotFoundError(2, "No registered partition file", period_label)
+            period_agg = self.store.period_cells(period_label, self.store.datasets.sources)
+            period_sales_df = self.store.period_sales(period_label)
+            with self._lock:
+                self._periods[period_label] = (signature, period_agg, period_sales_df)
+                # Drop every response built from the previous version of this period.
+                self._responses = {key: value for key, value in self._responses.items() if key[1] != period_label}
+            return signature, period_agg, period_sales_df
+
+    def cached_response(self, key):
+        signature = self.signature(key[1])
+        with self._lock:
+            cached = self._responses.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        return None
+
+    def store_response(self, key, signature, body):
+        with self._lock:
+            self._responses[key] = (signature, body)
+
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', force_ascii=False))
+
+
+class JsonHandler(tornado.web.RequestHandler):
+    def initialize(self, cache):
+        self.cache = cache
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(json.dumps({'error': self._reason}, ensure_ascii=False))
+
+    def period_argument(self):
+        value = self.get_argument('period', list(periods().keys())[-1])
+        label = value if value in periods() else period_aliases().get(slugify(value))
+        if label is None:
+            raise tornado.web.HTTPError(400, reason=f"Unknown period '{value}'. Valid: {list(period_aliases().keys())}")
+        return label
+
+    def region_argument(self, default=None):
+        value = self.get_argument('region', default)
+        if value is None:
+            return None
+        region = value if value in REGIONS else REGION_ALIASES.get(slugify(value))
+        if region is None:
+            raise tornado.web.HTTPError(400, reason=f"Unknown region '{value}'. Valid: {sorted(REGION_ALIASES.keys())}")
+        return region
+
+
+class BaseKpiHandler(JsonHandler, metaclass=abc.ABCMeta):
+    """A KPI endpoint: one payload per (period, params), built from the cached period aggregate."""
+
+    @abc.abstractmethod
+    def build_payload(self, period_agg, period_sales_df, params):
+        """The JSON-serializable response for `params` ({'period': label, ...})."""
+
+    async def respond(self, params):
+        key = (self.__class__.__name__, params['period']) + tuple(sorted((k, v) for k, v in params.items() if k != 'period'))
+        body = self.cache.cached_response(key)
+        if body is None:
+            try:
+                # Reading/aggregating a changed file happens off the IOLoop; cache hits never get here.
+                signature, period_agg, period_sales_df = await tornado.ioloop.IOLoop.current().run_in_executor(
+                    None, self.cache.period_data, params['period'])
+            except FileNotFoundError as e:
+                raise tornado.web.HTTPError(404, reason=f"Data file not found: {e.filename}")
+            payload = self.build_payload(period_agg, period_sales_df, params)
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.cache.store_response(key, signature, body)
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(body)
+
+
+class PeriodsHandler(JsonHandler):
+    def get(self):
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(json.dumps({
+            'periods': [{'id': slugify(label), 'label': label, 'available': self.cache.available(label)}
+                        for label in periods()],
+            'regions': [{'id': slugify(name), 'label': name} for name in REGIONS],
+        }, ensure_ascii=False))
+
+
+class CountriesHandler(BaseKpiHandler):
+    async def get(self):
+        await self.respond({'period': self.period_argument(), 'region': self.region_argument()})
+
+    def build_payload(self, period_agg, period_sales_df, params):
+        if params['region'] is not None:
+            country_codes, filter_type, _ = REGIONS[params['region']]
+            period_agg = period_agg[region_mask(period_agg, country_codes, filter_type)]
+        return {'period': params['period'], 'region': params['region'], 'countries': _records(country_kpi_table(period_agg))}
+
+
+class AdSetsHandler(BaseKpiHandler):
+    async def get(self):
+        try:
+            top_n = int(self.get_argument('top_n', '10'))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="top_n must be an integer.")
+        sort = self.get_argument('sort', 'results')
+        if sort not in ('results', 'spent'):
+            raise tornado.web.HTTPError(400, reason="sort must be 'results' or 'spent'.")
+        await self.respond({'period': self.period_argument(), 'region': self.region_argument('global'),
+                            'top_n': max(1, min(top_n, MAX_TOP_N)), 'sort': sort})
+
+    def build_payload(self, period_agg, period_sales_df, params):
+        country_codes, filter_type, _ = REGIONS[params['region']]
+        top_by_results_df, top_by_spent_df = ad_set_tables(period_agg, country_codes, filter_type, top_n=params['top_n'])
+        table = top_by_results_df if params['sort'] == 'results' else top_by_spent_df
+        return {'period': params['period'], 'region': params['region'], 'sort': params['sort'],
+                'id_column': UNIVERSAL_ID_COLUMN, 'ad_sets': _records(table)}
+
+
+class RegionalFunnelHandler(BaseKpiHandler):
+    async def get(self):
+        await self.respond({'period': self.period_argument(), 'region': self.region_argument()})
+
+    def build_payload(self, period_agg, period_sales_df, params):
+        regions = REGIONS if params['region'] is None else {params['region']: REGIONS[params['region']]}
+        return {'period': params['period'], 'regions': _records(regional_sales_kpi_table(period_agg, period_sales_df, regions))}
+
+
+def make_app(cache=None):
+    cache = AggregateCache() if cache is None else cache
+    handler_args = {'cache': cache}
+    return tornado.web.Application([
+        (r"/api/periods", PeriodsHandler, handler_args),
+        (r"/api/countries", CountriesHandler, handler_args),
+        (r"/api/ad-sets", AdSetsHandler, handler_args),
+        (r"/api/regional-funnel", RegionalFunnelHandler, handler_args),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ülke, reklam seti ve satış hunisi KPI'ları için JSON API.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--address', default='127.0.0.1')
+    args = parser.parse_args()
+    make_app().listen(args.port, address=args.address)
+    print(f"KPI API http://{args.address}:{args.port}/api/periods adresinde çalışıyor.")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, KPI_COLUMNS, add_kpi_columns, metric_matrix
+
+# Campaign x country heatmap of summed metrics. Most campaigns spend in a handful of 150+
+# countries, so the matrix is kept sparse: one pass over the frame turns (campaign, country)
+# into row/column codes, and only the non-empty cells are stored (COO, sorted row-major so
+# `row_ptr` gives CSR-style row slices). KPIs are computed on those cells only. Before
+# anything reaches the browser the matrix is reduced to the top campaigns/countries by spend
+# (the rest folded into "Diğer" bins), and campaigns are ordered by their main country so
+# campaigns targeting the same market sit next to each other.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+OTHER_CAMPAIGNS_LABEL = 'Diğer kampanyalar'
+OTHER_COUNTRIES_LABEL = 'Diğer ülkeler'
+HEATMAP_VALUES = ['Amount spent (USD)'] + KPI_COLUMNS
+DEFAULT_MAX_CAMPAIGNS = 40
+DEFAULT_MAX_COUNTRIES = 25
+
+
+class SparseMetricMatrix:
+    def __init__(self, row_labels, col_labels, rows, cols, values, metrics=BASE_METRICS):
+        self.row_labels = np.asarray(row_labels, dtype=object)
+        self.col_labels = np.asarray(col_labels, dtype=object)
+        self.metrics = list(metrics)
+        order = np.lexsort((cols, rows))
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self.cols = np.asarray(cols, dtype=np.int64)[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]  # (nnz x metrics)
+        self.row_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.rows, minlength=len(self.row_labels)))])
+
+    @classmethod
+    def from_frame(cls, df, row_column=UNIVERSAL_ID_COLUMN, col_column='Country', metrics=BASE_METRICS):
+        """
+        Builds the matrix from a row-level or pre-aggregated frame in one pass.
+        Args:
+            df (pd.DataFrame): Frame with `row_column`, `col_column` and raw-named metric columns.
+        Returns:
+            SparseMetricMatrix: Summed metrics per non-empty (row, column) cell; rows with a
+                missing key are dropped like groupby does.
+        """
+        row_codes, row_labels = pd.factorize(df[row_column], sort=True)
+        col_codes, col_labels = pd.factorize(df[col_column], sort=True)
+        valid = (row_codes >= 0) & (col_codes >= 0)
+        n_cols = max(len(col_labels), 1)
+        flat = row_codes[valid].astype(np.int64) * n_cols + col_codes[valid]
+        cell_codes, cells = pd.factorize(flat, sort=True)
+        values = metric_matrix(df, metrics)[valid]
+        sums = np.empty((len(cells), len(metrics)), dtype=np.float64)
+        for i in range(len(metrics)):
+            sums[:, i] = np.bincount(cell_codes, weights=values[:, i], minlength=len(cells))
+        return cls(row_labels, col_labels, cells // n_cols, cells % n_cols, sums, metrics)
+
+    @property
+    def shape(self):
+        return len(self.row_labels), len(self.col_labels)
+
+    @property
+    def nnz(self):
+        return len(self.rows)
+
+    def metric(self, name):
+        return self.values[:, self.metrics.index(name)]
+
+    def row_totals(self, name='Amount spent (USD)'):
+        return np.bincount(self.rows, weights=self.metric(name), minlength=self.shape[0])
+
+    def col_totals(self, name='Amount spent (USD)'):
+        return np.bincount(self.cols, weights=self.metric(name), minlength=self.shape[1])
+
+    def downsample(self, max_rows=DEFAULT_MAX_CAMPAIGNS, max_cols=DEFAULT_MAX_COUNTRIES, by='Amount spent (USD)'):
+        """
+        Keeps the `max_rows` / `max_cols` largest rows and columns by `by`; the rest of each
+        axis is summed into one "Diğer" row/column. Kept rows are ordered by their main
+        column (largest `by` share), then by total, so similar campaigns form blocks.
+        Returns:
+            SparseMetricMatrix: The reduced matrix (at most (max_rows + 1) x (max_cols + 1)).
+        """
+        row_map, row_labels = self._axis_map(self.row_totals(by), self.row_labels, max_rows, OTHER_CAMPAIGNS_LABEL)
+        col_map, col_labels = self._axis_map(self.col_totals(by), self.col_labels, max_cols, OTHER_COUNTRIES_LABEL)
+        rows, cols = row_map[self.rows], col_map[self.cols]
+        n_cols = len(col_labels)
+        cell_codes, cells = pd.factorize(rows * n_cols + cols, sort=True)
+        sums = np.empty((len(cells), len(self.metrics)), dtype=np.float64)
+        for i in range(len(self.metrics)):
+            sums[:, i] = np.bincount(cell_codes, weights=self.values[:, i], minlength=len(cells))
+        reduced = SparseMetricMatrix(row_labels, col_labels, cells // n_cols, cells % n_cols, sums, self.metrics)
+        return reduced._cluster_rows(by)
+
+    @staticmethod
+    def _axis_map(totals, labels, limit, other_label):
+        order = np.argsort(-totals, kind='stable')
+        if len(order) <= limit:
+            mapping = np.empty(len(order), dtype=np.int64)
+            mapping[order] = np.arange(len(order))
+            return mapping, labels[order]
+        mapping = np.full(len(order), limit, dtype=np.int64)
+        mapping[order[:limit]] = np.arange(limit)
+        return mapping, np.append(labels[order[:limit]], other_label)
+
+    def _cluster_rows(self, by):
+        n_rows = self.shape[0]
+        if self.nnz == 0:
+            return self
+        weight = self.metric(by)
+        # Main column per row: the cell with the largest weight inside each CSR row slice.
+        best = np.lexsort((-weight, self.rows))
+        starts = self.row_ptr[:-1][np.diff(self.row_ptr) > 0]
+        main_col = np.full(n_rows, self.shape[1], dtype=np.int64)
+        main_col[self.rows[best[starts]]] = self.cols[best[starts]]
+        totals = self.row_totals(by)
+        is_other = self.row_labels == OTHER_CAMPAIGNS_LABEL
+        order = np.lexsort((-totals, main_col, is_other))
+        position = np.empty(n_rows, dtype=np.int64)
+        position[order] = np.arange(n_rows)
+        return SparseMetricMatrix(self.row_labels[order], self.col_labels, position[self.rows], self.cols, self.values, self.metrics)
+
+    def to_frame(self, row_column=UNIVERSAL_ID_COLUMN, col_column='Country'):
+        """Long frame of the non-empty cells with summed metrics and KPI columns."""
+        frame = pd.DataFrame(self.values, columns=self.metrics)
+        add_kpi_columns(frame)
+        frame.insert(0, col_column, self.col_labels[self.cols])
+        frame.insert(0, row_column, self.row_labels[self.rows])
+        frame['Row Order'] = self.rows
+        frame['Column Order'] = self.cols
+        return frame
@@ -0,0 +1,198 @@
+import ast
+import functools
+import json
+
+import numpy as np
+
+# One place for every KPI the dashboard shows. A KPI is an arithmetic expression over summed
+# base columns (by alias, e.g. 'spend / clicks'), a rule for rows where a denominator is not
+# positive, and a display format. A set of KPIs is compiled once into a single evaluation:
+# each base column is pulled from the frame once, each distinct denominator is checked once
+# and shared by every KPI dividing by it, and the KPIs are written in one go, so adding custom
+# KPIs adds expressions, not passes. Custom KPIs can be declared in data/kpis.json; those over
+# ad metrics only are added to the country and ad-set tables. A kpis.json that can't be used
+# is reported (load_kpis().error) and the defaults are used instead of failing every importer.
+
+DEFAULT_KPI_PATH = 'data/kpis.json'
+
+# alias -> column name of the summed base metric
+BASE_COLUMNS = {
+    'spend': 'Amount spent (USD)',
+    'impressions': 'Impressions',
+    'clicks': 'Link clicks',
+    'reach': 'Reach',
+    'results': 'Results',
+    'lead': 'Lead',
+    'randevu': 'Randevu',
+    'katilim': 'Katılım',
+    'satis': 'Satış',
+}
+
+# name -> (expression, value when a denominator is <= 0, display format)
+DEFAULT_KPIS = {
+    'CTR (%)': ('clicks / impressions * 100', 0, "{:.2f}%"),
+    'CPC (USD)': ('spend / clicks', 0, "${:,.2f}"),
+    'CPM (USD)': ('spend / impressions * 1000', 0, "${:,.2f}"),
+    'Avg. Cost per Result (USD)': ('spend / results', 0, "${:,.2f}"),
+    'Lead Maliyeti (USD)': ('spend / lead', 0, "${:,.2f}"),
+    'Randevu Maliyeti (USD)': ('spend / randevu', 0, "${:,.2f}"),
+    'CPA (USD)': ('spend / satis', 0, "${:,.2f}"),
+    'Rndv-Ktlm (%)': ('katilim / randevu * 100', 0, "{:.2f}%"),
+    'Ktlm-Sts (%)': ('satis / katilim * 100', 0, "{:.2f}%"),
+    'Rndv-Sts (%)': ('satis / randevu * 100', 0, "{:.2f}%"),
+}
+
+# Aliases summed at every ad grain (rows, ad sets, countries); the funnel counts are not.
+AD_ALIASES = ['spend', 'impressions', 'clicks', 'reach', 'results']
+
+DELIVERY_KPIS = ['CTR (%)', 'CPC (USD)', 'CPM (USD)']
+AD_KPIS = DELIVERY_KPIS + ['Avg. Cost per Result (USD)']
+SALES_KPIS = DELIVERY_KPIS + ['Randevu Maliyeti (USD)', 'CPA (USD)']
+
+# Base column names of the regional sales table (region totals joined with sales.csv counts).
+SALES_KPI_COLUMNS = {
+    'spend': 'Total Spent (USD)',
+    'impressions': 'Total Impressions',
+    'clicks': 'Total Link Clicks',
+    'reach': 'Total Reach',
+    'randevu': 'Randevu Sayısı',
+    'satis': 'Satış Sayısı',
+}
+
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.USub, ast.UAdd)
+
+
+class _GuardDenominators(ast.NodeTransformer):
+    """Replaces the right side of every division by a shared guarded name (_den0, _den1, ...)."""
+
+    def __init__(self, denominators):
+        self.denominators = denominators  # unparsed denominator -> index, shared across KPIs
+        self.used = set()
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Div):
+            key = ast.unparse(node.right)
+            index = self.denominators.setdefault(key, len(self.denominators))
+            self.used.add(index)
+            node.right = ast.copy_location(ast.Name(id=f"_den{index}", ctx=ast.Load()), node.right)
+        return node
+
+
+class CompiledKpis:
+    def __init__(self, definitions):
+        """definitions: list of (name, expression, fill value)."""
+        denominators = {}
+        self.kpis = []  # (name, code, guard indices, fill)
+        self.inputs = set()
+        for name, expression, fill in definitions:
+            tree = ast.parse(expression, mode='eval')
+            for node in ast.walk(tree):
+                if not isinstance(node, _ALLOWED_NODES):
+                    raise ValueError(f"KPI '{name}': unsupported expression '{expression}'.")
+                if isinstance(node, ast.Name):
+                    if node.id not in BASE_COLUMNS:
+                        raise ValueError(f"KPI '{name}': unknown base column '{node.id}'. Use one of {list(BASE_COLUMNS)}.")
+                    self.inputs.add(node.id)
+            guard = _GuardDenominators(denominators)
+            tree = ast.fix_missing_locations(guard.visit(tree))
+            self.kpis.append((name, compile(tree, f"<kpi {name}>", 'eval'), sorted(guard.used), fill))
+        # Denominators in index order: a nested one is always registered before the one containing it.
+        self.denominators = [compile(ast.parse(key, mode='eval'), f"<denominator {key}>", 'eval')
+                             for key, _ in sorted(denominators.items(), key=lambda item: item[1])]
+
+    def __call__(self, df, columns=None, output=None):
+        """Adds the compiled KPI columns to `df` (in place) and returns it; missing base columns count as 0."""
+        columns = {**BASE_COLUMNS, **(columns or {})}
+        output = output or {}
+        env = {}
+        for alias in self.inputs:
+            column = columns[alias]
+            env[alias] = df[column].to_numpy(dtype=np.float64) if column in df.columns else np.zeros(len(df))
+        valid = []
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for index, code in enumerate(self.denominators):
+                denominator = np.asarray(eval(code, {}, env), dtype=np.float64)
+                positive = denominator > 0
+                valid.append(positive)
+                env[f"_den{index}"] = np.where(positive, denominator, 1.0)
+            for name, code, guards, fill in self.kpis:
+                value = np.asarray(eval(code, {}, env), dtype=np.float64)
+                if guards:
+                    value = np.where(np.logical_and.reduce([valid[i] for i in guards]), value, fill)
+                df[output.get(name, name)] = np.broadcast_to(value, (len(df),)) if value.ndim == 0 else value
+        return df
+
+
+class KpiRegistry:
+    def __init__(self, definitions, error=None):
+        self.definitions = dict(definitions)  # name -> (expression, fill, format)
+        self.error = error  # why the custom KPIs file was ignored, if it was
+        self._compiled = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_KPI_PATH):
+        """
+        DEFAULT_KPIS plus the custom KPIs in `path` ({name: {"expression", "on_zero", "format"}}), if it exists.
+        A file that isn't valid JSON or declares an invalid KPI is ignored as a whole: the registry
+        then holds DEFAULT_KPIS only and `error` says what is wrong.
+        """
+        definitions = dict(DEFAULT_KPIS)
+        try:
+            with open(path, encoding='utf-8') as f:
+                custom = json.load(f)
+            if not isinstance(custom, dict):
+                raise ValueError("expected an object of {name: {\"expression\", \"on_zero\", \"format\"}}.")
+            for name, spec in custom.items():
+                if not isinstance(spec, dict) or 'expression' not in spec:
+                    raise ValueError(f"KPI '{name}' has no \"expression\".")
+                on_zero = spec.get('on_zero', 0)
+                definitions[name] = (spec['expression'], np.nan if on_zero is None else on_zero, spec.get('format', "{:,.2f}"))
+            # Compiling checks every expression now rather than when a table first uses it.
+            CompiledKpis([(name, definitions[name][0], definitions[name][1]) for name in custom])
+        except FileNotFoundError:
+            pass
+        except (ValueError, SyntaxError, TypeError) as e:
+            return cls(DEFAULT_KPIS, error=f"'{path}' okunamadı, varsayılan KPI'lar kullanılıyor: {e}")
+        return cls(definitions)
+
+    def names(self):
+        return list(self.definitions)
+
+    def custom_names(self, aliases=AD_ALIASES):
+        """KPIs beyond DEFAULT_KPIS whose expressions only use `aliases`, in declaration order."""
+        return [name for name in self.definitions if name not in DEFAULT_KPIS
+                and self.compile([name]).inputs <= set(aliases)]
+
+    def formats(self):
+        return {name: fmt for name, (_, _, fmt) in self.definitions.items()}
+
+    def compile(self, names=None):
+        """The fused evaluation of `names` (all KPIs by default); compiled once per set of names."""
+        names = tuple(self.definitions if names is None else names)
+        if names not in self._compiled:
+            self._compiled[names] = CompiledKpis([(name, self.definitions[name][0], self.definitions[name][1]) for name in names])
+        return self._compiled[names]
+
+    def evaluate(self, df, names=None, columns=None, output=None):
+        """
+        Adds KPI columns computed from the summed base columns of `df` (in place).
+        Args:
+            df (pd.DataFrame): Sums at any grain (rows, ad sets, countries, regions).
+            names (list): KPIs to add; all registered KPIs by default.
+            columns (dict): Alias -> column overrides, e.g. {'randevu': 'Randevu Sayısı'}.
+            output (dict): KPI name -> column to write it to, when it isn't the KPI name.
+        Returns:
+            pd.DataFrame: `df` with the KPI columns.
+        """
+        return self.compile(names)(df, columns, output)
+
+
+@functools.lru_cache(maxsize=None)
+def load_kpis(path=DEFAULT_KPI_PATH):
+    """
+    The KPI registry: DEFAULT_KPIS plus data/kpis.json. Read on first use, not at import, so
+    importing a module that evaluates KPIs works from any working directory.
+    """
+    return KpiRegistry.load(path)
@@ -0,0 +1,186 @@
+import functools
+import re
+
+import pandas as pd
+
+from aggregates import COST_PREFIX, RESULTS_PREFIX, TOTAL_COLUMN_NAMES, aggregate_metrics, add_kpi_columns, merge_partial_sums, result_type_columns, result_types
+from country_table import CountryTable
+from dataset_registry import DEFAULT_MANIFEST_PATH, DatasetRegistry
+from kpi_registry import SALES_KPI_COLUMNS, SALES_KPIS, load_kpis
+
+# Streamlit-free builders for the dashboard's country, ad-set and sales-funnel tables.
+# Each period is aggregated once to (Universal_Campaign_ID, Country); every table below is
+# derived from that small aggregate instead of re-scanning the row-level frame.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+
+
+
+# Display region -> (country codes, filter type, region name used in sales.csv)
+REGIONS = {
+    'Turkey': (['TR'], 'include', 'TR'),
+    'Azerbaijan': (['AZ'], 'include', 'AZE'),
+    'Global (TR ve AZ Hariç)': (['TR', 'AZ'], 'exclude', 'Global'),
+}
+
+COUNTRY_TABLE_COLUMNS = ['Country', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+AD_SET_TABLE_COLUMNS = ['Ad Set Name', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'Total Results', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Avg. Cost per Result (USD)']
+SALES_TABLE_COLUMNS = ['Bölge', 'Total Spent (USD)', 'Total Reach', 'Total Link Clicks', 'CTR (%)', 'CPC (USD)', 'CPM (USD)', 'Randevu Sayısı', 'Randevu Maliyeti (USD)', 'Satış Sayısı', 'CPA (USD)']
+
+
+@functools.lru_cache(maxsize=None)
+def load_datasets(path=DEFAULT_MANIFEST_PATH):
+    """
+    The dataset registry: periods (combined file + sales.csv period), sales file, partitions.
+    Read from data/datasets.json on first use, not at import, so importing this module works
+    from any working directory.
+    """
+    return DatasetRegistry.load(path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_countries():
+    """Country names and region/market hierarchy (data/countries.csv, data/markets.json), read on first use."""
+    return CountryTable.load()
+
+
+def column_formatters():
+    """Display formats for every dashboard column; KPI formats come from the KPI registry."""
+    return {
+        "Total Spent (USD)": "${:,.2f}", "Total Reach": "{:,.0f}", "Total Impressions": "{:,.0f}",
+        "Total Link Clicks": "{:,.0f}", "Total Results": "{:,.0f}",
+        "Toplam Harcama (USD)": "${:,.2f}", "Toplam Reach": "{:,.0f}", "Toplam Gösterim (Impressions)": "{:,.0f}",
+        "Toplam Link Tıklaması": "{:,.0f}", "Toplam Sonuç (Results)": "{:,.0f}",
+        "Ortalama CTR (%)": "{:.2f}%", "Ortalama CPC (USD)": "${:,.2f}",
+        "Ortalama CPM (USD)": "${:,.2f}", "Ortalama Sonuç Başına Maliyet (USD)": "${:,.2f}",
+        # Sales funnel and CRM attribution counts
+        "Randevu": "{:,.0f}", "Katılım": "{:,.0f}", "Satış": "{:,.0f}",
+        "Randevu Sayısı": "{:,.0f}", "Satış Sayısı": "{:,.0f}", "Lead": "{:,.0f}",
+        **load_kpis().formats()
+    }
+
+
+def result_type_display_columns(table):
+    """Results and cost per result of every result type with results in `table`; none unless it mixes several types."""
+    types = [result_type for result_type in result_types(table) if table[result_type_columns(result_type)[0]].sum() > 0]
+    if len(types) < 2:
+        return []
+    return [col for result_type in types for col in (result_type_columns(result_type)[0], result_type_columns(result_type)[2])]
+
+
+def result_type_formatters(columns):
+    """Formats of the per-result-type columns among `columns`."""
+    formats = {}
+    for col in columns:
+        if col.startswith(RESULTS_PREFIX):
+            formats[col] = "{:,.0f}"
+        elif col.startswith(COST_PREFIX):
+            formats[col] = "${:,.2f}"
+    return formats
+
+
+def slugify(text):
+    """'23-29 Mayıs' -> '23_29_mayis'; used for report file names and API parameters."""
+    return re.sub(r'[^0-9A-Za-z]+', '_', text.translate(str.maketrans('çğıöşüÇĞİÖŞÜ', 'cgiosuCGIOSU'))).strip('_').lower()
+
+
+def period_aggregate(df, id_column=UNIVERSAL_ID_COLUMN, keys=None):
+    """
+    The single aggregation pass per period: base metric sums per (id_column, Country), with
+    results and spend per result type. Rows without an ID or country are kept as NaN-keyed cells
+    so region totals still include them (the per-country and per-ad-set tables drop them again).
+    `keys` (FactorizedKeys of `df`, e.g. the AggregateStore's) skips factorizing the key columns.
+    """
+    return aggregate_metrics(df, [id_column, 'Country'], by_result_type=True, dropna=False, keys=keys).rename(columns={id_column: UNIVERSAL_ID_COLUMN})
+
+
+def merge_period_aggregates(partials):
+    """Merges period_aggregate frames of disjoint row sets (e.g. one per partition) into the period_aggregate of all of them."""
+    merged = merge_partial_sums(partials, [UNIVERSAL_ID_COLUMN, 'Country'], dropna=False)
+    # Per-result-type columns in type order, as period_aggregate of the concatenated rows has them.
+    typed = [col for result_type in sorted(result_types(merged)) for col in result_type_columns(result_type)[:2] if col in merged.columns]
+    return merged[[col for col in merged.columns if col not in typed] + typed]
+
+
+def region_mask(period_agg, country_codes, filter_type):
+    in_codes = period_agg['Country'].isin(country_codes).to_numpy()
+    if filter_type == 'include':
+        return in_codes
+    if filter_type == 'exclude':
+        return ~in_codes
+    raise ValueError(f"Invalid filter_type '{filter_type}'.")
+
+
+def _finalize_kpi_table(summary):
+    return add_kpi_columns(summary).rename(columns=TOTAL_COLUMN_NAMES)
+
+
+def country_kpi_table(period_agg):
+    """Same table as app.prepare_country_kpis: one row per country, sorted by spend, names mapped."""
+    if period_agg.empty:
+        return pd.DataFrame(columns=COUNTRY_TABLE_COLUMNS)
+    country_summary = aggregate_metrics(period_agg, ['Country'])
+    country_table = _finalize_kpi_table(country_summary).sort_values(by='Total Spent (USD)', ascending=False)
+    country_table['Country'] = load_countries().display_names(country_table['Country'])
+    return country_table
+
+
+def region_rollup_table(period_agg, level='Region'):
+    """Totals and KPIs per region, subregion or market (see CountryTable.rollup), sorted by spend."""
+    return _finalize_kpi_table(load_countries().rollup(period_agg, level)).sort_values(by='Total Spent (USD)', ascending=False)
+
+
+def ad_set_tables(period_agg, country_codes, filter_type, top_n=10):
+    """Same output as global_analyzer.analyze_ad_sets: (top_by_results_df, top_by_spent_df)."""
+    region_agg = period_agg[region_mask(period_agg, country_codes, filter_type)]
+    if region_agg.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    ad_set_summary = aggregate_metrics(region_agg, [UNIVERSAL_ID_COLUMN]).rename(columns={UNIVERSAL_ID_COLUMN: 'Ad Set Name'})
+    ad_set_kpis_df = _finalize_kpi_table(ad_set_summary)
+    top_by_results_df = ad_set_kpis_df.sort_values(by='Total Results', ascending=False).head(top_n)
+    top_by_spent_df = ad_set_kpis_df.sort_values(by='Total Spent (USD)', ascending=False).head(top_n)
+    return top_by_results_df, top_by_spent_df
+
+
+def regional_sales_kpi_table(period_agg, period_sales_df, regions=None):
+    """Same table as app.display_regional_sales_kpis: ad totals per region joined with sales.csv counts."""
+    regions = REGIONS if regions is None else regions
+    kpi_data_list = []
+    for display_name, (country_codes, filter_type, sales_region_name) in regions.items():
+        region_agg = period_agg[region_mask(period_agg, country_codes, filter_type)]
+        total_spent = region_agg['Amount spent (USD)'].sum()
+        total_reach = region_agg['Reach'].sum()
+        total_link_clicks = region_agg['Link clicks'].sum()
+        total_impressions = region_agg['Impressions'].sum()
+
+        randevu_sayisi, satis_sayisi = 0, 0
+        if period_sales_df is not None and not period_sales_df.empty:
+            region_sales_data = period_sales_df[period_sales_df['Region'] == sales_region_name]
+            randevu_sayisi = region_sales_data['Randevu'].sum()
+            satis_sayisi = region_sales_data['Satış'].sum()
+
+        kpi_data_list.append({
+            'Bölge': display_name,
+            'Total Spent (USD)': total_spent,
+            'Total Reach': total_reach,
+            'Total Link Clicks': total_link_clicks,
+            'Total Impressions': total_impressions,
+            'Randevu Sayısı': randevu_sayisi,
+            'Satış Sayısı': satis_sayisi,
+        })
+    table = pd.DataFrame(kpi_data_list)
+    load_kpis().evaluate(table, SALES_KPIS, columns=SALES_KPI_COLUMNS)
+    return table[SALES_TABLE_COLUMNS]
+
+
+def region_report_tables(period_agg, period_sales_df, region_name, top_n=10):
+    """All tables for one period x region, keyed by table name (in display order)."""
+    country_codes, filter_type, _ = REGIONS[region_name]
+    region_agg = period_agg[region_mask(period_agg, country_codes, filter_type)]
+    top_by_results_df, top_by_spent_df = ad_set_tables(period_agg, country_codes, filter_type, top_n=top_n)
+    return {
+        'Ülke Bazlı KPI\'lar': country_kpi_table(region_agg).reindex(columns=COUNTRY_TABLE_COLUMNS),
+        f'En Çok Sonuç Getiren İlk {top_n} Kampanya/Reklam Seti': top_by_results_df.reindex(columns=AD_SET_TABLE_COLUMNS),
+        f'En Çok Harcama Yapan İlk {top_n} Kampanya/Reklam Seti': top_by_spent_df.reindex(columns=AD_SET_TABLE_COLUMNS),
+        'Bölgesel Satış KPI\'ları': regional_sales_kpi_table(period_agg, period_sales_df, {region_name: REGIONS[region_name]}),
+    }
@@ -0,0 +1,101 @@
+import re
+import unicodedata
+
+import pandas as pd
+import numpy as np
+
+# Instant search over campaign / ad set / ad names. The index is built once per frame over the
+# unique names only (a few thousand strings for millions of rows): every name is case-folded
+# the Turkish way and split into trigrams, and each trigram points to the sorted IDs of the
+# names containing it. A query intersects the postings of its own trigrams and only the few
+# surviving names are checked with a substring test; rows are then selected through the
+# per-column name codes kept at build time, without touching the strings again.
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+SEARCH_COLUMNS = [UNIVERSAL_ID_COLUMN, 'Campaign name', 'Ad Set Name', 'Ad name']
+NGRAM = 3
+
+# Turkish capitals first (str.lower would turn 'İ' into 'i' + combining dot and 'I' into 'i');
+# dotless 'ı' is then matched as 'i' so 'OTPKI', 'otpki' and 'OTPKİ' find the same names.
+_TURKISH_UPPER = str.maketrans({'İ': 'i', 'I': 'ı'})
+_DOTLESS = str.maketrans({'ı': 'i'})
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fold_name(text):
+    """'  OTPKİ-OLT  Bk ' -> 'otpki-olt bk' (Turkish-aware case folding, collapsed whitespace)."""
+    text = unicodedata.normalize('NFC', str(text)).translate(_TURKISH_UPPER).lower().translate(_DOTLESS)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def trigrams(folded):
+    return {folded[i:i + NGRAM] for i in range(len(folded) - NGRAM + 1)}
+
+
+class NameIndex:
+    def __init__(self, names, row_codes):
+        """
+        Args:
+            names (list): Unique folded names; a name's position is its ID.
+            row_codes (dict): Column -> int64 name ID per row (-1 where the column is empty).
+        """
+        self.names = list(names)
+        self.row_codes = row_codes
+        postings = {}
+        for name_id, name in enumerate(self.names):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(name_id)
+        self.postings = {gram: np.asarray(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    @classmethod
+    def from_frame(cls, df, columns=SEARCH_COLUMNS):
+        """Indexes the unique values of the `columns` present in `df` (one pass of factorize per column)."""
+        folded_ids = {}
+        row_codes = {}
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            # Spelling variants that fold to the same text share one name ID.
+            mapping = np.array([folded_ids.setdefault(fold_name(value), len(folded_ids)) for value in uniques], dtype=np.int64)
+            row_codes[col] = np.where(codes >= 0, mapping[np.maximum(codes, 0)] if len(mapping) else -1, -1)
+        return cls(folded_ids, row_codes)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query):
+        """
+        IDs of the names containing every whitespace-separated term of `query` (case-insensitive).
+        Returns:
+            np.ndarray: Sorted name IDs; empty for a blank query.
+        """
+        terms = fold_name(query).split(' ')
+        terms = [term for term in terms if term]
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        candidates = None
+        for term in terms:
+            # Shortest postings first, so the intersection shrinks as fast as possible.
+            for gram in sorted(trigrams(term), key=lambda g: len(self.postings.get(g, ()))):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return np.zeros(0, dtype=np.int64)
+                candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+                if len(candidates) == 0:
+                    return candidates
+        if candidates is None:
+            # Only 1-2 character terms: nothing to look up, check every name.
+            candidates = np.arange(len(self.names))
+        # Trigrams only prove the pieces are there; the substring test confirms the order.
+        return np.asarray([i for i in candidates if all(term in self.names[i] for term in terms)], dtype=np.int64)
+
+    def row_mask(self, query):
+        """Boolean array of rows where any indexed column holds a matching name."""
+        hits = np.zeros(len(self.names) + 1, dtype=bool)  # last slot: rows with an empty column (-1)
+        hits[self.search(query)] = True
+        n_rows = len(next(iter(self.row_codes.values()))) if self.row_codes else 0
+        mask = np.zeros(n_rows, dtype=bool)
+        for codes in self.row_codes.values():
+            mask |= hits[codes]
+        return mask
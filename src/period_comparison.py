@@ -0,0 +1,116 @@
+import pandas as pd
+import numpy as np
+
+from aggregates import BASE_METRICS, TOTAL_COLUMN_NAMES, KPI_COLUMNS, add_kpi_columns, group_codes, metric_matrix, sum_by_codes
+from id_registry import normalize_name
+
+UNIVERSAL_ID_COLUMN = 'Universal_Campaign_ID'
+# Periods are aligned on the campaign name, the one level every source and period reports:
+# Universal_Campaign_ID is an ad set name in some partitions and a campaign name in others.
+# Names are normalized like the ID registry does, so spelling variants of a name match.
+CAMPAIGN_COLUMN = 'Campaign name'
+COMPARISON_KEYS = [CAMPAIGN_COLUMN, 'Country']
+
+# Spend first, then the other totals and every KPI, in the order the dashboard shows them.
+COMPARISON_METRICS = [TOTAL_COLUMN_NAMES[m] for m in BASE_METRICS] + KPI_COLUMNS
+
+
+def campaign_names(df):
+    """
+    Normalized campaign name per row. Partitions whose ID column is 'Campaign name' carry it as
+    Universal_Campaign_ID (read_partition renames it), so that column fills rows without one.
+    """
+    names = df[CAMPAIGN_COLUMN] if CAMPAIGN_COLUMN in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if UNIVERSAL_ID_COLUMN in df.columns:
+        names = names.fillna(df[UNIVERSAL_ID_COLUMN])
+    codes, uniques = pd.factorize(names, sort=False)
+    normalized = np.array([normalize_name(name) for name in uniques] + [None], dtype=object)
+    return normalized[np.where(codes >= 0, codes, len(uniques))]
+
+
+def _period_metric_table(df):
+    """One aggregation pass per period: summed metrics and KPIs per (campaign name, country)."""
+    key_frame = pd.DataFrame({CAMPAIGN_COLUMN: campaign_names(df), 'Country': df['Country'].to_numpy()})
+    codes, summary = group_codes(key_frame, COMPARISON_KEYS)
+    sums = sum_by_codes(metric_matrix(df, BASE_METRICS), codes, len(summary))
+    for i, metric in enumerate(BASE_METRICS):
+        summary[metric] = sums[:, i]
+    return add_kpi_columns(summary).rename(columns=TOTAL_COLUMN_NAMES)
+
+
+def build_period_comparison(period_frames):
+    """
+    Aligns two or more periods on (campaign name, Country) and materializes deltas.
+    Args:
+        period_frames (dict): Ordered mapping of period label -> combined ad-level DataFrame.
+    Returns:
+        dict: (base_label, compare_label) -> DataFrame for every consecutive pair of periods,
+              with the per-period value, absolute delta ('Δ ...') and percentage delta ('Δ% ...')
+              of spend and every KPI. Percentage deltas are NaN when the base value is 0.
+              attrs['overlap'] is the number of (campaign, country) cells present in both periods;
+              with 0 every row only appears or disappears and the deltas mean nothing.
+    """
+    labels = list(period_frames.keys())
+    if len(labels) < 2:
+        raise ValueError("build_period_comparison needs at least two periods.")
+
+    period_tables = {}
+    for label in labels:
+        df = period_frames[label]
+        if df is None or df.empty or 'Country' not in df.columns or not {CAMPAIGN_COLUMN, UNIVERSAL_ID_COLUMN} & set(df.columns):
+            period_tables[label] = pd.DataFrame(columns=COMPARISON_KEYS + COMPARISON_METRICS)
+        else:
+            period_tables[label] = _period_metric_table(df)
+
+    # Integer-code the union of keys across all periods once; every period is then a dense
+    # (n_keys x n_metrics) array addressed by those codes, so alignment is a plain scatter.
+    all_keys = pd.concat([period_tables[label][COMPARISON_KEYS] for label in labels], ignore_index=True)
+    key_codes, keys_df = group_codes(all_keys, COMPARISON_KEYS)
+    n_keys = len(keys_df)
+
+    dense, present = {}, {}
+    offset = 0
+    for label in labels:
+        table = period_tables[label]
+        codes = key_codes[offset:offset + len(table)]
+        offset += len(table)
+        values = np.zeros((n_keys, len(COMPARISON_METRICS)), dtype=np.float64)
+        values[codes] = table[COMPARISON_METRICS].to_numpy(dtype=np.float64)
+        dense[label] = values
+        present[label] = np.zeros(n_keys, dtype=bool)
+        present[label][codes] = True
+
+    comparisons = {}
+    for base_label, compare_label in zip(labels[:-1], labels[1:]):
+        base, compare = dense[base_label], dense[compare_label]
+        delta = compare - base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_pct = np.where(base != 0, delta / np.abs(base) * 100, np.nan)
+
+        columns = {col: keys_df[col].to_numpy() for col in COMPARISON_KEYS}
+        for i, metric in enumerate(COMPARISON_METRICS):
+            columns[f"{metric} ({base_label})"] = base[:, i]
+            columns[f"{metric} ({compare_label})"] = compare[:, i]
+            columns[f"Δ {metric}"] = delta[:, i]
+            columns[f"Δ% {metric}"] = delta_pct[:, i]
+        comparison_df = pd.DataFrame(columns)
+        comparison_df.attrs['overlap'] = int((present[base_label] & present[compare_label]).sum())
+        comparisons[(base_label, compare_label)] = comparison_df
+    return comparisons
+
+
+def top_movers(comparison_df, metric, top_n=20, direction='both'):
+    """
+    Returns the rows with the largest change in `metric` from a build_period_comparison frame.
+    direction: 'both' (largest absolute change), 'up' (largest increases) or 'down' (largest decreases).
+    """
+    delta = comparison_df[f"Δ {metric}"].to_numpy(dtype=np.float64)
+    if direction == 'up':
+        order = np.argsort(-delta, kind='stable')
+    elif direction == 'down':
+        order = np.argsort(delta, kind='stable')
+    elif direction == 'both':
+        order = np.argsort(-np.abs(delta), kind='stable')
+    else:
+        raise ValueError(f"Invalid direction '{direction}' in top_movers.")
+    return comparison_df.iloc[order[:top_n]]
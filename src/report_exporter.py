@@ -0,0 +1,142 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from aggregate_store import AggregateStore
+from dataset_registry import DEFAULT_MANIFEST_PATH
+from kpi_tables import REGIONS, column_formatters, load_datasets, region_report_tables, slugify
+
+# Headless version of the dashboard tables: every period x region is rendered to HTML/XLSX/JSON
+# in worker processes. Each period is built from the registry's partitions of every source, like
+# the dashboard (out of core for large periods), and aggregated exactly once; the region workers
+# only receive that small (campaign, country) aggregate. Exits with status 1 when a requested
+# period could not be built.
+#
+# Usage (from the repository root):
+#   python src/report_exporter.py --output-dir reports --formats html json xlsx --top-n 10
+
+DEFAULT_OUTPUT_DIR = 'reports'
+SUPPORTED_FORMATS = ['html', 'xlsx', 'json']
+
+
+def aggregate_period(period_label, manifest_path=DEFAULT_MANIFEST_PATH):
+    """Worker: the period's (campaign, country) cells and sales rows from its registered partitions, as the dashboard builds them."""
+    store = AggregateStore(manifest_path)
+    sources = store.datasets.sources
+    frame = store.period_frame(period_label, sources)
+    if frame is None:
+        raise FileNotFoundError(f"'{period_label}' dönemi için kayıtlı veri dosyası yok.")
+    return period_label, store.period_cells(period_label, sources), store.period_sales(period_label), len(frame)
+
+
+def _write_html(tables, title, path):
+    formats = column_formatters()
+    sections = [f"<h1>{title}</h1>"]
+    for table_name, table in tables.items():
+        sections.append(f"<h2>{table_name}</h2>")
+        if table.empty:
+            sections.append("<p>Veri bulunamadı.</p>")
+            continue
+        table_formats = {col: fmt for col, fmt in formats.items() if col in table.columns}
+        sections.append(table.style.format(table_formats).hide(axis='index').to_html())
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                f"<title>{title}</title></head><body>\n" + "\n".join(sections) + "\n</body></html>\n")
+
+
+def _write_json(tables, title, path):
+    payload = {'title': title, 'tables': {name: json.loads(table.to_json(orient='records', force_ascii=False)) for name, table in tables.items()}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def _write_xlsx(tables, path):
+    with pd.ExcelWriter(path) as writer:
+        for i, (table_name, table) in enumerate(tables.items(), start=1):
+            # Excel sheet names are limited to 31 characters.
+            table.to_excel(writer, sheet_name=f"{i} {table_name}"[:31], index=False)
+
+
+def render_region_report(period_label, region_name, period_agg, period_sales_df, output_dir, formats, top_n):
+    """Worker: builds one period x region's tables from the period aggregate and writes them in every format."""
+    tables = region_report_tables(period_agg, period_sales_df, region_name, top_n=top_n)
+    title = f"{region_name} - {period_label}"
+    base_path = os.path.join(output_dir, slugify(period_label), slugify(region_name))
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    written = []
+    if 'html' in formats:
+        _write_html(tables, title, base_path + '.html'); written.append(base_path + '.html')
+    if 'json' in formats:
+        _write_json(tables, title, base_path + '.json'); written.append(base_path + '.json')
+    if 'xlsx' in formats:
+        _write_xlsx(tables, base_path + '.xlsx'); written.append(base_path + '.xlsx')
+    return written
+
+
+def export_reports(period_labels, output_dir, formats, top_n=10, max_workers=None):
+    """
+    Writes every period x region report.
+    Returns:
+        tuple: (written paths, labels of the periods that could not be built).
+    """
+    if 'xlsx' in formats and not (importlib.util.find_spec('openpyxl') or importlib.util.find_spec('xlsxwriter')):
+        print("Uyarı: XLSX için 'openpyxl' veya 'xlsxwriter' paketi kurulu değil. XLSX çıktısı atlanıyor.")
+        formats = [fmt for fmt in formats if fmt != 'xlsx']
+
+    sales_file = load_datasets().sales_file
+    if not os.path.exists(sales_file):
+        print(f"Uyarı: '{sales_file}' bulunamadı. Satış KPI'ları 0 olarak raporlanacak.")
+
+    written, failed = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Stage 1: one read + aggregation pass per period, periods in parallel.
+        aggregate_futures = [executor.submit(aggregate_period, label) for label in period_labels]
+        period_aggregates = {}
+        for label, future in zip(period_labels, aggregate_futures):
+            try:
+                _, period_agg, period_sales_df, row_count = future.result()
+                period_aggregates[label] = (period_agg, period_sales_df)
+                print(f"{label}: {row_count} satır -> {len(period_agg)} kampanya/ülke grubu.")
+            except FileNotFoundError as e:
+                print(f"Hata: {label} dönemi için dosya bulunamadı. {e}")
+                failed.append(label)
+            except Exception as e:
+                print(f"Hata: {label} dönemi işlenirken bir sorun oluştu: {e}")
+                failed.append(label)
+
+        # Stage 2: every period x region rendered in parallel from the period aggregates.
+        render_futures = []
+        for label, (period_agg, period_sales_df) in period_aggregates.items():
+            for region_name in REGIONS:
+                render_futures.append(executor.submit(render_region_report, label, region_name, period_agg, period_sales_df, output_dir, formats, top_n))
+        for future in render_futures:
+            written.extend(future.result())
+    return written, failed
+
+
+def main():
+    periods = list(load_datasets().periods.keys())
+    parser = argparse.ArgumentParser(description="Dashboard tablolarını Streamlit olmadan HTML/XLSX/JSON raporlarına aktarır.")
+    parser.add_argument('--periods', nargs='+', choices=periods, default=periods, help="Raporlanacak dönemler (varsayılan: hepsi).")
+    parser.add_argument('--formats', nargs='+', choices=SUPPORTED_FORMATS, default=SUPPORTED_FORMATS, help="Çıktı biçimleri.")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="Raporların yazılacağı klasör.")
+    parser.add_argument('--top-n', type=int, default=10, help="Kampanya/reklam seti tablolarındaki satır sayısı.")
+    parser.add_argument('--workers', type=int, default=None, help="İşçi süreç sayısı (varsayılan: CPU sayısı).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written, failed = export_reports(args.periods, args.output_dir, args.formats, top_n=args.top_n, max_workers=args.workers)
+    print(f"{len(written)} rapor dosyası '{args.output_dir}' altına yazıldı ({time.perf_counter() - start:.2f} sn).")
+    if failed:
+        print(f"Hata: {', '.join(failed)} dönemi için rapor üretilemedi.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
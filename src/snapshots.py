@@ -0,0 +1,133 @@
+import argparse
+import glob
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+# Versioned, atomically published data files. A writer never touches the published file
+# (e.g. data/clean_global.csv): it writes a complete new snapshot under
+# data/.versions/<file name>/, and the snapshot is then published by hard-linking it to a
+# temporary name next to the file and os.replace-ing that over the file, a single atomic
+# rename. A reader that already opened the file keeps reading the snapshot it opened (the old
+# inode stays alive until it is closed); a reader opening it afterwards gets the new one; no
+# one ever sees a half-written file. Published snapshots are immutable, so the dashboard's
+# (mtime, size) signature changes exactly once per publish. Older snapshots are garbage
+# collected: the newest KEEP_VERSIONS stay (for rollback), anything older is removed once it
+# is GRACE_SECONDS old.
+#
+#   python src/snapshots.py data/clean_global.csv              # list snapshots
+#   python src/snapshots.py data/clean_global.csv --rollback   # publish the previous one again
+#   python src/snapshots.py data/clean_global.csv --gc
+
+VERSIONS_DIR = '.versions'
+KEEP_VERSIONS = 3
+GRACE_SECONDS = 15 * 60
+
+
+def versions_dir(path):
+    return os.path.join(os.path.dirname(path) or '.', VERSIONS_DIR, os.path.basename(path))
+
+
+def new_version_path(path):
+    """A fresh snapshot path for `path`; names sort by creation time and keep the extension."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(versions_dir(path), f"{stem}.{time.time_ns()}-{os.getpid()}{ext}")
+
+
+def versions(path):
+    """Snapshot paths of `path`, oldest first."""
+    return sorted(glob.glob(os.path.join(glob.escape(versions_dir(path)), '*')))
+
+
+def current_version(path):
+    """The snapshot `path` currently points to, or None (not published through here, or missing)."""
+    try:
+        published = os.stat(path)
+    except FileNotFoundError:
+        return None
+    for version in reversed(versions(path)):
+        stat = os.stat(version)
+        if (stat.st_ino, stat.st_dev) == (published.st_ino, published.st_dev):
+            return version
+    return None
+
+
+def publish(path, version):
+    """Atomically makes the complete snapshot `version` the content of `path`."""
+    with open(version, 'rb') as f:
+        os.fsync(f.fileno())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.link(version, tmp_path)
+    except OSError:
+        # No hard links on this filesystem: publish a copy instead (still one atomic rename).
+        shutil.copyfile(version, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def collect_garbage(path, keep=KEEP_VERSIONS, grace_seconds=GRACE_SECONDS):
+    """Removes snapshots beyond the newest `keep` that are older than `grace_seconds`; never the published one. Returns the removed paths."""
+    current = current_version(path)
+    now = time.time()
+    removed = []
+    for version in versions(path)[:-keep] if keep > 0 else versions(path):
+        if version == current or now - os.path.getmtime(version) < grace_seconds:
+            continue
+        try:
+            os.remove(version)
+            removed.append(version)
+        except FileNotFoundError:
+            pass  # collected by a concurrent writer
+    return removed
+
+
+@contextmanager
+def publishing(path, keep=KEEP_VERSIONS):
+    """
+    Yields a new snapshot path to write the next version of `path` to; when the block
+    finishes, the snapshot is published and old ones are collected. If the block raises,
+    the partial snapshot is deleted and `path` is left as it was.
+    Usage:
+        with publishing('data/clean_global.csv') as snapshot_path:
+            df.to_csv(snapshot_path, index=False)
+    """
+    version = new_version_path(path)
+    os.makedirs(os.path.dirname(version), exist_ok=True)
+    try:
+        yield version
+    except BaseException:
+        if os.path.exists(version):
+            os.remove(version)
+        raise
+    publish(path, version)
+    collect_garbage(path, keep)
+
+
+def rollback(path):
+    """Publishes the snapshot before the current one again; returns it (None when there is none)."""
+    history = versions(path)
+    current = current_version(path)
+    if current not in history or history.index(current) == 0:
+        return None
+    previous = history[history.index(current) - 1]
+    publish(path, previous)
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yayınlanan veri dosyasının sürümlerini listeler, geri alır veya temizler.")
+    parser.add_argument('path')
+    parser.add_argument('--rollback', action='store_true', help="Bir önceki sürümü yeniden yayınlar.")
+    parser.add_argument('--gc', action='store_true', help=f"En yeni {KEEP_VERSIONS} sürüm dışındaki eski sürümleri siler.")
+    args = parser.parse_args()
+
+    if args.rollback:
+        previous = rollback(args.path)
+        print(f"Yayınlanan sürüm: {previous}" if previous else "Geri alınacak önceki sürüm yok.")
+    if args.gc:
+        for removed in collect_garbage(args.path):
+            print(f"Silindi: {removed}")
+    current = current_version(args.path)
+    for version in versions(args.path):
+        print(f"{'*' if version == current else ' '} {version} ({os.path.getsize(version):,} bytes)")
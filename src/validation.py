@@ -0,0 +1,153 @@
+import json
+import os
+
+import pandas as pd
+import numpy as np
+
+from snapshots import publishing
+
+# Declarative row contracts for the raw ad exports, applied by the cleaner scripts while the
+# export is read (chunk by chunk, so multi-GB files never sit in memory). Every rule is one
+# vectorized mask over the chunk; rows failing any rule go to a quarantine CSV with their
+# reason codes instead of being dropped silently, and the per-reason counts are recorded in
+# data/quarantine/validation_report.json. Rules whose columns an export lacks are skipped.
+# Both outputs are written as new snapshots and published atomically once complete (see
+# snapshots.py), so the dashboard can keep reading the previous file during a run.
+
+DEFAULT_QUARANTINE_DIR = 'data/quarantine'
+DEFAULT_CHUNK_ROWS = 200_000
+REPORT_FILE = 'validation_report.json'
+REASON_COLUMN = 'Quarantine Reason'
+ROW_COLUMN = 'Source Row'
+
+COUNT_COLUMNS = ['Amount spent (USD)', 'Reach', 'Impressions', 'Link clicks', 'Results']
+
+# reason code -> rule; checks: 'all_missing' (every column empty, e.g. the export's total row),
+# 'required' (no column empty), 'numeric' (non-empty values parse as numbers),
+# 'non_negative', 'not_greater' (first column <= second where both are present).
+RULES = {
+    'summary_row': {'check': 'all_missing', 'columns': ['Campaign name', 'Ad Set Name', 'Ad name']},
+    'missing_country': {'check': 'required', 'columns': ['Country']},
+    'non_numeric': {'check': 'numeric', 'columns': COUNT_COLUMNS},
+    'negative_value': {'check': 'non_negative', 'columns': COUNT_COLUMNS},
+    'clicks_gt_impressions': {'check': 'not_greater', 'columns': ['Link clicks', 'Impressions']},
+}
+
+# source -> reason codes checked for its exports (in reporting order)
+SOURCE_RULES = {
+    'BV2': ['summary_row', 'missing_country', 'non_numeric', 'negative_value', 'clicks_gt_impressions'],
+    'BV5': ['summary_row', 'missing_country', 'non_numeric', 'negative_value', 'clicks_gt_impressions'],
+}
+
+
+def _is_blank(series):
+    return series.isna().to_numpy() | (series.astype(str).str.strip() == '').to_numpy()
+
+
+def rule_mask(chunk, numeric, rule):
+    """Boolean array of rows violating `rule`, or None when the chunk lacks all of its columns."""
+    columns = [col for col in rule['columns'] if col in chunk.columns]
+    if not columns:
+        return None
+    check = rule['check']
+    if check == 'all_missing':
+        return np.logical_and.reduce([_is_blank(chunk[col]) for col in columns])
+    if check == 'required':
+        return np.logical_or.reduce([_is_blank(chunk[col]) for col in columns])
+    if check == 'numeric':
+        return np.logical_or.reduce([np.isnan(numeric[col]) & ~_is_blank(chunk[col]) for col in columns])
+    if check == 'non_negative':
+        return np.logical_or.reduce([numeric[col] < 0 for col in columns])
+    if check == 'not_greater':
+        if len(columns) < 2:
+            return None
+        return numeric[columns[0]] > numeric[columns[1]]
+    raise ValueError(f"Unknown validation check '{check}'.")
+
+
+def validate_chunk(chunk, rule_names):
+    """
+    Evaluates `rule_names` on one chunk read with dtype=str.
+    Returns:
+        tuple: (valid, reasons, rule_counts) - mask of rows passing every rule, the '|'-joined
+               reason codes per row ('' for valid rows) and the number of rows failing each rule.
+    """
+    numeric = {col: pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64)
+               for col in COUNT_COLUMNS if col in chunk.columns}
+    failed = np.zeros(len(chunk), dtype=np.uint32)
+    rule_counts = {}
+    for bit, name in enumerate(rule_names):
+        with np.errstate(invalid='ignore'):
+            mask = rule_mask(chunk, numeric, RULES[name])
+        rule_counts[name] = 0 if mask is None else int(mask.sum())
+        if mask is not None:
+            failed |= mask.astype(np.uint32) << bit
+    # One label per distinct failure bit pattern, gathered back to the rows.
+    patterns, inverse = np.unique(failed, return_inverse=True)
+    labels = np.array(['|'.join(name for bit, name in enumerate(rule_names) if pattern >> bit & 1) for pattern in patterns], dtype=object)
+    return failed == 0, labels[inverse], rule_counts
+
+
+def record_counts(quarantine_dir, input_path, output_path, counts):
+    """Stores the counts of the latest run per output file in the quarantine directory's report."""
+    report_path = os.path.join(quarantine_dir, REPORT_FILE)
+    try:
+        with open(report_path, encoding='utf-8') as f:
+            report = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        report = {}
+    report[output_path] = {'input_file': input_path, **counts}
+    tmp_path = f"{report_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
+
+
+def clean_csv(input_path, output_path, source, quarantine_dir=DEFAULT_QUARANTINE_DIR, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Streams `input_path` once, writing rows that pass the source's rules to `output_path` and
+    the rest to `<quarantine_dir>/<output name>` with reason codes and source line numbers.
+    Values are written back exactly as read. Both files are replaced only when the whole
+    export has been processed; on any error they are left as they were.
+    Args:
+        source (str): Key of SOURCE_RULES (e.g. 'BV2', 'BV5').
+    Returns:
+        dict: 'rows_read', 'rows_written', 'rows_quarantined', 'quarantine_file' and
+              'reasons' (reason code -> row count; a row may count for several reasons).
+    """
+    rule_names = SOURCE_RULES[source]
+    quarantine_path = os.path.join(quarantine_dir, os.path.basename(output_path))
+    os.makedirs(quarantine_dir, exist_ok=True)
+    counts = {'rows_read': 0, 'rows_written': 0, 'rows_quarantined': 0, 'quarantine_file': quarantine_path,
+              'reasons': {name: 0 for name in rule_names}}
+    first_chunk = True
+    with publishing(output_path) as output_snapshot, publishing(quarantine_path) as quarantine_snapshot:
+        for chunk in pd.read_csv(input_path, dtype=str, keep_default_na=False, na_values=[''], chunksize=chunk_rows):
+            valid, reasons, rule_counts = validate_chunk(chunk, rule_names)
+            write_mode = 'w' if first_chunk else 'a'
+            chunk[valid].to_csv(output_snapshot, index=False, mode=write_mode, header=first_chunk, encoding='utf-8')
+            quarantined = chunk[~valid].copy()
+            # +2: the header line and 1-based line numbers in the export
+            quarantined.insert(0, ROW_COLUMN, np.flatnonzero(~valid) + counts['rows_read'] + 2)
+            quarantined.insert(0, REASON_COLUMN, reasons[~valid])
+            quarantined.to_csv(quarantine_snapshot, index=False, mode=write_mode, header=first_chunk, encoding='utf-8')
+            for name, count in rule_counts.items():
+                counts['reasons'][name] += count
+            counts['rows_read'] += len(chunk)
+            counts['rows_written'] += int(valid.sum())
+            counts['rows_quarantined'] += int((~valid).sum())
+            first_chunk = False
+        if first_chunk:
+            raise pd.errors.EmptyDataError(f"{input_path} has no rows.")
+    record_counts(quarantine_dir, input_path, output_path, counts)
+    return counts
+
+
+def print_summary(counts):
+    """Console summary used by the cleaner scripts."""
+    print(f"Rows read: {counts['rows_read']}, written: {counts['rows_written']}, quarantined: {counts['rows_quarantined']}")
+    for name, count in counts['reasons'].items():
+        if count:
+            print(f"  {name}: {count}")
+    if counts['rows_quarantined']:
+        print(f"Quarantined rows saved to: {counts['quarantine_file']}")
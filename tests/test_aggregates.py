@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from aggregates import FactorizedKeys, aggregate_metrics
+
+
+def _frame():
+    return pd.DataFrame({
+        'Campaign name': ['b', 'a', None, 'c', 'a', 'b', 'c', None],
+        'Country': ['TR', 'AZ', 'TR', None, 'AZ', 'US', 'TR', None],
+        'Ad name': ['x', 'y', 'x', 'z', 'x', 'y', 'y', 'z'],
+        'Amount spent (USD)': [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 128.0],
+    })
+
+
+def test_group_codes_match_pandas_groupby():
+    df = _frame()
+    keys = FactorizedKeys(df, ['Campaign name', 'Country', 'Ad name'])
+    for key_columns in (['Country'], ['Campaign name', 'Country'], ['Ad name', 'Campaign name', 'Country']):
+        for dropna in (True, False):
+            codes, keys_df = keys.group_codes(key_columns, dropna=dropna)
+            sums = np.bincount(codes[codes >= 0], weights=df['Amount spent (USD)'][codes >= 0], minlength=len(keys_df))
+            expected = df.groupby(key_columns, dropna=dropna, sort=True)['Amount spent (USD)'].sum().reset_index()
+            assert keys_df.astype(object).where(keys_df.notna(), None).values.tolist() == \
+                expected[key_columns].astype(object).where(expected[key_columns].notna(), None).values.tolist()
+            assert np.allclose(sums, expected['Amount spent (USD)'].to_numpy())
+            if dropna:
+                assert (codes[df[key_columns].isna().any(axis=1).to_numpy()] == -1).all()
+
+
+def test_concat_matches_factorizing_the_stacked_frame():
+    df = _frame()
+    first, second = df.iloc[:5].reset_index(drop=True), df.iloc[5:].drop(columns=['Ad name']).reset_index(drop=True)
+    merged = FactorizedKeys.concat([FactorizedKeys(first, ['Campaign name', 'Country', 'Ad name']),
+                                    FactorizedKeys(second, ['Campaign name', 'Country'])])
+    stacked = pd.concat([first, second], ignore_index=True)
+    expected = FactorizedKeys(stacked, ['Campaign name', 'Country', 'Ad name'])
+    for col in ('Campaign name', 'Country', 'Ad name'):
+        assert np.array_equal(merged.codes[col], expected.codes[col])
+        assert list(merged.uniques[col]) == list(expected.uniques[col])
+    assert aggregate_metrics(stacked, ['Campaign name', 'Country'], keys=merged, dropna=False).equals(
+        aggregate_metrics(stacked, ['Campaign name', 'Country'], dropna=False))
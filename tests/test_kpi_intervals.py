@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from kpi_intervals import bootstrap_kpi_intervals, high_column, rank_by_confidence_bound
+
+
+def test_bootstrap_cost_upper_bound_is_not_zero_when_replicates_have_no_clicks():
+    # Ad set 'a' has one click in three rows: many replicates have spend but no clicks (inf CPC).
+    df = pd.DataFrame({
+        'Ad Set Name': ['a', 'a', 'a', 'b', 'b', 'b'],
+        'Amount spent (USD)': [5.0, 5.0, 5.0, 10.0, 10.0, 10.0],
+        'Impressions': [100, 100, 100, 1000, 1000, 1000],
+        'Link clicks': [0, 0, 1, 10, 10, 10],
+        'Results': [0, 0, 1, 2, 2, 2],
+    })
+    summary = bootstrap_kpi_intervals(df, 'Ad Set Name')
+    cpc_high = summary.set_index('Ad Set Name')[high_column('CPC (USD)')]
+    assert np.isinf(cpc_high['a'])
+    assert cpc_high['b'] > 0
+    ranked = rank_by_confidence_bound(summary, 'CPC (USD)')
+    assert list(ranked['Ad Set Name']) == ['b', 'a']
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from period_comparison import build_period_comparison, top_movers
+
+
+def _rows(ids, countries, spend, clicks, campaigns=None):
+    df = pd.DataFrame({
+        'Universal_Campaign_ID': ids,
+        'Country': countries,
+        'Amount spent (USD)': spend,
+        'Impressions': [1000] * len(ids),
+        'Link clicks': clicks,
+        'Reach': [500] * len(ids),
+        'Results': [1] * len(ids),
+    })
+    if campaigns is not None:
+        df.insert(0, 'Campaign name', campaigns)
+    return df
+
+
+def test_periods_align_on_campaign_name_across_id_columns():
+    # Period 1 is keyed by ad set (with a campaign column); period 2 by campaign name itself.
+    p1 = _rows(['set a1', 'set a2', 'set b1'], ['TR', 'TR', 'AZ'], [10.0, 30.0, 5.0], [10, 30, 5],
+               campaigns=['Camp A', 'Camp A', 'Camp B - Copy'])
+    p2 = _rows(['Camp A', 'Camp B', 'Camp C'], ['TR', 'AZ', 'TR'], [60.0, 5.0, 7.0], [40, 10, 7])
+    comparison = build_period_comparison({'p1': p1, 'p2': p2})[('p1', 'p2')]
+    assert comparison.attrs['overlap'] == 2
+
+    rows = comparison.set_index(['Campaign name', 'Country'])
+    assert rows.loc[('Camp A', 'TR'), 'Total Spent (USD) (p1)'] == 40.0
+    assert rows.loc[('Camp A', 'TR'), 'Δ Total Spent (USD)'] == 20.0
+    assert rows.loc[('Camp A', 'TR'), 'Δ% Total Spent (USD)'] == 50.0
+    # ' - Copy' is normalized away, so the renamed campaign still matches.
+    assert rows.loc[('Camp B', 'AZ'), 'Δ Total Spent (USD)'] == 0.0
+    assert rows.loc[('Camp B', 'AZ'), 'Δ CPC (USD)'] == -0.5
+    # New in period 2: no base value, so no percentage change.
+    assert np.isnan(rows.loc[('Camp C', 'TR'), 'Δ% Total Spent (USD)'])
+
+    movers = top_movers(comparison, 'Total Spent (USD)', top_n=1)
+    assert list(movers['Campaign name']) == ['Camp A']
+
+
+def test_disjoint_periods_report_no_overlap():
+    p1 = _rows(['x'], ['TR'], [10.0], [1], campaigns=['Old'])
+    p2 = _rows(['New'], ['TR'], [10.0], [1])
+    comparison = build_period_comparison({'p1': p1, 'p2': p2})[('p1', 'p2')]
+    assert comparison.attrs['overlap'] == 0
+    assert len(comparison) == 2
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from snapshots import collect_garbage, current_version, publishing, rollback, versions
+
+
+def _publish(path, text):
+    with publishing(str(path)) as snapshot_path:
+        with open(snapshot_path, 'w') as f:
+            f.write(text)
+
+
+def test_publishing_replaces_the_file_and_keeps_the_old_inode_readable(tmp_path):
+    path = tmp_path / 'clean.csv'
+    _publish(path, 'v1')
+    with open(path) as reader:
+        _publish(path, 'v2')
+        assert reader.read() == 'v1'
+    assert path.read_text() == 'v2'
+    assert current_version(str(path)) == versions(str(path))[-1]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_failed_write_leaves_the_published_file_and_no_partial_snapshot(tmp_path):
+    path = tmp_path / 'clean.csv'
+    _publish(path, 'v1')
+    with pytest.raises(RuntimeError):
+        with publishing(str(path)) as snapshot_path:
+            with open(snapshot_path, 'w') as f:
+                f.write('half')
+            raise RuntimeError("writer crashed")
+    assert path.read_text() == 'v1'
+    assert len(versions(str(path))) == 1
+
+
+def test_gc_keeps_the_newest_and_the_published_snapshot(tmp_path):
+    path = tmp_path / 'clean.csv'
+    for text in ('v1', 'v2', 'v3', 'v4'):
+        _publish(path, text)
+    # Inside the grace period nothing is collected.
+    assert collect_garbage(str(path), keep=1) == []
+    previous = rollback(str(path))
+    assert path.read_text() == 'v3' and current_version(str(path)) == previous
+
+    removed = collect_garbage(str(path), keep=1, grace_seconds=0)
+    remaining = versions(str(path))
+    assert len(removed) == 2
+    assert previous in remaining and len(remaining) == 2
+    assert path.read_text() == 'v3'